@@ -0,0 +1,258 @@
+"""
+Campaigns of MitL tests over a matrix of configurations.
+A campaign is the cartesian product of injected faults (None for the nominal
+test, see mitl/Faults.py), seeds of the noise, reference trajectories of
+cfCtrl.referenceGen and feedback from the estimator or from the true state.
+Each cell is a MitL test (mitl_main.runTest) whose result is memoized in the
+cache directory under a hash of its configuration and of the source code of
+the closed loop, so re-running a campaign only runs the cells that are new
+or whose code changed.
+Instead of a fixed number of seeds, cells can be sampled sequentially: seeds
+are run in batches and a cell stops once the confidence intervals of its
+detection rate (Wilson score) and of a quantile of the tracking error
+(bootstrap) are narrower than the target widths, so runs go to the cells
+whose outcome is uncertain.
+A faulty test detects its fault if the online monitor stopped it or if it
+violates a requirement (see STL.py), unless the nominal test with the same
+seed, reference and feedback was stopped or violates it as well.
+"""
+
+import io
+import os
+import json
+import time
+import hashlib
+import itertools
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy import stats
+
+from analysis import STL
+
+CACHE = "mitl/campaigns"
+# code that determines the result of a test
+SOURCES = ("mitl_main.py", "mitl/Loop.py", "mitl/Model.py", "mitl/Constants.py", "mitl/Rotation.py",
+           "mitl/Controller.py", "mitl/StateEstimator.py", "mitl/Faults.py", "mitl/Monitor.py",
+           "mitl/Reference.py", "analysis/STL.py")
+# version of the content of the results (part of the cache key)
+FORMAT = 2
+REFERENCES = ("step", "zsinus", "xsinus", "ysinus", "circle", "spiral")
+
+
+def codeVersion(sources=SOURCES):
+    # hash of the source code of the closed loop
+    digest = hashlib.sha1(b"format %d\0" % FORMAT)
+    for source in sources:
+        with open(source, 'rb') as f:
+            digest.update(source.encode() + b"\0" + f.read() + b"\0")
+    return digest.hexdigest()
+
+
+def matrix(faults, seeds, references, feedback=(True, False), noise=0, t_final=10):
+    # cells of the campaign
+    # input : faults: fault specifications (None for the nominal test),
+    #         feedback: values of useKalmanFilter
+    # output: list of configurations (dictionaries of runTest arguments)
+    return [{'fault': fault, 'seed': int(seed), 'reference': reference, 'useKalmanFilter': bool(kalman),
+             'noise': noise, 't_final': t_final}
+            for fault, seed, reference, kalman in itertools.product(faults, seeds, references, feedback)]
+
+
+def cellKey(config, version):
+    # name of the cached result of a cell
+    description = json.dumps(config, sort_keys=True) + version
+    return hashlib.sha1(description.encode()).hexdigest()[:20]
+
+
+def evaluate(config):
+    # worker: runs the test of a cell and checks the requirements (with
+    #         their default bounds)
+    # output: dictionary with the configuration, the reason of the abort (or
+    #         None), the robustness of each requirement, the tracking
+    #         error (rms distance from the setpoint [m]) and the durations
+    import mitl_main
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        storeObj = mitl_main.runTest(**config)
+    wall = time.perf_counter() - start
+    signals = {name: np.asarray(getattr(storeObj, name), dtype=float)
+               for name in ('t', 'est_pos', 'set_pt', 'pos', 'eta', 'u')}
+    robustness = dict()
+    for name, requirement in STL.REQUIREMENTS.items():
+        value, first = STL.evaluate(requirement(), signals, signals['t'])
+        robustness[name] = float(value)
+    error = np.sqrt(np.mean(np.sum((signals['pos'] - signals['set_pt'])**2, axis=0)))
+    return {'config': config, 'abort': storeObj.abort, 'robustness': robustness, 'tracking_error': float(error),
+            'simulated': float(storeObj.t[-1]), 'wall': wall}
+
+
+def load(config, version, cache=CACHE):
+    # cached result of a cell, None if missing
+    location = os.path.join(cache, cellKey(config, version) + ".json")
+    if not os.path.isfile(location):
+        return None
+    with open(location) as f:
+        return json.load(f)
+
+
+def store(result, version, cache=CACHE):
+    os.makedirs(cache, exist_ok=True)
+    location = os.path.join(cache, cellKey(result['config'], version) + ".json")
+    with open(location + ".tmp", 'w') as f:
+        json.dump(dict(result, version=version), f, indent=1)
+    os.replace(location + ".tmp", location)
+
+
+def run(configs, jobs=None, cache=CACHE, force=False, verbose=True):
+    # runs the cells of a campaign that are not cached
+    # output: list of results, in the order of configs
+    version = codeVersion()
+    results = [None if force else load(config, version, cache) for config in configs]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if verbose:
+        print('* ' + str(len(configs) - len(missing)) + ' cached, running \033[33m' + str(len(missing)) + '\033[0m tests')
+    if missing:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [(i, pool.submit(evaluate, configs[i])) for i in missing]
+            for n, (i, future) in enumerate(futures):
+                results[i] = future.result()
+                store(results[i], version, cache)
+                if verbose:
+                    print('  [' + str(n+1) + '/' + str(len(missing)) + '] ' + describe(configs[i]) +
+                          (' \033[91maborted\033[0m' if results[i]['abort'] else ''))
+    return results
+
+
+def describe(config):
+    # configuration of a test (or of a cell, without seed) in a line
+    return (config['fault'] or 'nominal') + (' seed=' + str(config['seed']) if 'seed' in config else '') + \
+           ' ' + config['reference'] + (' kalman' if config['useKalmanFilter'] else ' true-state')
+
+
+def detections(results):
+    # output: list of (result, detected, violated requirements) for the faulty
+    #         tests; an abort or a requirement counts only if the matching
+    #         nominal test completed or satisfies it
+    nominal = dict()
+    for result in results:
+        config = result['config']
+        if config['fault'] is None:
+            nominal[(config['seed'], config['reference'], config['useKalmanFilter'])] = result
+    out = []
+    for result in results:
+        config = result['config']
+        if config['fault'] is None:
+            continue
+        reference = nominal.get((config['seed'], config['reference'], config['useKalmanFilter']))
+        violated = [name for name, value in result['robustness'].items() if value < 0 and
+                    (reference is None or not reference['robustness'].get(name, 0) < 0)]
+        aborted = bool(result['abort']) and (reference is None or not reference['abort'])
+        out.append((result, aborted or bool(violated), violated))
+    return out
+
+
+def summary(results):
+    # detection rate of each fault
+    # output: list of dictionaries (fault, tests, detected, rate, aborted),
+    #         the nominal row counts the tests that fail without any fault
+    rows = dict()
+    for result, detected, violated in detections(results):
+        name = result['config']['fault'].partition(":")[0]
+        row = rows.setdefault(name, {'fault': name, 'tests': 0, 'detected': 0, 'aborted': 0})
+        row['tests'] += 1
+        row['detected'] += detected
+        row['aborted'] += bool(result['abort'])
+    nominal = [r for r in results if r['config']['fault'] is None]
+    out = []
+    if nominal:
+        failed = sum(bool(r['abort']) or any(v < 0 for v in r['robustness'].values()) for r in nominal)
+        out.append({'fault': None, 'tests': len(nominal), 'detected': failed,
+                    'aborted': sum(bool(r['abort']) for r in nominal)})
+    out.extend(rows[name] for name in sorted(rows))
+    for row in out:
+        row['rate'] = row['detected']/row['tests']
+    return out
+
+
+def wilson(successes, n, confidence=0.95):
+    # Wilson score interval of a rate
+    if n == 0:
+        return 0.0, 1.0
+    z = stats.norm.ppf(1 - (1-confidence)/2)
+    p = successes/n
+    center = (p + z*z/(2*n))/(1 + z*z/n)
+    half = z*np.sqrt(p*(1-p)/n + z*z/(4*n*n))/(1 + z*z/n)
+    return float(max(center-half, 0.0)), float(min(center+half, 1.0))
+
+
+def bootstrapQuantile(values, q, confidence=0.95, resamples=2000, seed=0):
+    # percentile bootstrap interval of the q-quantile of values
+    values = np.asarray(values, dtype=float)
+    rng = np.random.default_rng(seed)
+    estimates = np.quantile(rng.choice(values, (resamples, len(values))), q, axis=1)
+    alpha = (1-confidence)/2
+    return float(np.quantile(estimates, alpha)), float(np.quantile(estimates, 1-alpha))
+
+
+def _nominal(config):
+    return dict(config, fault=None)
+
+
+def sequential(cells, batch=10, width=0.2, quantile=0.95, quantileWidth=None, maxRuns=100,
+               confidence=0.95, jobs=None, cache=CACHE, verbose=True):
+    # samples the seeds of the cells in batches until the intervals are narrow
+    # input : cells: configurations without seed (see matrix), the nominal
+    #                tests with the seeds of a faulty cell are run as well
+    #         width: target width of the interval of the detection rate (of
+    #                the failure rate for nominal cells)
+    #         quantileWidth: target width of the interval of the quantile of
+    #                the tracking error [m], None to ignore it
+    # output: list of dictionaries, one per cell, with the number of runs,
+    #         the rate, the quantile and their intervals, and whether the cell
+    #         converged or reached maxRuns
+    key = lambda config: json.dumps(config, sort_keys=True)
+    states = [{'cell': cell, 'runs': 0, 'done': False} for cell in cells]
+    results = dict()
+    while not all(state['done'] for state in states):
+        configs = dict()
+        for state in states:
+            if state['done']:
+                continue
+            for seed in range(state['runs']+1, min(state['runs']+batch, maxRuns)+1):
+                config = dict(state['cell'], seed=seed)
+                configs[key(config)] = config
+                if config['fault'] is not None: # detection is judged against the nominal test
+                    configs[key(_nominal(config))] = _nominal(config)
+        todo = [config for k, config in configs.items() if k not in results]
+        for config, result in zip(todo, run(todo, jobs, cache, verbose=verbose)):
+            results[key(config)] = result
+        for state in states:
+            if state['done']:
+                continue
+            state['runs'] = min(state['runs']+batch, maxRuns)
+            state.update(_statistics(state, results, key, quantile, confidence))
+            converged = state['high'] - state['low'] <= width and \
+                        (quantileWidth is None or state['quantile_high'] - state['quantile_low'] <= quantileWidth)
+            state['converged'] = bool(converged)
+            state['done'] = converged or state['runs'] >= maxRuns
+            if verbose:
+                print('* ' + describe(state['cell']) + ': ' + str(state['runs']) + ' runs, rate %.2f [%.2f, %.2f]'
+                      % (state['rate'], state['low'], state['high']) + (' \033[33mdone\033[0m' if state['done'] else ''))
+    return [{k: v for k, v in state.items() if k != 'done'} for state in states]
+
+
+def _statistics(state, results, key, quantile, confidence):
+    # detection (or failure) rate and quantile of the tracking error of a cell
+    cell = state['cell']
+    own = [results[key(dict(cell, seed=seed))] for seed in range(1, state['runs']+1)]
+    if cell['fault'] is None:
+        outcomes = [bool(r['abort']) or any(v < 0 for v in r['robustness'].values()) for r in own]
+    else:
+        nominal = [results[key(_nominal(dict(cell, seed=seed)))] for seed in range(1, state['runs']+1)]
+        outcomes = [detected for _, detected, _ in detections(own + nominal)]
+    errors = [r['tracking_error'] for r in own]
+    low, high = wilson(sum(outcomes), len(outcomes), confidence)
+    quantile_low, quantile_high = bootstrapQuantile(errors, quantile, confidence)
+    return {'rate': sum(outcomes)/len(outcomes), 'low': low, 'high': high,
+            'quantile': float(np.quantile(errors, quantile)), 'quantile_low': quantile_low, 'quantile_high': quantile_high}
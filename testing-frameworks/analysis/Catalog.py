@@ -0,0 +1,219 @@
+"""
+Catalog of the flight data in a SQLite database.
+Every flight found in the flightdata directories of the testing setups is
+indexed once, with the information needed to select flights without opening
+them:
+* flights : path, abstraction (mitl, sitl, hitl, pitl), bug name, date,
+            duration, number of samples, size and modification time,
+* channels: name, dtype and shape of each array field of a flight,
+* metrics : summary metrics of a flight (name, value), e.g. tracking error.
+The catalog is updated incrementally: only new flights and flights whose
+files changed are opened again, flights that disappeared are removed.
+"""
+
+import io
+import os
+import time
+import sqlite3
+import contextlib
+import numpy as np
+
+from plot import Columnar
+
+DEFAULT_DB = "flightdata.sqlite"
+SCHEMA_VERSION = 1
+DATE_FORMAT = '%d%b%Y_%H%M%S' # see Storage.save
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS flights (
+    path        TEXT PRIMARY KEY,
+    abstraction TEXT,
+    bug         TEXT,
+    name        TEXT,
+    date        TEXT,
+    duration    REAL,
+    samples     INTEGER,
+    size        INTEGER,
+    mtime       REAL
+);
+CREATE TABLE IF NOT EXISTS channels (
+    path  TEXT REFERENCES flights(path) ON DELETE CASCADE,
+    name  TEXT,
+    dtype TEXT,
+    shape TEXT,
+    PRIMARY KEY (path, name)
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    path  TEXT REFERENCES flights(path) ON DELETE CASCADE,
+    name  TEXT,
+    value REAL,
+    PRIMARY KEY (path, name)
+);
+CREATE INDEX IF NOT EXISTS flights_selection ON flights (abstraction, bug, duration);
+CREATE INDEX IF NOT EXISTS metrics_name ON metrics (name, value);
+"""
+
+
+def connect(location=DEFAULT_DB):
+    # opens (and creates if needed) the catalog
+    db = sqlite3.connect(location)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA foreign_keys = ON")
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    if version not in (0, SCHEMA_VERSION):
+        db.close()
+        raise ValueError('unsupported catalog version ' + str(version) + ' in ' + location)
+    db.executescript(SCHEMA)
+    db.execute("PRAGMA user_version = " + str(SCHEMA_VERSION))
+    return db
+
+
+def _files(flight):
+    # files containing the data of a flight (pickle file or columnar directory)
+    if os.path.isdir(flight):
+        return [os.path.join(flight, f) for f in os.listdir(flight)]
+    return [flight]
+
+
+def fingerprint(flight):
+    # (size, modification time) of a flight, used to detect changes
+    stats = [os.stat(f) for f in _files(flight)]
+    return sum(s.st_size for s in stats), max(s.st_mtime for s in stats)
+
+
+def describe(flight, setup):
+    # location information of a flight: abstraction, bug, name and date
+    # input : flight: path of the flight, setup: testing setup directory
+    relative = os.path.relpath(flight, os.path.join(setup, "flightdata")).split(os.sep)
+    date = None
+    for part in reversed(relative):
+        try:
+            date = time.strftime('%Y-%m-%dT%H:%M:%S', time.strptime(part, DATE_FORMAT))
+            break
+        except ValueError:
+            continue
+    # flights named after the date directly in flightdata have no bug name
+    bug = relative[0] if len(relative) > 1 or date is None else None
+    if date is None:
+        date = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(fingerprint(flight)[1]))
+    return {'abstraction': os.path.basename(os.path.normpath(setup)), 'bug': bug,
+            'name': relative[-1], 'date': date}
+
+
+def summary(data):
+    # summary metrics of a flight
+    # output: dictionary metric name -> value
+    metrics = dict()
+    error = np.asarray(data.est_pos, dtype=float) - np.asarray(data.set_pt, dtype=float)
+    for axis, name in enumerate('xyz'):
+        metrics['tracking_rmse_' + name] = float(np.sqrt(np.mean(error[axis]**2)))
+        metrics['tracking_max_' + name] = float(np.max(np.abs(error[axis])))
+        metrics['tracking_final_' + name] = float(abs(error[axis, -1]))
+    metrics['max_altitude'] = float(np.max(data.est_pos[2]))
+    if getattr(data, 'type', None) != 'pitl': # pitl has no ground truth
+        truth = np.asarray(data.est_pos, dtype=float) - np.asarray(data.pos, dtype=float)
+        metrics['estimation_rmse'] = float(np.sqrt(np.mean(np.sum(truth**2, axis=0))))
+    return metrics
+
+
+def index(db, flight, setup):
+    # (re)indexes a single flight
+    from plot.Plot import Storage
+    storage = Storage()
+    with contextlib.redirect_stdout(io.StringIO()):
+        storage.open(flight, flight)
+    data = storage.data
+    size, mtime = fingerprint(flight)
+    info = describe(flight, setup)
+    t = np.asarray(data.t, dtype=float)
+    fields = data.fields() if isinstance(data, Columnar.ColumnarData) else \
+             [name for name, value in vars(data).items() if isinstance(value, (np.ndarray, list))]
+    channels = []
+    for name in fields:
+        array = np.asarray(getattr(data, name))
+        channels.append((flight, name, array.dtype.str, 'x'.join(str(s) for s in array.shape)))
+    metrics = [(flight, name, value) for name, value in summary(data).items()]
+
+    # everything is computed: write the flight at once, or not at all, so
+    # that a partial flight is never taken as up to date
+    db.execute("SAVEPOINT flight")
+    try:
+        db.execute("DELETE FROM flights WHERE path = ?", (flight,))
+        db.execute("INSERT INTO flights VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                   (flight, info['abstraction'], info['bug'], info['name'], info['date'],
+                    float(t[-1]-t[0]) if len(t) else 0.0, len(t), size, mtime))
+        db.executemany("INSERT INTO channels VALUES (?, ?, ?, ?)", channels)
+        db.executemany("INSERT INTO metrics VALUES (?, ?, ?)", metrics)
+    except BaseException:
+        db.execute("ROLLBACK TO flight")
+        raise
+    finally:
+        db.execute("RELEASE flight")
+
+
+def update(db, setups, verbose=True):
+    # incremental update of the catalog with the flights of the given setups
+    # output: (number of indexed flights, number of removed flights)
+    indexed = 0
+    removed = 0
+    for setup in setups:
+        source = os.path.join(setup, "flightdata")
+        known = {row['path']: (row['size'], row['mtime']) for row in
+                 db.execute("SELECT path, size, mtime FROM flights WHERE substr(path, 1, ?) = ?",
+                            (len(source)+1, source + os.sep))}
+        for flight in Columnar.flights(source):
+            if known.pop(flight, None) == fingerprint(flight):
+                continue
+            try:
+                index(db, flight, setup)
+            except Exception as e:
+                print('\033[91mError:\033[0m ' + flight + ': ' + str(e))
+                continue
+            indexed = indexed + 1
+            if verbose:
+                print('* indexed: \033[33m' + flight + '\033[0m')
+        for flight in known: # no longer on disk
+            db.execute("DELETE FROM flights WHERE path = ?", (flight,))
+            removed = removed + 1
+        db.commit()
+    return indexed, removed
+
+
+def select(db, abstraction=None, bug=None, min_duration=None, max_duration=None, bounds=None):
+    # selects flights
+    # input : abstraction, bug: a name or a list of names (None for any)
+    #         min_duration, max_duration: bounds on the duration [s]
+    #         bounds: dictionary metric name -> (min, max), None for no bound
+    # output: list of rows of the flights table
+    where = []
+    args = []
+    for column, value in (('abstraction', abstraction), ('bug', bug)):
+        if value is None:
+            continue
+        values = [value] if isinstance(value, str) else list(value)
+        where.append(column + " IN (" + ", ".join("?"*len(values)) + ")")
+        args.extend(values)
+    if min_duration is not None:
+        where.append("duration > ?")
+        args.append(min_duration)
+    if max_duration is not None:
+        where.append("duration < ?")
+        args.append(max_duration)
+    for name, (low, high) in (bounds or dict()).items():
+        condition = "SELECT path FROM metrics WHERE name = ?"
+        args.append(name)
+        if low is not None:
+            condition = condition + " AND value >= ?"
+            args.append(low)
+        if high is not None:
+            condition = condition + " AND value <= ?"
+            args.append(high)
+        where.append("path IN (" + condition + ")")
+    query = "SELECT * FROM flights" + (" WHERE " + " AND ".join(where) if where else "")
+    return db.execute(query + " ORDER BY abstraction, bug, date", args).fetchall()
+
+
+def metrics(db, path):
+    # summary metrics of a flight as a dictionary
+    return {row['name']: row['value'] for row in
+            db.execute("SELECT name, value FROM metrics WHERE path = ?", (path,))}
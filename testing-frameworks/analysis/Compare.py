@@ -0,0 +1,110 @@
+"""
+Alignment and comparison of flights from different abstractions.
+The flights are resampled on a common time grid (time relative to the first
+sample of each flight, covering the intersection of their time spans, i.e.
+ending at the earliest end time) and every pair
+of flights is compared channel by channel with:
+* rmse          : root mean square of the difference,
+* max_deviation : maximum absolute difference,
+* divergence    : first time at which the absolute difference exceeds the
+                  threshold (nan if it never does).
+Resampling computes the interpolation indices and weights once per flight and
+applies them to all the channels at once.
+"""
+
+import io
+import itertools
+import contextlib
+import numpy as np
+
+from analysis.Envelope import channel
+
+# different spellings of the same bug in the flightdata directories
+BUG_ALIASES = {'initalPos': 'initialPos'}
+
+
+def bugName(bug):
+    # canonical name of a bug, used to group its flights across abstractions
+    return BUG_ALIASES.get(bug, bug)
+
+
+def weights(t, grid):
+    # linear interpolation of samples at times t on the grid
+    # output: (index of the left sample, weight of the right sample)
+    t = np.asarray(t, dtype=float)
+    right = np.clip(np.searchsorted(t, grid, side='right'), 1, len(t)-1)
+    left = right-1
+    span = t[right]-t[left]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = np.where(span > 0, (grid-t[left])/span, 0.0)
+    return left, np.clip(w, 0.0, 1.0)
+
+
+def resample(values, t, grid):
+    # input : values: (channels, samples) matrix, t: time of the samples
+    # output: (channels, len(grid)) matrix
+    left, w = weights(t, grid)
+    values = np.asarray(values, dtype=float)
+    return values[:, left]*(1-w) + values[:, left+1]*w
+
+
+def extract(storage, channels):
+    # matrix of the channels of an opened flight (one row per channel);
+    # channels with more rows (e.g. est_pos) are expanded as name[i]
+    names = []
+    rows = []
+    for name in channels:
+        values = np.asarray(channel(storage, name), dtype=float)
+        if values.ndim == 1:
+            names.append(name)
+            rows.append(values)
+        else:
+            for i in range(values.shape[0]):
+                names.append(name + '[' + str(i) + ']')
+                rows.append(values[i])
+    return names, np.vstack(rows)
+
+
+def load(flights, channels, dt=None):
+    # opens the flights (one at a time) and resamples them on a common grid
+    # input : dt: step of the grid (median step of the first flight if None)
+    # output: (grid, channel names, list of (channels, len(grid)) matrices)
+    from plot.Plot import Storage
+    traces = []
+    for flight in flights:
+        storage = Storage()
+        with contextlib.redirect_stdout(io.StringIO()):
+            storage.open(flight, flight)
+        t = np.asarray(storage.time, dtype=float)
+        names, values = extract(storage, channels)
+        traces.append((t - t[0], values))
+    if dt is None:
+        dt = float(np.median(np.diff(traces[0][0])))
+    end = min(t[-1] for t, _ in traces)
+    grid = np.arange(0.0, end + dt/2, dt)
+    return grid, names, [resample(values, t, grid) for t, values in traces]
+
+
+def divergence(a, b, grid, threshold):
+    # compares two resampled flights, channel by channel
+    # output: dictionary metric -> array with one value per channel
+    difference = np.abs(a-b)
+    beyond = difference > threshold
+    first = np.argmax(beyond, axis=1)
+    return {'rmse': np.sqrt(np.mean(difference**2, axis=1)),
+            'max_deviation': np.max(difference, axis=1),
+            'divergence': np.where(np.any(beyond, axis=1), grid[first], np.nan)}
+
+
+def compare(flights, channels, threshold, dt=None):
+    # compares all the pairs of flights
+    # output: list of rows (flight a, flight b, channel, rmse, max deviation,
+    #         time of divergence)
+    grid, names, traces = load(flights, channels, dt)
+    rows = []
+    for (i, a), (j, b) in itertools.combinations(enumerate(traces), 2):
+        result = divergence(a, b, grid, threshold)
+        for c, name in enumerate(names):
+            rows.append((flights[i], flights[j], name, float(result['rmse'][c]),
+                         float(result['max_deviation'][c]), float(result['divergence'][c])))
+    return rows
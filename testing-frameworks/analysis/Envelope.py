@@ -0,0 +1,206 @@
+"""
+Streaming envelope statistics over many flights.
+The statistics of a channel (count, mean, variance, min, max and quantiles)
+are computed for each time sample while streaming over the flights, so that
+only one flight has to be in memory at a time:
+* mean and variance with Welford's update,
+* min and max with running comparisons,
+* quantiles with the P-square algorithm (Jain and Chlamtac, 1985), which
+  estimates a quantile with five markers without storing the observations.
+All the updates are vectorized over the time samples (and over the leading
+dimensions of the channel, e.g. the three axes of est_pos). Traces of
+different lengths are supported: each time sample has its own count.
+"""
+
+import io
+import contextlib
+import numpy as np
+
+
+class P2Quantile:
+    # P-square estimate of the quantile p, for an array of variables
+
+    def __init__(self, p, shape):
+        self.p = p
+        self.q  = np.zeros((5,) + shape)          # marker heights
+        self.n  = np.tile(np.arange(5.0).reshape((5,) + (1,)*len(shape)), (1,) + shape) # marker positions
+        self.d  = np.tile(np.array([0, 2*p, 4*p, 2+2*p, 4]).reshape((5,) + (1,)*len(shape)), (1,) + shape) # desired positions
+        self.dn = np.array([0, p/2, p, (1+p)/2, 1]).reshape((5,) + (1,)*len(shape))
+        self.count = np.zeros(shape, dtype=int)
+
+    def grow(self, shape):
+        # extends the variables (last dimension) to the given shape
+        fresh = P2Quantile(self.p, shape)
+        sl = tuple(slice(0, s) for s in self.count.shape)
+        for name in ('q', 'n', 'd'):
+            getattr(fresh, name)[(slice(None),) + sl] = getattr(self, name)
+        fresh.count[sl] = self.count
+        self.__dict__.update(fresh.__dict__)
+
+    def update(self, x, valid):
+        # input : x: new observation of each variable, valid: mask of the
+        #         variables that are observed
+        # first five observations: stored and sorted
+        init = valid & (self.count < 5)
+        if np.any(init):
+            idx = np.nonzero(init)
+            self.q[(self.count[idx],) + idx] = x[idx]
+            full = init & (self.count == 4)
+            if np.any(full):
+                self.q[:, full] = np.sort(self.q[:, full], axis=0)
+        step = valid & (self.count >= 5)
+        self.count = self.count + valid
+        if not np.any(step):
+            return
+
+        # cell of the observation, extremes are updated if needed
+        q  = self.q[:, step]
+        n  = self.n[:, step]
+        d  = self.d[:, step]
+        dn = np.broadcast_to(self.dn, self.q.shape)[:, step]
+        xs = x[step]
+        q[0] = np.minimum(q[0], xs)
+        q[4] = np.maximum(q[4], xs)
+        k = np.sum(xs[None, :] >= q[1:4], axis=0)
+        n = n + (np.arange(5)[:, None] > k[None, :])
+        d = d + dn
+
+        # adjust the heights of the three middle markers
+        for i in (1, 2, 3):
+            delta = d[i] - n[i]
+            move  = ((delta >= 1) & (n[i+1]-n[i] > 1)) | ((delta <= -1) & (n[i-1]-n[i] < -1))
+            if not np.any(move):
+                continue
+            s = np.sign(delta)
+            parabolic = q[i] + s/(n[i+1]-n[i-1]) * ((n[i]-n[i-1]+s)*(q[i+1]-q[i])/(n[i+1]-n[i]) +
+                                                    (n[i+1]-n[i]-s)*(q[i]-q[i-1])/(n[i]-n[i-1]))
+            j = np.where(s > 0, i+1, i-1)
+            cols = np.arange(q.shape[1])
+            linear = q[i] + s*(q[j, cols]-q[i])/(n[j, cols]-n[i])
+            ok = (q[i-1] < parabolic) & (parabolic < q[i+1])
+            q[i] = np.where(move, np.where(ok, parabolic, linear), q[i])
+            n[i] = np.where(move, n[i]+s, n[i])
+        self.q[:, step] = q
+        self.n[:, step] = n
+        self.d[:, step] = d
+
+    def value(self):
+        # current estimate (exact while fewer than five observations)
+        est = self.q[2].copy()
+        few = (self.count > 0) & (self.count < 5)
+        if np.any(few):
+            buf = self.q[:, few].copy()
+            buf[np.arange(5)[:, None] >= self.count[few][None, :]] = np.nan
+            est[few] = np.nanquantile(buf, self.p, axis=0)
+        est[self.count == 0] = np.nan
+        return est
+
+
+class Envelope:
+    # streaming statistics of a channel for each time sample
+
+    def __init__(self, quantiles=(0.05, 0.5, 0.95), grid=None):
+        # quantiles: quantiles to estimate (besides min and max)
+        # grid     : if given, common time base where each flight is
+        #            interpolated, otherwise samples are aligned by index
+        self.quantiles = tuple(quantiles)
+        self.grid  = grid
+        self.shape = None
+
+    def _allocate(self, shape):
+        self.shape   = shape
+        self.count   = np.zeros(shape, dtype=int)
+        self.mean    = np.zeros(shape)
+        self.m2      = np.zeros(shape)
+        self.min     = np.full(shape, np.nan)
+        self.max     = np.full(shape, np.nan)
+        self._p2     = [P2Quantile(p, shape) for p in self.quantiles]
+
+    def _grow(self, shape):
+        # extends the statistics to longer traces
+        old = tuple(slice(0, s) for s in self.shape)
+        state = [(name, getattr(self, name)) for name in ('count', 'mean', 'm2', 'min', 'max')]
+        p2 = self._p2
+        self._allocate(shape)
+        for name, value in state:
+            getattr(self, name)[old] = value
+        for estimator in p2:
+            estimator.grow(shape)
+        self._p2 = p2
+
+    def update(self, values, t=None):
+        # adds a flight
+        # input : values: channel of the flight, shape (..., samples)
+        #         t     : time of the samples (needed if a grid is used)
+        values = np.asarray(values, dtype=float)
+        if self.grid is not None:
+            # interpolation on the grid, nan outside of the flight
+            t = np.asarray(t, dtype=float)
+            lead = values.shape[:-1]
+            inside = (self.grid >= t[0]) & (self.grid <= t[-1])
+            flat = values.reshape(-1, values.shape[-1])
+            values = np.stack([np.where(inside, np.interp(self.grid, t, v), np.nan) for v in flat])
+            values = values.reshape(lead + (len(self.grid),))
+        if self.shape is None:
+            self._allocate(values.shape)
+        elif values.shape[:-1] != self.shape[:-1]:
+            raise ValueError('channel shape changed from ' + str(self.shape) + ' to ' + str(values.shape))
+        elif values.shape[-1] > self.shape[-1]:
+            self._grow(values.shape)
+        if values.shape[-1] < self.shape[-1]: # shorter trace: missing samples
+            pad = np.full(self.shape[:-1] + (self.shape[-1]-values.shape[-1],), np.nan)
+            values = np.concatenate((values, pad), axis=-1)
+
+        valid = ~np.isnan(values)
+        x = np.where(valid, values, 0.0)
+        # Welford update of mean and sum of squared deviations
+        self.count = self.count + valid
+        delta = np.where(valid, x - self.mean, 0.0)
+        self.mean = self.mean + delta/np.maximum(self.count, 1)
+        self.m2   = self.m2 + delta*np.where(valid, x - self.mean, 0.0)
+        # running extremes (fmin/fmax ignore nan)
+        self.min = np.fmin(self.min, values)
+        self.max = np.fmax(self.max, values)
+        for estimator in self._p2:
+            estimator.update(x, valid)
+
+    def variance(self, ddof=1):
+        # variance of each sample (nan where not enough observations)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > ddof, self.m2/(self.count-ddof), np.nan)
+
+    def std(self, ddof=1):
+        return np.sqrt(self.variance(ddof))
+
+    def average(self):
+        # mean of each sample (nan where no observation)
+        return np.where(self.count > 0, self.mean, np.nan)
+
+    def quantile(self, p):
+        # estimate of one of the quantiles given at construction
+        return self._p2[self.quantiles.index(p)].value()
+
+
+def channel(storage, name):
+    # values of a channel of an opened flight: either an attribute of the
+    # Storage object (e.g. estimated_position_x) or a field of the flight
+    # data (e.g. est_pos)
+    if hasattr(storage, name):
+        return getattr(storage, name)
+    return getattr(storage.data, name)
+
+
+def envelopes(flights, channels, quantiles=(0.05, 0.5, 0.95), grid=None, verbose=False):
+    # streams over the flights (paths of flight data) and computes the
+    # envelope of each channel, opening each flight only once
+    # output: dictionary channel name -> Envelope
+    from plot.Plot import Storage
+    result = {name: Envelope(quantiles, grid) for name in channels}
+    for flight in flights:
+        storage = Storage()
+        with contextlib.redirect_stdout(None if verbose else io.StringIO()):
+            storage.open(flight, flight)
+        for name in channels:
+            result[name].update(channel(storage, name), storage.time)
+        del storage
+    return result
@@ -0,0 +1,148 @@
+"""
+Falsification: search of the reference trajectories that violate a requirement.
+The parameters of a space of trajectories (see mitl/Reference.py) are searched
+with the cross-entropy method, a derivative-free optimizer: every generation
+a population of candidates is sampled from a Gaussian distribution over the
+normalized parameters, the candidates are simulated at once (MitL tests in a
+pool of processes) and the distribution is moved towards the candidates with
+the lowest robustness of the requirement (see STL.py). A test stopped by the
+online monitor counts as a violation (robustness -inf).
+Every evaluated candidate is kept in a cache, one json file per search setup
+(space, requirement, fault, feedback, noise, duration and code version), so
+candidates already seen, also by previous searches, are not simulated again.
+"""
+
+import io
+import os
+import json
+import hashlib
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from analysis import STL
+from analysis import Campaign
+from mitl.Reference import SPACES
+
+CACHE = "mitl/falsification"
+
+
+def setup(space="steps", requirement="settling", fault=None, useKalmanFilter=True, noise=0, seed=1, t_final=10):
+    # description of a search: what is simulated and what is checked
+    return {'space': space, 'requirement': requirement, 'fault': fault, 'useKalmanFilter': useKalmanFilter,
+            'noise': noise, 'seed': seed, 't_final': t_final}
+
+
+def evaluate(setup, params):
+    # worker: robustness of the requirement on the test of a candidate
+    # output: (robustness, reason of the abort or None)
+    import mitl_main
+    from mitl.Reference import cfReference
+    with contextlib.redirect_stdout(io.StringIO()):
+        storeObj = mitl_main.runTest(cfReference(setup['space'], params), setup['fault'], setup['seed'], setup['noise'],
+                                     setup['useKalmanFilter'], t_final=setup['t_final'])
+    if storeObj.abort is not None:
+        return -np.inf, storeObj.abort
+    signals = {name: np.asarray(getattr(storeObj, name), dtype=float)
+               for name in ('t', 'est_pos', 'set_pt', 'pos', 'eta', 'u')}
+    value, first = STL.evaluate(STL.REQUIREMENTS[setup['requirement']](), signals, signals['t'])
+    return float(value), None
+
+
+class Cache:
+    # evaluated candidates of a search setup, stored in a json file
+
+    def __init__(self, setup, directory=CACHE):
+        description = json.dumps(setup, sort_keys=True) + Campaign.codeVersion()
+        self.location = os.path.join(directory, hashlib.sha1(description.encode()).hexdigest()[:20] + ".json")
+        self.candidates = dict()
+        if os.path.isfile(self.location):
+            with open(self.location) as f:
+                self.candidates = json.load(f)['candidates']
+        self.setup = setup
+
+    @staticmethod
+    def key(params):
+        return ",".join("%.6g" % p for p in params)
+
+    def get(self, params):
+        return self.candidates.get(self.key(params))
+
+    def put(self, params, value, abort):
+        self.candidates[self.key(params)] = {'params': [float(p) for p in params],
+                                             'robustness': value if np.isfinite(value) else None, 'abort': abort}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.location), exist_ok=True)
+        with open(self.location + ".tmp", 'w') as f:
+            json.dump({'setup': self.setup, 'candidates': self.candidates}, f, indent=1)
+        os.replace(self.location + ".tmp", self.location)
+
+
+def robustness(setup, population, cache, jobs=None):
+    # robustness of a population of candidates (array candidates x parameters),
+    # only the candidates that are not cached are simulated
+    # output: (robustness of each candidate, number of simulations)
+    todo = [params for params in population if cache.get(params) is None]
+    unique = list({Cache.key(params): params for params in todo}.values())
+    if unique:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for params, (value, abort) in zip(unique, pool.map(evaluate, [setup]*len(unique), unique)):
+                cache.put(params, value, abort)
+        cache.save()
+    values = []
+    for params in population:
+        entry = cache.get(params)
+        values.append(-np.inf if entry['robustness'] is None else entry['robustness'])
+    return np.array(values), len(unique)
+
+
+def crossEntropy(objective, dimension, population=16, elite=0.25, generations=10, smoothing=0.7,
+                 seed=0, stop=None, verbose=True):
+    # minimizes objective over [0, 1]^dimension with the cross-entropy method
+    # input : objective: function of an array (population x dimension)
+    #                    returning the values of the candidates
+    #         stop     : the search stops once the best value is below it
+    # output: (best candidate, best value, list of the best value of each generation)
+    rng = np.random.default_rng(seed)
+    mean = np.full(dimension, 0.5)
+    std = np.full(dimension, 0.3)
+    n_elite = max(int(np.ceil(elite*population)), 1)
+    best, best_value, history = None, np.inf, []
+    for generation in range(generations):
+        # candidates rounded so that they can be recognized in the cache
+        candidates = np.round(np.clip(rng.normal(mean, std, (population, dimension)), 0, 1), 6)
+        values = objective(candidates)
+        order = np.argsort(values, kind='stable')
+        elites = candidates[order[:n_elite]]
+        mean = smoothing*elites.mean(axis=0) + (1-smoothing)*mean
+        std = smoothing*elites.std(axis=0) + (1-smoothing)*std
+        if values[order[0]] < best_value:
+            best, best_value = candidates[order[0]], values[order[0]]
+        history.append(float(best_value))
+        if verbose:
+            print('* generation ' + str(generation+1) + ': best \033[33m%.4g\033[0m, generation median %.4g' %
+                  (best_value, np.median(values)))
+        if stop is not None and best_value < stop:
+            break
+    return best, best_value, history
+
+
+def falsify(setup, population=16, generations=10, elite=0.25, seed=0, stopAtViolation=True,
+            jobs=None, directory=CACHE, verbose=True):
+    # searches the trajectory of the space of the setup with minimum robustness
+    # output: dictionary with the best parameters, their robustness, the best
+    #         robustness of each generation and the number of simulations
+    names, low, high = SPACES[setup['space']]
+    cache = Cache(setup, directory)
+    simulations = [0]
+    def objective(candidates):
+        values, n = robustness(setup, low + candidates*(high-low), cache, jobs)
+        simulations[0] += n
+        return values
+    best, value, history = crossEntropy(objective, len(names), population, elite, generations, seed=seed,
+                                        stop=0 if stopAtViolation else None, verbose=verbose)
+    params = low + best*(high-low)
+    entry = cache.get(params)
+    return {'params': params, 'names': names, 'robustness': value, 'abort': entry['abort'],
+            'history': history, 'simulations': simulations[0], 'cached': len(cache.candidates)}
@@ -0,0 +1,110 @@
+"""
+Control performance metrics of a flight.
+* setpoint steps: for each change of set_pt and each axis that changed,
+  rise time (10% to 90% of the step), settling time (time after which the
+  response stays within the settling band), overshoot (% of the step) and
+  steady-state error (mean absolute error over the last part of the step),
+* estimation: error between estimated and true position (not for pitl),
+* innovation: statistics of the flow deck and z ranger errors (err_fd),
+* actuation: fraction of samples in which each motor command saturates.
+All the axes of a step are processed at once and each metric is computed
+with array operations over the samples of the step.
+"""
+
+import numpy as np
+
+AXES = 'xyz'
+PWM_MAX = 65535
+# step response settings
+RISE_LOW  = 0.1
+RISE_HIGH = 0.9
+SETTLING_BAND = 0.02      # fraction of the step
+SETTLING_MIN_BAND = 0.01  # m, floor of the band (noise of the estimate)
+STEADY_WINDOW = 0.5       # s, last part of the step used for the steady-state error
+
+
+def _first(mask, t, t0):
+    # time (from t0) of the first true sample of each row, nan if none
+    found = np.any(mask, axis=1)
+    return np.where(found, t[np.argmax(mask, axis=1)] - t0, np.nan)
+
+
+def steps(t, set_pt, response):
+    # step response metrics
+    # input : t: time, set_pt and response: (3, samples) matrices
+    # output: list of dictionaries, one per step and axis that changed
+    t = np.asarray(t, dtype=float)
+    set_pt = np.asarray(set_pt, dtype=float)
+    response = np.asarray(response, dtype=float)
+    changes = np.flatnonzero(np.any(np.diff(set_pt, axis=1) != 0, axis=0)) + 1
+    bounds = np.append(changes, set_pt.shape[1])
+    results = []
+    for k in range(len(changes)):
+        start, stop = bounds[k], bounds[k+1]
+        if stop - start < 2:
+            continue
+        target = set_pt[:, start]
+        moved = np.flatnonzero(set_pt[:, start] != set_pt[:, start-1])
+        y = response[moved, start:stop]
+        ts = t[start:stop]
+        t0 = ts[0]
+        amplitude = target[moved] - y[:, 0]
+        valid = np.abs(amplitude) > 1e-9
+        with np.errstate(invalid='ignore', divide='ignore'):
+            progress = (y - y[:, :1]) / amplitude[:, None]
+        rise = _first(progress >= RISE_HIGH, ts, t0) - _first(progress >= RISE_LOW, ts, t0)
+        overshoot = 100*np.maximum(np.max(progress, axis=1) - 1, 0)
+        error = np.abs(y - target[moved, None])
+        band = np.maximum(SETTLING_BAND*np.abs(amplitude), SETTLING_MIN_BAND)
+        outside = error > band[:, None]
+        # last sample outside of the band, counted from the end
+        last = outside.shape[1] - 1 - np.argmax(outside[:, ::-1], axis=1)
+        settled = ~outside[:, -1]
+        settling = np.where(~np.any(outside, axis=1), 0.0,
+                            np.where(settled, ts[np.minimum(last+1, len(ts)-1)] - t0, np.nan))
+        steady = ts >= ts[-1] - STEADY_WINDOW
+        steady_error = np.mean(error[:, steady], axis=1)
+        for i, axis in enumerate(moved):
+            if not valid[i]:
+                continue
+            results.append({'time': float(t0), 'axis': AXES[axis], 'amplitude': float(amplitude[i]),
+                            'rise_time': float(rise[i]), 'settling_time': float(settling[i]),
+                            'overshoot': float(overshoot[i]), 'steady_state_error': float(steady_error[i])})
+    return results
+
+
+def flight(data):
+    # all the metrics of a flight (data attribute of an opened Storage)
+    # output: (dictionary metric name -> value, list of step results)
+    metrics = dict()
+    pitl = getattr(data, 'type', None) == 'pitl'
+    response = data.est_pos if pitl else data.pos
+    results = steps(data.t, data.set_pt, response)
+    metrics['steps'] = len(results)
+    for name in ('rise_time', 'settling_time', 'overshoot', 'steady_state_error'):
+        values = np.array([r[name] for r in results], dtype=float)
+        metrics['max_' + name] = float(np.max(values[~np.isnan(values)])) if np.any(~np.isnan(values)) else np.nan
+    # steps whose response never reaches 90% or never settles before the next step
+    metrics['steps_not_risen'] = int(sum(np.isnan(r['rise_time']) for r in results))
+    metrics['steps_not_settled'] = int(sum(np.isnan(r['settling_time']) for r in results))
+
+    if not pitl:
+        error = np.asarray(data.est_pos, dtype=float) - np.asarray(data.pos, dtype=float)
+        for i, axis in enumerate(AXES):
+            metrics['estimation_rmse_' + axis] = float(np.sqrt(np.mean(error[i]**2)))
+            metrics['estimation_max_' + axis] = float(np.max(np.abs(error[i])))
+
+    if hasattr(data, 'err_fd'):
+        innovation = np.asarray(data.err_fd, dtype=float)
+        for row, name in ((1, 'x'), (2, 'y'), (0, 'z')): # order of Storage.unwrap
+            metrics['innovation_mean_' + name] = float(np.mean(innovation[row]))
+            metrics['innovation_std_' + name] = float(np.std(innovation[row]))
+            metrics['innovation_max_' + name] = float(np.max(np.abs(innovation[row])))
+
+    u = np.asarray(data.u, dtype=float)
+    saturated = (u <= 0) | (u >= PWM_MAX)
+    ratios = np.mean(saturated, axis=1)
+    for motor in range(u.shape[0]):
+        metrics['saturation_motor_' + str(motor+1)] = float(ratios[motor])
+    metrics['saturation_any'] = float(np.mean(np.any(saturated, axis=0)))
+    return metrics, results
@@ -0,0 +1,248 @@
+"""
+Offline monitoring of Signal Temporal Logic (STL) requirements.
+A requirement is a formula built from predicates on the signals of a flight:
+  Predicate(f)          robustness f(signals), positive when satisfied
+  Not, And, Or, Implies boolean connectives (min/max semantics)
+  Always(phi, a, b)     phi holds at every time in [t+a, t+b]
+  Eventually(phi, a, b) phi holds at some time in [t+a, t+b]
+  HoldsUntilStep(phi)   phi holds from t until the next setpoint change
+The robustness of a formula is computed for every time sample at once; its
+value at the first sample tells if (and by how much) the flight satisfies the
+requirement. Windows are clipped at the end of the trace.
+Sliding-window minimum and maximum are O(n): on uniformly sampled traces
+with the van Herk/Gil-Werman algorithm, vectorized over all the leading
+dimensions (i.e. over a batch of traces of the same length), otherwise with
+monotonic deques over the time stamps.
+"""
+
+import io
+import contextlib
+from collections import deque
+import numpy as np
+
+from mitl import Rotation
+
+
+def _vhgw(x, width, op):
+    # out[..., i] = op(x[..., i:i+width]), windows clipped at the end
+    identity = np.inf if op is np.minimum else -np.inf
+    n = x.shape[-1]
+    blocks = -(-n // width) + 1
+    padded = np.full(x.shape[:-1] + (blocks*width,), identity)
+    padded[..., :n] = x
+    shaped = padded.reshape(x.shape[:-1] + (blocks, width))
+    prefix = op.accumulate(shaped, axis=-1).reshape(padded.shape)
+    suffix = op.accumulate(shaped[..., ::-1], axis=-1)[..., ::-1].reshape(padded.shape)
+    return op(suffix[..., :n], prefix[..., width-1:width-1+n])
+
+
+def _deque(x, t, a, b, op):
+    # out[i] = op(x[j] for t[i]+a <= t[j] <= t[i]+b), monotonic deque
+    better = (lambda u, v: u <= v) if op is np.minimum else (lambda u, v: u >= v)
+    identity = np.inf if op is np.minimum else -np.inf
+    out = np.full(len(x), identity)
+    window = deque()
+    j = 0
+    for i in range(len(x)):
+        while j < len(x) and t[j] <= t[i] + b:
+            while window and better(x[j], x[window[-1]]):
+                window.pop()
+            window.append(j)
+            j = j + 1
+        while window and t[window[0]] < t[i] + a:
+            window.popleft()
+        if window:
+            out[i] = x[window[0]]
+    return out
+
+
+def sliding(x, t, a, b, op):
+    # sliding minimum (op=np.minimum) or maximum (op=np.maximum) of x over
+    # the time window [t+a, t+b]
+    x = np.asarray(x, dtype=float)
+    t = np.asarray(t, dtype=float)
+    dt = np.diff(t)
+    if len(dt) and np.allclose(dt, dt[0], rtol=1e-3, atol=0):
+        start = int(np.ceil(a/dt[0] - 1e-9))
+        stop = int(np.floor(b/dt[0] + 1e-9)) if np.isfinite(b) else x.shape[-1]
+        identity = np.inf if op is np.minimum else -np.inf
+        shifted = np.full(x.shape, identity)
+        if start < x.shape[-1]:
+            shifted[..., :x.shape[-1]-start] = x[..., start:]
+        return _vhgw(shifted, max(min(stop, x.shape[-1]) - start + 1, 1), op)
+    flat = x.reshape(-1, x.shape[-1])
+    return np.stack([_deque(row, t, a, b, op) for row in flat]).reshape(x.shape)
+
+
+class Formula:
+
+    def robustness(self, signals, t):
+        # robustness at every time sample, shape (..., samples)
+        raise NotImplementedError
+
+
+class Predicate(Formula):
+
+    def __init__(self, function, name=None):
+        self.function = function
+        self.name = name
+
+    def robustness(self, signals, t):
+        return np.asarray(self.function(signals), dtype=float)
+
+
+class Not(Formula):
+
+    def __init__(self, phi):
+        self.phi = phi
+
+    def robustness(self, signals, t):
+        return -self.phi.robustness(signals, t)
+
+
+class And(Formula):
+
+    def __init__(self, *phis):
+        self.phis = phis
+
+    def robustness(self, signals, t):
+        return np.minimum.reduce([phi.robustness(signals, t) for phi in self.phis])
+
+
+class Or(Formula):
+
+    def __init__(self, *phis):
+        self.phis = phis
+
+    def robustness(self, signals, t):
+        return np.maximum.reduce([phi.robustness(signals, t) for phi in self.phis])
+
+
+class Implies(Formula):
+
+    def __init__(self, phi, psi):
+        self.phi = phi
+        self.psi = psi
+
+    def robustness(self, signals, t):
+        return np.maximum(-self.phi.robustness(signals, t), self.psi.robustness(signals, t))
+
+
+class Always(Formula):
+
+    def __init__(self, phi, a=0.0, b=np.inf):
+        self.phi = phi
+        self.a = a
+        self.b = b
+
+    def robustness(self, signals, t):
+        return sliding(self.phi.robustness(signals, t), t, self.a, self.b, np.minimum)
+
+
+class Eventually(Formula):
+
+    def __init__(self, phi, a=0.0, b=np.inf):
+        self.phi = phi
+        self.a = a
+        self.b = b
+
+    def robustness(self, signals, t):
+        return sliding(self.phi.robustness(signals, t), t, self.a, self.b, np.maximum)
+
+
+def _segments(set_pt):
+    # start index of each segment of constant setpoint (first one is 0)
+    set_pt = np.asarray(set_pt)
+    changes = np.any(np.diff(set_pt, axis=-1) != 0, axis=tuple(range(set_pt.ndim-1)))
+    return np.concatenate(([0], np.flatnonzero(changes) + 1))
+
+
+class Step(Formula):
+    # true (infinite robustness) at the samples where the setpoint changes
+
+    def robustness(self, signals, t):
+        step = np.full(np.shape(t), -np.inf)
+        step[_segments(signals['set_pt'])[1:]] = np.inf
+        return step
+
+
+class HoldsUntilStep(Formula):
+    # phi holds from each time until the next setpoint change
+
+    def __init__(self, phi):
+        self.phi = phi
+
+    def robustness(self, signals, t):
+        rho = self.phi.robustness(signals, t)
+        out = np.empty(rho.shape)
+        bounds = np.append(_segments(signals['set_pt']), rho.shape[-1])
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            out[..., start:stop] = np.minimum.accumulate(rho[..., start:stop][..., ::-1], axis=-1)[..., ::-1]
+        return out
+
+
+def evaluate(formula, signals, t):
+    # output: (robustness of the requirement, earliest violating time or nan)
+    # for Always formulas the violating time is the first time at which the
+    # inner formula is violated, otherwise the start of the trace
+    t = np.asarray(t, dtype=float)
+    rho = formula.robustness(signals, t)
+    value = rho[..., 0]
+    if isinstance(formula, Always):
+        inner = formula.phi.robustness(signals, t)
+        relative = t - t[0]
+        violated = (inner < 0) & (relative >= formula.a) & (relative <= formula.b)
+        first = np.where(np.any(violated, axis=-1), t[np.argmax(violated, axis=-1)], np.nan)
+    else:
+        first = np.where(value < 0, t[0], np.nan)
+    return value, first
+
+
+def signals(storage):
+    # signals of an opened flight used by the requirements
+    data = storage.data
+    result = {'t': np.asarray(storage.time, dtype=float)}
+    for name in ('est_pos', 'set_pt', 'pos', 'eta', 'u'):
+        if hasattr(data, name):
+            result[name] = np.asarray(getattr(data, name), dtype=float)
+    if 'eta' not in result and hasattr(data, 'x'):
+        result['eta'] = Rotation.quaternionToEuler(np.asarray(data.x, dtype=float)[6:10].T).T
+    return result
+
+
+def settling(bound=0.05, within=2.0):
+    # after each setpoint step, |est_pos - set_pt| < bound on every axis
+    # within the given time, and it stays there until the next step
+    close = Predicate(lambda s: bound - np.max(np.abs(s['est_pos'] - s['set_pt']), axis=-2), 'close')
+    return Always(Implies(Step(), Eventually(HoldsUntilStep(close), 0, within)))
+
+
+def altitude(low=-0.05, high=1.0):
+    # estimated altitude always within bounds
+    return Always(Predicate(lambda s: np.minimum(s['est_pos'][..., 2, :] - low, high - s['est_pos'][..., 2, :]), 'altitude'))
+
+
+def attitude(limit=0.5):
+    # roll and pitch (rad) always within the limit
+    return Always(Predicate(lambda s: limit - np.max(np.abs(s['eta'][..., 0:2, :]), axis=-2), 'attitude'))
+
+
+REQUIREMENTS = {'settling': settling, 'altitude': altitude, 'attitude': attitude}
+
+
+def monitor(flight, requirements):
+    # evaluates requirements (dictionary name -> formula) on a flight
+    # output: dictionary name -> (robustness, earliest violating time)
+    from plot.Plot import Storage
+    storage = Storage()
+    with contextlib.redirect_stdout(io.StringIO()):
+        storage.open(flight, flight)
+    s = signals(storage)
+    result = dict()
+    for name, formula in requirements.items():
+        try:
+            value, first = evaluate(formula, s, s['t'])
+        except KeyError: # signal not recorded by this abstraction
+            value, first = np.nan, np.nan
+        result[name] = (float(value), float(first))
+    return result
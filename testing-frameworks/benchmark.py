@@ -0,0 +1,39 @@
+"""
+Runs the benchmarks (see benchmarks/Suite.py) and prints their timing.
+  python benchmark.py                  all the benchmarks
+  python benchmark.py ekf ctrl -r 20   some of them, 20 repetitions
+  python benchmark.py -o results.json  machine-readable results
+"""
+import sys
+import json
+import argparse
+
+from benchmarks import Suite
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="run the benchmarks")
+    parser.add_argument("names", nargs='*', default=list(Suite.BENCHMARKS),
+                        help="benchmarks to run: " + ", ".join(Suite.BENCHMARKS) + " (default: all)")
+    parser.add_argument("-r", "--repeat", type=int, default=None,
+                        help="repetitions of each benchmark (default: depends on the benchmark)")
+    parser.add_argument("--no-memory", action="store_true", help="do not measure the memory peak")
+    parser.add_argument("-o", "--output", help="json file of the results")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in Suite.BENCHMARKS]
+    if unknown:
+        parser.error("unknown benchmarks: " + ", ".join(unknown))
+
+    results = {'environment': Suite.environment(), 'benchmarks': dict()}
+    print("benchmark          median [s]     min [s]   per op [us]   peak [MiB]")
+    for name in args.names:
+        result = Suite.measure(name, args.repeat, memory=not args.no_memory)
+        results['benchmarks'][name] = result
+        print("  %-14s %11.4f %11.4f %13.2f %12s%s" %
+              (name, result['median'], result['min'], 1e6*result['per_operation'],
+               '%.2f' % (result['peak_memory']/2**20) if 'peak_memory' in result else '-',
+               '   %.2f simulated s per s' % result['simulated_per_wall'] if 'simulated_per_wall' in result else ''))
+        sys.stdout.flush()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
@@ -0,0 +1,144 @@
+"""
+Store of performance baselines and comparison between them.
+A baseline collects the repeated samples of the benchmarks (see Suite.py)
+and the simulation speed of test flights (simulated seconds per wall-clock
+second, from the profile saved with MitL, SitL and HitL flights) measured
+on a given code version and machine. Baselines are json files in the
+baselines directory, keyed by git commit, Python version and a fingerprint
+of the host, so that only comparable measurements are compared. Recording
+the same key again adds samples to the baseline.
+Two baselines are compared benchmark by benchmark with the Mann-Whitney U
+test on the samples and a bootstrap confidence interval of the ratio of the
+medians: a change is reported only if it is significant and larger than the
+tolerance. Metrics with too few samples on either side to ever reach the
+significance level are reported as insufficient.
+"""
+
+import os
+import json
+import hashlib
+from math import comb
+import numpy as np
+from scipy import stats
+
+from benchmarks import Suite
+
+DIRECTORY = "benchmarks/baselines"
+# metrics where larger is better, all the others are times
+SPEEDS = ('simulated_per_wall',)
+
+
+def hostFingerprint(environment):
+    # short hash of the properties of the machine that affect the timing
+    keys = ('host', 'machine', 'processor', 'system', 'cpus', 'implementation')
+    description = json.dumps([environment.get(k) for k in keys])
+    return hashlib.sha1(description.encode()).hexdigest()[:12]
+
+
+def key(environment):
+    commit = (environment.get('commit') or 'unknown')[:12] + ('+dirty' if environment.get('dirty') else '')
+    return commit + '_py' + environment.get('python', '?') + '_' + hostFingerprint(environment)
+
+
+def load(location):
+    with open(location) as f:
+        return json.load(f)
+
+
+def record(environment, samples, directory=DIRECTORY):
+    # adds samples to the baseline of the given environment
+    # input : samples: dictionary benchmark -> metric -> list of values
+    # output: path of the baseline
+    os.makedirs(directory, exist_ok=True)
+    location = os.path.join(directory, key(environment) + ".json")
+    baseline = load(location) if os.path.isfile(location) else \
+               {'environment': environment, 'host': hostFingerprint(environment), 'benchmarks': dict()}
+    for name, metrics in samples.items():
+        stored = baseline['benchmarks'].setdefault(name, dict())
+        for metric, values in metrics.items():
+            stored.setdefault(metric, []).extend(float(v) for v in values)
+    with open(location + ".tmp", 'w') as f:
+        json.dump(baseline, f, indent=1)
+    os.replace(location + ".tmp", location)
+    return location
+
+
+def fromResults(results):
+    # samples of the results of benchmark.py
+    samples = dict()
+    for name, result in results['benchmarks'].items():
+        samples[name] = {'time': result['samples']}
+        if name in Suite.SIMULATED:
+            samples[name]['simulated_per_wall'] = [Suite.SIMULATED[name]/s for s in result['samples']]
+    return samples
+
+
+def fromFlight(data):
+    # simulation speed of a flight with a profile (see mitl/Profiler.py)
+    # output: (benchmark name, samples) or None
+    if not hasattr(data, 'profile'):
+        return None
+    t = np.asarray(data.t, dtype=float)
+    wall = np.sum(np.asarray(data.profile, dtype=np.int64))/1e9
+    if wall <= 0 or len(t) < 2:
+        return None
+    return 'flight_' + str(data.type), {'simulated_per_wall': [(t[-1]-t[0])/wall]}
+
+
+def find(reference, directory=DIRECTORY):
+    # baselines whose key starts with reference (a commit prefix or a key)
+    if os.path.isfile(reference):
+        return [reference]
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                  if f.endswith(".json") and f.startswith(reference))
+
+
+def bootstrapRatio(base, new, resamples=10000, confidence=0.95, seed=0):
+    # bootstrap confidence interval of median(new)/median(base)
+    rng = np.random.default_rng(seed)
+    base = np.asarray(base, dtype=float)
+    new = np.asarray(new, dtype=float)
+    b = np.median(rng.choice(base, (resamples, len(base))), axis=1)
+    n = np.median(rng.choice(new, (resamples, len(new))), axis=1)
+    ratios = n/b
+    alpha = (1-confidence)/2
+    return float(np.quantile(ratios, alpha)), float(np.quantile(ratios, 1-alpha))
+
+
+def minimumPvalue(n, m):
+    # smallest p-value the two-sided Mann-Whitney U test can give with n and
+    # m samples (all the samples of one side below the other side)
+    return min(2/comb(n+m, n), 1.0) if n and m else 1.0
+
+
+def compare(base, new, tolerance=0.05, alpha=0.05):
+    # compares two baselines (as loaded from their files)
+    # output: list of dictionaries, one per benchmark metric in both
+    rows = []
+    for name in sorted(set(base['benchmarks']) & set(new['benchmarks'])):
+        for metric in sorted(set(base['benchmarks'][name]) & set(new['benchmarks'][name])):
+            a = base['benchmarks'][name][metric]
+            b = new['benchmarks'][name][metric]
+            ratio = float(np.median(b)/np.median(a))
+            low, high = bootstrapRatio(a, b)
+            if len(a) > 1 and len(b) > 1:
+                pvalue = float(stats.mannwhitneyu(a, b, alternative='two-sided').pvalue)
+            else: # a single sample can not tell anything
+                pvalue = 1.0
+            # for speeds a smaller value is worse, for times a larger one
+            worse = (1/ratio if metric in SPEEDS else ratio) - 1
+            significant = pvalue < alpha and (low > 1 or high < 1)
+            if minimumPvalue(len(a), len(b)) >= alpha:
+                verdict = 'insufficient' # more samples needed to tell anything
+            elif significant and worse > tolerance:
+                verdict = 'slower'
+            elif significant and worse < -tolerance:
+                verdict = 'faster'
+            else:
+                verdict = 'same'
+            rows.append({'benchmark': name, 'metric': metric, 'base': float(np.median(a)), 'new': float(np.median(b)),
+                         'ratio': ratio, 'low': low, 'high': high, 'pvalue': pvalue,
+                         'samples': (len(a), len(b)), 'verdict': verdict})
+    return rows
@@ -0,0 +1,213 @@
+"""
+Benchmarks of the building blocks of the testing setups.
+Every benchmark runs on fixed inputs (checked-in flight data and recordings,
+synthetic firmware replies, fixed seeds), so that results are comparable
+across runs and commits:
+  simulate   cfSim.simulate, one physics step with hover inputs
+  ekf        cfEKF.runEKF on the measurements of the MitL nominal flight
+  ctrl       cfCtrl.ctrlCompute on the states of the MitL nominal flight
+  decode     cfusdlog.decode of the PitL nominal recording
+  save_csv   Storage.save_csv of the MitL nominal flight
+  sitl_parse cfSITL.write_read on a synthetic Renode reply (no connection)
+  mitl       end-to-end 10 s MitL flight (mitl_main.runTest, not saved)
+A benchmark is a function returning (run, operations) or (run, operations,
+cleanup): run is the timed callable, its setup is not timed; operations is
+the number of operations performed by one call, used to report the time per
+operation; cleanup, if given, is called once the measurements are over.
+"""
+
+import io
+import os
+import gc
+import time
+import socket
+import platform
+import subprocess
+import tempfile
+import tracemalloc
+import contextlib
+import numpy as np
+
+MITL_FLIGHT = "mitl/flightdata/nominal"
+PITL_RECORDING = "pitl/recordings/nominal"
+
+
+def _open(location):
+    from plot.Plot import Storage
+    storage = Storage()
+    with contextlib.redirect_stdout(io.StringIO()):
+        storage.open(location, os.path.basename(location))
+    return storage
+
+
+def simulate(steps=1000):
+    from mitl.Model import cfSim
+    def run():
+        physics = cfSim(seed=1)
+        u = np.full(physics.n_inputs, 42000.0)
+        for i in range(1, steps+1):
+            physics.simulate(i*0.001, u)
+    return run, steps
+
+
+def ekf(steps=2000):
+    from mitl.StateEstimator import cfEKF
+    data = _open(MITL_FLIGHT).data
+    acc = np.array(data.acc[:, :steps]).T
+    gyro = np.array(data.gyro[:, :steps]).T
+    pxCount = np.array(data.pxCount[:, :steps]).T
+    zrange = np.array(data.zrange[:steps])
+    def run():
+        est = cfEKF(9.81)
+        for i in range(steps):
+            est.runEKF(acc[i], gyro[i], pxCount[i], zrange[i])
+    return run, steps
+
+
+def ctrl(steps=2000):
+    from mitl.Model import cfSim
+    from mitl.Controller import cfCtrl
+    data = _open(MITL_FLIGHT).data
+    physics = cfSim(seed=1)
+    set_pt = np.array(data.set_pt[:, :steps]).T
+    pos = np.array(data.est_pos[:, :steps]).T
+    vel = np.array(data.est_vel[:, :steps]).T
+    eta = np.array(data.est_eta[:, :steps]).T
+    gyro = np.array(data.gyro[:, :steps]).T
+    def run():
+        controller = cfCtrl("step", physics.config, physics.b, physics.I, physics.m, physics.g, physics.k, physics.l)
+        for i in range(steps):
+            controller.ctrlCompute(set_pt[i], pos[i], vel[i], eta[i], gyro[i])
+    return run, steps
+
+
+def decode():
+    from pitl import cfusdlog
+    def run():
+        cfusdlog.decode(PITL_RECORDING)
+    return run, 1
+
+
+def save_csv():
+    storage = _open(MITL_FLIGHT)
+    directory = tempfile.TemporaryDirectory(prefix="benchmark_")
+    location = os.path.join(directory.name, "flight.csv")
+    def run():
+        storage.save_csv(location)
+    return run, 1, directory.cleanup
+
+
+class _Socket:
+    # stands in for the connection to Renode: sent commands are discarded
+    def sendall(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+def sitl_parse(calls=2000):
+    import warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning) # telnetlib
+        from sitl.cfSitl import cfSITL
+    names = ['accpx', 'range_last', 'stateCompressed_x', 'stateCompressed_vx', 'setpointCompressed_x',
+             'error_tof', 'error_flowx', 'error_flowy']
+    block = lambda values: b"[ " + b" ".join(b"0x%02x," % v for v in values) + b" ]"
+    # echo of the command, three ReadBytes and three ReadWord replies, prompt
+    reply = b"sysbus.i2c3.bmi_accel FeedAccSample ...\n\r" + \
+            block([0x10, 0x00, 0xf0, 0xff, 0xf4, 0x01]) + b"\r\n" + \
+            block([0x02, 0x00, 0xfe, 0xff, 0x00, 0x00]) + b"\r\n" + \
+            block([0x00, 0x00, 0x00, 0x00, 0xf4, 0x01]) + b"\r\n" + \
+            b"0x0005\r\n0xfffb\r\n0x0001\r\n\x1b[0m(CF2.1) "
+    cyber = cfSITL.__new__(cfSITL) # no connection
+    cyber._addr_book = {name: "0x%x" % (0x20000000 + 16*i) for i, name in enumerate(names)}
+    cyber.gyroBias = [0, 0, 0]
+    cyber.sock = _Socket()
+    cyber.eof = 0
+    cyber.rawq = b''
+    cyber.irawq = 0
+    cyber.iacseq = b''
+    cyber.sb = 0
+    cyber.sbdataq = b''
+    cyber.option_callback = None
+    cyber.debuglevel = 0
+    acc, gyro, dpx = [0.1, -0.2, 9.81], [0.01, 0.02, -0.01], [3, -2]
+    def run():
+        for _ in range(calls):
+            cyber.cookedq = reply # reply already received
+            cyber.write_read(acc, gyro, dpx, 0.5, "0.001")
+    return run, calls
+
+
+def mitl():
+    import mitl_main
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            mitl_main.runTest(t_final=SIMULATED['mitl']) # nominal flight, not saved
+    return run, 1
+
+
+# simulated time of one run of the benchmarks that simulate the drone [s]
+SIMULATED = {'simulate': 1.0, 'mitl': 10.0}
+
+# name -> (benchmark, default number of repetitions)
+BENCHMARKS = {'simulate': (simulate, 7), 'ekf': (ekf, 7), 'ctrl': (ctrl, 7), 'decode': (decode, 7),
+              'save_csv': (save_csv, 7), 'sitl_parse': (sitl_parse, 7), 'mitl': (mitl, 5)}
+
+
+def measure(name, repeat=None, warmup=1, memory=True):
+    # runs a benchmark
+    # output: dictionary with the wall time of each repetition [s], the time
+    #         per operation [s] (median) and the peak of allocated memory [bytes]
+    benchmark, default = BENCHMARKS[name]
+    repeat = default if repeat is None else repeat
+    run, operations, *cleanup = benchmark()
+    samples = []
+    enabled = gc.isenabled()
+    try:
+        for _ in range(warmup):
+            run()
+        for _ in range(repeat):
+            gc.collect()
+            gc.disable() # collections would add noise to the timing
+            start = time.perf_counter()
+            run()
+            samples.append(time.perf_counter() - start)
+            if enabled:
+                gc.enable()
+        peak = None
+        if memory: # separate run, tracing allocations slows down the code
+            tracemalloc.start()
+            try:
+                run()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    finally:
+        if enabled:
+            gc.enable()
+        for function in cleanup:
+            function()
+    result = {'samples': samples, 'operations': operations,
+              'median': float(np.median(samples)), 'min': float(np.min(samples)),
+              'per_operation': float(np.median(samples))/operations}
+    if name in SIMULATED:
+        result['simulated_per_wall'] = SIMULATED[name]/result['median']
+    if peak is not None:
+        result['peak_memory'] = peak
+    return result
+
+
+def environment():
+    # description of the code and machine the benchmarks run on
+    def git(*args):
+        try:
+            return subprocess.run(("git",) + args, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {'commit': git("rev-parse", "HEAD"), 'dirty': bool(git("status", "--porcelain", "--untracked-files=no")),
+            'python': platform.python_version(), 'implementation': platform.python_implementation(),
+            'numpy': np.__version__, 'machine': platform.machine(), 'processor': platform.processor(),
+            'system': platform.platform(), 'host': socket.gethostname(), 'cpus': os.cpu_count(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime())}
@@ -0,0 +1,161 @@
+"""
+Incremental build of the pdf plots of all the flight data.
+Every flight in the flightdata directory of each testing setup is plotted
+to the pdf directory of the same setup (hitl/flightdata/nominal ->
+hitl/pdf/nominal.pdf). A flight is plotted again only if its pdf is missing
+or if the flight data or the plotting code changed since the last build:
+modification time and hash of each flight are recorded in pdf/.build.json.
+Stale flights are plotted in parallel, each job in its own working
+directory, so that the intermediate files of lualatex never clash.
+"""
+import io
+import os
+import json
+import glob
+import shutil
+import hashlib
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+from plot import Columnar
+
+MANIFEST = ".build.json"
+# files whose changes invalidate all the plots
+PLOT_SOURCES = ["plot/Plot.py", "plot/Decimate.py", "plot/Export.py", "plot/Columnar.py"]
+
+def hashFiles(paths):
+    # sha1 of the content of the given files, in order
+    h = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+def flightFiles(flight):
+    # files containing the data of a flight (pickle file or columnar directory)
+    if os.path.isdir(flight):
+        return sorted(os.path.join(flight, f) for f in os.listdir(flight))
+    return [flight]
+
+def flightMtime(flight):
+    return max(os.path.getmtime(f) for f in flightFiles(flight))
+
+def findFlights(setups):
+    # output: list of (flight, pdf file, manifest, manifest key) tuples
+    found = []
+    for setup in setups:
+        source = os.path.join(setup, "flightdata")
+        target = os.path.join(setup, "pdf")
+        for flight in Columnar.flights(source):
+            key = os.path.relpath(flight, source)
+            found.append((flight, os.path.join(target, key + ".pdf"), os.path.join(target, MANIFEST), key))
+    return found
+
+def loadManifest(location):
+    if not os.path.isfile(location):
+        return dict()
+    with open(location) as f:
+        return json.load(f)
+
+def saveManifest(location, manifest):
+    os.makedirs(os.path.dirname(location), exist_ok=True)
+    with open(location + ".tmp", 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(location + ".tmp", location)
+
+def isStale(flight, pdf, record, config):
+    # output: (stale, hash of the flight or None if not computed)
+    if record is None or not os.path.isfile(pdf) or record.get('config') != config:
+        return True, None
+    if record.get('mtime') == flightMtime(flight): # cheap check first
+        return False, record.get('hash')
+    digest = hashFiles(flightFiles(flight))
+    return digest != record.get('hash'), digest
+
+def build(flight, pdf, backend, points):
+    # worker: plots a single flight in an isolated working directory
+    from plot.Plot import Storage
+    name = os.path.basename(pdf)[:-len(".pdf")]
+    flight = os.path.abspath(flight)
+    pdf = os.path.abspath(pdf)
+    workdir = tempfile.mkdtemp(prefix="build_pdf_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        with contextlib.redirect_stdout(io.StringIO()): # keep the build log readable
+            storage = Storage()
+            storage.open(flight, name)
+            if backend == "latex":
+                storage.pdf(name, points)
+            else:
+                storage.render_pdf(name + ".pdf", points)
+        if not os.path.isfile(name + ".pdf"):
+            raise RuntimeError("no pdf produced (is lualatex installed?)")
+        os.makedirs(os.path.dirname(pdf), exist_ok=True)
+        shutil.move(name + ".pdf", pdf)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="plot all the stale flight data to pdf")
+    parser.add_argument("setups", nargs='*', default=sorted(os.path.dirname(d) for d in glob.glob("*/flightdata")),
+                        help="testing setup directories (default: all the ones with a flightdata directory)")
+    parser.add_argument("-b", "--backend", choices=("latex", "matplotlib"), default="latex",
+                        help="plotting backend: lualatex (Storage.pdf) or matplotlib (Storage.render_pdf)")
+    parser.add_argument("-p", "--points", type=int, default=None,
+                        help="points per plotted trace (default: plot.Plot.pdf_points)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: number of cpus)")
+    parser.add_argument("-f", "--force", action="store_true", help="plot all the flights")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="only list the stale flights")
+    args = parser.parse_args()
+
+    if args.points is None:
+        from plot import Plot
+        args.points = Plot.pdf_points
+    # plots must be rebuilt if the plotting code or options change
+    config = {'backend': args.backend, 'points': args.points, 'code': hashFiles(PLOT_SOURCES)}
+
+    manifests = dict()
+    jobs = []
+    for flight, pdf, manifest, key in findFlights(args.setups):
+        if manifest not in manifests:
+            manifests[manifest] = loadManifest(manifest)
+        record = manifests[manifest].get(key)
+        stale, digest = (True, None) if args.force else isStale(flight, pdf, record, config)
+        if not stale:
+            if record.get('mtime') != flightMtime(flight): # content unchanged, just touched
+                record['mtime'] = flightMtime(flight)
+            continue
+        jobs.append((flight, pdf, manifest, key, digest))
+    print('* stale flights: \033[33m' + str(len(jobs)) + '\033[0m')
+
+    if args.dry_run:
+        for flight, pdf, _, _, _ in jobs:
+            print('  ' + flight + ' -> ' + pdf)
+        exit()
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [(job, pool.submit(build, job[0], job[1], args.backend, args.points)) for job in jobs]
+        for (flight, pdf, manifest, key, digest), future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                failed = failed + 1
+                print('\033[91mError:\033[0m ' + flight + ': ' + str(e))
+                continue
+            manifests[manifest][key] = {'mtime': flightMtime(flight),
+                                        'hash': digest if digest is not None else hashFiles(flightFiles(flight)),
+                                        'config': config}
+            print('* built: \033[33m' + pdf + '\033[0m')
+
+    for manifest, content in manifests.items():
+        if content:
+            saveManifest(manifest, content)
+    if failed:
+        exit(1)
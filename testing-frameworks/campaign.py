@@ -0,0 +1,93 @@
+"""
+Campaign of MitL tests over faults, seeds, references and feedback (see
+analysis/Campaign.py). Only the tests that are not in the cache (new cells,
+or cells whose code changed) are run, in parallel; the detection rate of
+each fault is printed at the end.
+  python campaign.py -f slowTick initalPos -s 1 2 3 -r step circle --noise 0.05
+With --sequential the seeds of each cell are run in batches until the
+confidence intervals of its detection rate and of the quantile of its
+tracking error are narrow enough.
+  python campaign.py -f nominal slowTick -r step --noise 0.05 --sequential --width 0.2
+"""
+import csv
+import argparse
+
+from mitl.Faults import FAULTS
+from analysis import Campaign
+
+def fault(text):
+    # "nominal" for the test without faults
+    return None if text == "nominal" else text
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="campaign of MitL tests with injected faults")
+    parser.add_argument("-f", "--faults", type=fault, nargs='+', default=[None] + list(FAULTS),
+                        help="faults with optional parameters (see mitl/Faults.py) and 'nominal' (default: all)")
+    parser.add_argument("-s", "--seeds", type=int, nargs='+', default=[1], help="seeds of the noise (default: 1)")
+    parser.add_argument("-r", "--references", nargs='+', default=["step", "zsinus", "circle", "spiral"],
+                        choices=Campaign.REFERENCES, help="reference trajectories (default: step zsinus circle spiral)")
+    parser.add_argument("-k", "--feedback", nargs='+', default=["kalman", "true"], choices=["kalman", "true"],
+                        help="feedback from the estimator and/or the true state (default: both)")
+    parser.add_argument("--noise", type=float, default=0, help="gain of the measurement noise (default: 0)")
+    parser.add_argument("-t", "--duration", type=float, default=10, help="duration of the tests [s] (default: 10)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: number of cpus)")
+    parser.add_argument("--cache", default=Campaign.CACHE, help="directory of the cached results")
+    parser.add_argument("--force", action="store_true", help="run also the cached tests")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="only count the tests to run")
+    parser.add_argument("-o", "--output", help="csv file with the result of every test")
+    sequential = parser.add_argument_group("sequential sampling")
+    sequential.add_argument("--sequential", action="store_true", help="run seeds in batches until the intervals are narrow")
+    sequential.add_argument("--batch", type=int, default=10, help="seeds run at once for each cell (default: 10)")
+    sequential.add_argument("--width", type=float, default=0.2,
+                            help="target width of the interval of the detection rate (default: 0.2)")
+    sequential.add_argument("--quantile", type=float, default=0.95,
+                            help="quantile of the tracking error (default: 0.95)")
+    sequential.add_argument("--quantile-width", type=float, default=None,
+                            help="target width of the interval of the quantile [m] (default: ignored)")
+    sequential.add_argument("--max-runs", type=int, default=100, help="maximum number of seeds per cell (default: 100)")
+    sequential.add_argument("--confidence", type=float, default=0.95, help="confidence level of the intervals (default: 0.95)")
+    args = parser.parse_args()
+
+    configs = Campaign.matrix(args.faults, args.seeds, args.references,
+                              [kalman == "kalman" for kalman in args.feedback], args.noise, args.duration)
+    if args.sequential:
+        cells = [{k: v for k, v in config.items() if k != 'seed'} for config in
+                 Campaign.matrix(args.faults, [0], args.references, [kalman == "kalman" for kalman in args.feedback],
+                                 args.noise, args.duration)]
+        rows = Campaign.sequential(cells, args.batch, args.width, args.quantile, args.quantile_width, args.max_runs,
+                                   args.confidence, args.jobs, args.cache)
+        print('cell                               runs   rate  interval       q%-5g interval' % args.quantile)
+        for row in rows:
+            print('  %-32s %4d %6.2f  [%.2f, %.2f]  %7.4f  [%.4f, %.4f]%s' %
+                  (Campaign.describe(row['cell']), row['runs'], row['rate'], row['low'], row['high'], row['quantile'],
+                   row['quantile_low'], row['quantile_high'], '' if row['converged'] else '  \033[33mnot converged\033[0m'))
+        exit(0)
+
+    if args.dry_run:
+        version = Campaign.codeVersion()
+        missing = [c for c in configs if args.force or Campaign.load(c, version, args.cache) is None]
+        print('* ' + str(len(configs)) + ' tests, \033[33m' + str(len(missing)) + '\033[0m to run')
+        for config in missing:
+            print('  ' + Campaign.describe(config))
+        exit(0)
+
+    results = Campaign.run(configs, args.jobs, args.cache, args.force)
+
+    print('fault              tests  detected   rate  aborted')
+    for row in Campaign.summary(results):
+        name = 'nominal (failed)' if row['fault'] is None else row['fault']
+        print('  %-16s %5d %9d %6.2f %8d' % (name, row['tests'], row['detected'], row['rate'], row['aborted']))
+
+    if args.output:
+        detected = {id(result): (found, violated) for result, found, violated in Campaign.detections(results)}
+        names = sorted({name for result in results for name in result['robustness']})
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['fault', 'seed', 'reference', 'useKalmanFilter', 'abort'] + names + ['detected', 'violated'])
+            for result in results:
+                config = result['config']
+                found, violated = detected.get(id(result), ('', []))
+                writer.writerow([config['fault'] or 'nominal', config['seed'], config['reference'],
+                                 config['useKalmanFilter'], result['abort'] or ''] +
+                                [result['robustness'][name] for name in names] + [found, ' '.join(violated)])
@@ -0,0 +1,63 @@
+"""
+Command line interface of the flight data catalog (see analysis/Catalog.py).
+  python catalog.py update [setups]   indexes new and changed flights
+  python catalog.py query [filters]   lists the selected flights
+  python catalog.py sql "SELECT ..."  runs a query on the catalog
+"""
+import os
+import glob
+import argparse
+
+from analysis import Catalog
+
+def printRows(rows):
+    if not rows:
+        print('no flights')
+        return
+    columns = rows[0].keys()
+    widths = [max(len(c), max(len(str(r[c])) for r in rows)) for c in columns]
+    print('  '.join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(str(row[c]).ljust(w) for c, w in zip(columns, widths)))
+
+def metricBound(text):
+    # name:min:max (min or max can be empty)
+    name, low, high = text.split(':')
+    return name, (float(low) if low else None, float(high) if high else None)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="catalog of the flight data")
+    parser.add_argument("-d", "--database", default=Catalog.DEFAULT_DB, help="catalog file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    update = commands.add_parser("update", help="index new and changed flights")
+    update.add_argument("setups", nargs='*', default=sorted(os.path.dirname(d) for d in glob.glob("*/flightdata")),
+                        help="testing setup directories (default: all the ones with a flightdata directory)")
+
+    query = commands.add_parser("query", help="list the selected flights")
+    query.add_argument("-a", "--abstraction", nargs='+', help="e.g. sitl hitl")
+    query.add_argument("-b", "--bug", nargs='+', help="e.g. timingKalman")
+    query.add_argument("--min-duration", type=float, help="minimum duration [s]")
+    query.add_argument("--max-duration", type=float, help="maximum duration [s]")
+    query.add_argument("-m", "--metric", type=metricBound, action='append', default=[],
+                       help="bound on a summary metric as name:min:max, e.g. tracking_rmse_z::0.05")
+    query.add_argument("--paths", action="store_true", help="only print the paths of the flights")
+
+    sql = commands.add_parser("sql", help="run a query on the catalog")
+    sql.add_argument("statement")
+    args = parser.parse_args()
+
+    db = Catalog.connect(args.database)
+    if args.command == "update":
+        indexed, removed = Catalog.update(db, args.setups)
+        print('* indexed flights: \033[33m' + str(indexed) + '\033[0m, removed: \033[33m' + str(removed) + '\033[0m')
+    elif args.command == "query":
+        rows = Catalog.select(db, args.abstraction, args.bug, args.min_duration, args.max_duration, dict(args.metric))
+        if args.paths:
+            for row in rows:
+                print(row['path'])
+        else:
+            printRows(rows)
+    else:
+        printRows(db.execute(args.statement).fetchall())
+    db.close()
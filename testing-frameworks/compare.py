@@ -0,0 +1,56 @@
+"""
+Comparison of the same test across abstractions (see analysis/Compare.py).
+The flights are selected from the catalog (see catalog.py) and grouped by bug
+name (spellings of the same bug are merged, see Compare.BUG_ALIASES), then
+all the pairs of flights of each group are compared.
+  python compare.py -b timingKalman -a mitl sitl hitl pitl
+"""
+import os
+import csv
+import glob
+import argparse
+
+from analysis import Catalog
+from analysis import Compare
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compare flights of different abstractions")
+    parser.add_argument("-d", "--database", default=Catalog.DEFAULT_DB, help="catalog file")
+    parser.add_argument("-a", "--abstraction", nargs='+', help="abstractions to compare (default: all)")
+    parser.add_argument("-b", "--bug", nargs='+', help="bugs to compare (default: all)")
+    parser.add_argument("-c", "--channels", nargs='+', default=['est_pos'],
+                        help="channels to compare, Storage attributes or fields (default: est_pos)")
+    parser.add_argument("-t", "--threshold", type=float, default=0.1,
+                        help="difference defining a divergence (default: 0.1)")
+    parser.add_argument("--dt", type=float, default=None, help="step of the common time grid [s]")
+    parser.add_argument("-o", "--output", help="csv file of the results")
+    parser.add_argument("--no-update", action="store_true", help="do not update the catalog first")
+    args = parser.parse_args()
+
+    db = Catalog.connect(args.database)
+    if not args.no_update:
+        Catalog.update(db, sorted(os.path.dirname(d) for d in glob.glob("*/flightdata")), verbose=False)
+    groups = dict()
+    bugs = None if args.bug is None else {Compare.bugName(bug) for bug in args.bug}
+    for row in Catalog.select(db, args.abstraction):
+        bug = Compare.bugName(row['bug'])
+        if bugs is None or bug in bugs:
+            groups.setdefault(bug, []).append(row['path'])
+    db.close()
+
+    results = []
+    for bug, flights in sorted(groups.items(), key=lambda g: str(g[0])):
+        if len(flights) < 2:
+            continue
+        print('* comparing \033[33m' + str(bug) + '\033[0m (' + str(len(flights)) + ' flights)')
+        for a, b, name, rmse, deviation, diverged in Compare.compare(flights, args.channels, args.threshold, args.dt):
+            results.append((bug, a, b, name, rmse, deviation, diverged))
+            print('  %-32s %-32s %-12s rmse %.4f  max %.4f  %s' %
+                  (a, b, name, rmse, deviation,
+                   'did not diverge' if diverged != diverged else 'diverged at %.3f s' % diverged))
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['bug', 'flight_a', 'flight_b', 'channel', 'rmse', 'max_deviation', 'divergence'])
+            writer.writerows(results)
@@ -0,0 +1,47 @@
+"""
+Converts pickled flight data into the columnar format (see plot/Columnar.py).
+By default all the flights in the flightdata directories of the testing setups
+are converted in place: each pickle is replaced by a directory with the same
+name, so existing paths keep working with plot_main.py.
+"""
+import os
+import glob
+import argparse
+
+from plot import Columnar
+from plot.Plot import loadPickle
+
+def convert(source, destination):
+    # converts a single pickled flight, destination can be equal to source
+    data = loadPickle(source)
+    if os.path.abspath(source) == os.path.abspath(destination):
+        tmp = source + ".pickle"
+        os.rename(source, tmp)
+        try:
+            Columnar.write(destination, data)
+        except Exception:
+            os.rename(tmp, source) # restore the original file
+            raise
+        os.remove(tmp)
+    else:
+        os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+        Columnar.write(destination, data)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="convert pickled flight data into the columnar format")
+    parser.add_argument("directories", nargs='*', default=sorted(glob.glob("*/flightdata")) + ["plot/example_data"],
+                        help="directories with the flight data (default: */flightdata and plot/example_data)")
+    parser.add_argument("-o", "--output", default=None,
+                        help="write the converted flights here instead of converting in place")
+    args = parser.parse_args()
+
+    for directory in args.directories:
+        for flight in Columnar.flights(directory):
+            if Columnar.isColumnar(flight):
+                continue
+            if args.output is None:
+                destination = flight
+            else:
+                destination = os.path.join(args.output, os.path.normpath(flight))
+            convert(flight, destination)
+            print('* converted: \033[33m' + flight + '\033[0m -> ' + destination)
@@ -0,0 +1,54 @@
+"""
+Search of the reference trajectories that violate a requirement in MitL
+(see analysis/Falsification.py and mitl/Reference.py). The exit code is 1
+if a violating trajectory is found.
+  python falsify.py -s steps -q settling -f timingKalman -p 16 -g 10
+"""
+import argparse
+
+from mitl.Faults import FAULTS
+from mitl.Reference import SPACES, cfReference
+from analysis import STL
+from analysis import Falsification
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="falsification of requirements over reference trajectories")
+    parser.add_argument("-s", "--space", default="steps", choices=list(SPACES), help="space of trajectories (default: steps)")
+    parser.add_argument("-q", "--requirement", default="settling", choices=list(STL.REQUIREMENTS),
+                        help="requirement to falsify (default: settling)")
+    parser.add_argument("-f", "--fault", default=None,
+                        help="fault to inject, with optional parameters (one of: " + ", ".join(FAULTS) + ")")
+    parser.add_argument("-k", "--feedback", default="kalman", choices=["kalman", "true"],
+                        help="feedback from the estimator or the true state (default: kalman)")
+    parser.add_argument("--noise", type=float, default=0, help="gain of the measurement noise (default: 0)")
+    parser.add_argument("-t", "--duration", type=float, default=10, help="duration of the tests [s] (default: 10)")
+    parser.add_argument("-p", "--population", type=int, default=16, help="candidates per generation (default: 16)")
+    parser.add_argument("-g", "--generations", type=int, default=10, help="maximum number of generations (default: 10)")
+    parser.add_argument("-e", "--elite", type=float, default=0.25,
+                        help="fraction of the population the distribution is fit on (default: 0.25)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the search (default: 0)")
+    parser.add_argument("--continue", dest="keep_going", action="store_true",
+                        help="search for the minimum robustness also after a violation is found")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: number of cpus)")
+    parser.add_argument("--cache", default=Falsification.CACHE, help="directory of the evaluated candidates")
+    parser.add_argument("--save", action="store_true", help="save the flight of the best trajectory in mitl/flightdata/falsified")
+    args = parser.parse_args()
+
+    setup = Falsification.setup(args.space, args.requirement, args.fault, args.feedback == "kalman",
+                                args.noise, 1, args.duration)
+    result = Falsification.falsify(setup, args.population, args.generations, args.elite, args.seed,
+                                   not args.keep_going, args.jobs, args.cache)
+
+    reference = cfReference(args.space, result['params'])
+    print('* simulations: ' + str(result['simulations']) + ' (candidates in the cache: ' + str(result['cached']) + ')')
+    print('* best trajectory: \033[33m' + reference.describe() + '\033[0m')
+    print('* robustness of ' + args.requirement + ': %.4g' % result['robustness'] +
+          (' (stopped by the monitor: ' + result['abort'] + ')' if result['abort'] else ''))
+    if args.save:
+        import mitl_main
+        storeObj = mitl_main.runTest(reference, args.fault, 1, args.noise, args.feedback == "kalman", t_final=args.duration)
+        storeObj.save("mitl/flightdata/falsified")
+    if result['robustness'] < 0:
+        print('\033[91mRequirement ' + args.requirement + ' violated\033[0m')
+        exit(1)
@@ -0,0 +1,98 @@
+"""
+Control performance metrics of many flights (see analysis/Metrics.py).
+The flights in the given files or directories are processed in parallel and
+the results are printed as a table, one row per flight. Limits on the metrics
+can be given to use the command as a check (e.g. in continuous integration):
+the exit code is 1 if any flight exceeds a limit.
+  python metrics.py hitl/flightdata -l max_overshoot:30 -l saturation_any:0.05
+"""
+import io
+import os
+import csv
+import json
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+from plot import Columnar
+
+def compute(flight):
+    # worker: metrics of a single flight
+    from plot.Plot import Storage
+    from analysis import Metrics
+    storage = Storage()
+    with contextlib.redirect_stdout(io.StringIO()):
+        storage.open(flight, flight)
+    metrics, steps = Metrics.flight(storage.data)
+    return metrics, steps
+
+def withoutNan(value):
+    # NaN (undefined metric, e.g. a step that never settles) as None, so
+    # that the json output is valid for strict parsers
+    if isinstance(value, dict):
+        return {k: withoutNan(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [withoutNan(v) for v in value]
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+def limit(text):
+    # name:max
+    name, high = text.split(':')
+    return name, float(high)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="control performance metrics of flights")
+    parser.add_argument("sources", nargs='+', help="flight data or directories containing flight data")
+    parser.add_argument("-c", "--columns", nargs='+', default=None,
+                        help="metrics to print (default: step metrics and saturation)")
+    parser.add_argument("-l", "--limit", type=limit, action='append', default=[],
+                        help="maximum value of a metric as name:max, exit code 1 if exceeded")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: number of cpus)")
+    parser.add_argument("-o", "--output", help="csv file with all the metrics of all the flights")
+    parser.add_argument("--json", help="json file with all the metrics and the step responses")
+    args = parser.parse_args()
+
+    flights = []
+    for source in args.sources:
+        flights.extend(Columnar.flights(source) if os.path.isdir(source) and not Columnar.isColumnar(source) else [source])
+
+    results = dict()
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for flight, (metrics, steps) in zip(flights, pool.map(compute, flights)):
+            results[flight] = (metrics, steps)
+
+    columns = args.columns or ['steps', 'max_rise_time', 'max_settling_time', 'max_overshoot',
+                               'max_steady_state_error', 'steps_not_settled', 'saturation_any']
+    columns = columns + [name for name, _ in args.limit if name not in columns]
+    width = max([len(f) for f in flights] + [6])
+    print('flight'.ljust(width) + ''.join(' ' + c.rjust(max(len(c), 10)) for c in columns))
+    failed = []
+    for flight, (metrics, _) in results.items():
+        cells = []
+        for c in columns:
+            value = metrics.get(c, float('nan'))
+            cells.append(' ' + ('%.4g' % value).rjust(max(len(c), 10)))
+        exceeded = [name for name, high in args.limit if not metrics.get(name, float('nan')) <= high]
+        if exceeded:
+            failed.append((flight, exceeded))
+        print(flight.ljust(width) + ''.join(cells) + ('  \033[91m' + ', '.join(exceeded) + '\033[0m' if exceeded else ''))
+
+    if args.output:
+        names = sorted({name for metrics, _ in results.values() for name in metrics})
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['flight'] + names)
+            for flight, (metrics, _) in results.items():
+                writer.writerow([flight] + [metrics.get(name, '') for name in names])
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(withoutNan({flight: {'metrics': metrics, 'steps': steps}
+                                  for flight, (metrics, steps) in results.items()}),
+                      f, indent=1, allow_nan=False)
+
+    if failed:
+        print('\033[91mLimits exceeded by ' + str(len(failed)) + ' flights\033[0m')
+        exit(1)
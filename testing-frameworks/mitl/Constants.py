@@ -0,0 +1,65 @@
+"""
+constants of the physical model of the drone.
+Implements a class that holds the quantities cfSim derives from its
+parameters (inertia matrix and its inverse, drag, mixer matrices of the
+"plus" and "cross" configurations and the map from PWM commands to body
+forces), computed once instead of at every step. The PWM map is a dense
+table over 0-65535: the nonlinear part (PWM -> thrust -> rotor speed,
+squared) is tabulated for every integer command and interpolated, the
+mixer is linear in the squared rotor speeds. Commands are a vector of 4
+motors or an array (N, 4) of them.
+"""
+
+import numpy as np
+
+PWM_MAX = 65535
+
+class cfConstants():
+	def __init__(self, physics):
+		# input : cfSim whose parameters are used
+		self.parameters = cfConstants.signature(physics)
+		m, l, k, b = physics.m, physics.l, physics.k, physics.b
+
+		# inertia and drag
+		self.J    = np.diag(physics.I)
+		self.Jinv = np.linalg.inv(self.J)
+		self.drag = -np.diag(physics.A)/m # acceleration per unit of speed
+
+		# mixers: squared rotor speeds -> [T, tauPhi, tauTheta, tauPsi]
+		d = k*l/np.sqrt(2)
+		self.mixers = {'plus':  np.array([[  k,    k,   k,   k],
+		                                  [  0, -k*l,   0, k*l],
+		                                  [-k*l,   0, k*l,   0],
+		                                  [ -b,    b,  -b,   b]]),
+		               'cross': np.array([[  k,    k,   k,   k],
+		                                  [ -d,   -d,   d,   d],
+		                                  [ -d,    d,   d,  -d],
+		                                  [ -b,    b,  -b,   b]])}
+		self.Mw = self.mixers['plus' if physics.config == "plus" else 'cross']
+
+		# PWM -> squared rotor speed of a motor, rotor speed saturation included
+		self.pwm = np.arange(PWM_MAX+1, dtype=float)
+		omega = physics.thrustToOmega(physics.pwmToThrust(self.pwm))
+		self.omegasq = np.power(np.clip(omega, physics.omega_min_lim, physics.omega_max_lim), 2)
+
+	@staticmethod
+	def signature(physics):
+		# parameters the constants depend on
+		return (physics.m, physics.l, physics.k, physics.b, tuple(physics.I), tuple(physics.A),
+		        physics.config, physics.omega_min_lim, physics.omega_max_lim)
+
+	def current(self, physics):
+		# true if the parameters of physics did not change since the constants were computed
+		return self.parameters == cfConstants.signature(physics)
+
+	def omegaToForces(self, omega, config=None):
+		# input : rotor speeds -- np array 4x1 or Nx4
+		# output: [T, tauPhi, tauTheta, tauPsi] -- np array 4x1 or Nx4
+		M = self.Mw if config is None else self.mixers[config]
+		return np.power(np.asarray(omega, dtype=float), 2).dot(M.T)
+
+	def pwmToForces(self, u):
+		# input : PWM commands to the 4 motors -- np array 4x1 or Nx4
+		# output: [T, tauPhi, tauTheta, tauPsi] -- np array 4x1 or Nx4
+		omegasq = np.interp(np.clip(u, 0, PWM_MAX), self.pwm, self.omegasq)
+		return omegasq.dot(self.Mw.T)
@@ -32,8 +32,16 @@ class PID():
 		self.oldError = error
 		return P+D+I
 
+	def snapshot(self):
+		return (self.oldError, self.stateI)
+
+	def restore(self, state):
+		self.oldError, self.stateI = state
+
 class cfCtrl():
-	
+	PIDS = ['xPID', 'yPID', 'zPID', 'vxPID', 'vyPID', 'vzPID',\
+	        'phiPID', 'thetaPID', 'psiPID', 'phidPID', 'thetadPID', 'psidPID']
+
 	def __init__(self, refType, config, b, I, m, g, k, l):
 		#drone parameters
 		self.b = b
@@ -68,6 +76,19 @@ class cfCtrl():
 		self.thetadPID = PID(250,500,2.5,attDT)
 		self.psidPID   = PID(120,16.7,0,attDT)
 		
+	def snapshot(self):
+		# state of the controller (see Loop.py)
+		return {'tick': self.tick, 'T': self.T, 'tau': np.array(self.tau), 'etaDesired': np.array(self.etaDesired),
+		        'pids': {name: getattr(self, name).snapshot() for name in self.PIDS}}
+
+	def restore(self, state):
+		self.tick = state['tick']
+		self.T    = state['T']
+		self.tau  = state['tau'].copy()
+		self.etaDesired = state['etaDesired'].copy()
+		for name in self.PIDS:
+			getattr(self, name).restore(state['pids'][name])
+
 	#############################
 	### TORQUE -> PWM MAPPING ###
 	#############################
@@ -139,6 +160,8 @@ class cfCtrl():
 	############################
 
 	def referenceGen(self, t):
+		if callable(self.trajectoryType): # parameterized trajectory (see Reference.py)
+			return self.trajectoryType(t)
 		if t<2 : 
 			return np.array([0,0,0.5])
 		if self.trajectoryType=="step":
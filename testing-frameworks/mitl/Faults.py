@@ -0,0 +1,163 @@
+"""
+fault injection in the MitL closed loop.
+Implements parametric equivalents of the firmware bugs in bugs/*.patch.
+They act on the signals exchanged between cfSim, cfCtrl and cfEKF, so a
+bug can be screened in MitL in seconds instead of building the firmware
+and emulating it:
+  byteSwap        least and most significant bytes of the accelerometer
+                  samples swapped (axes, lsb: resolution in m/s^2)
+  gyroAxesSwap    two gyroscope axes swapped (axes)
+  motorRatioDef   motor ratio read back (motorsGetRatio) as a fraction
+                  instead of an absolute value (scale), truncated to an
+                  integer by its callers. The commands sent to the motors
+                  are not affected, as in the SitL/HitL flights of the
+                  bug that fly almost nominally: the fault is only visible
+                  in the read back ratios (motor_ratio of the flight)
+  slowTick        RTOS tick at a different rate (rate, Hz), the firmware
+                  still assumes 1 ms per tick
+  timingKalman    estimator not synchronized with the sensors: estimate
+                  used by the controller late (delay, steps) and estimator
+                  runs missed (drop, probability)
+  flowGyroData    flow correction using an old gyroscope sample (delay, steps)
+  initalPos       initial position of the estimator off (offset, m)
+  voltageCompCast battery voltage compensation of the motors with the
+                  cast applied to the ratio (voltage: supply voltage, V)
+A fault is selected by name with optional parameters, e.g.
+cfFaults("timingKalman", delay=2) or, from a string,
+cfFaults(*parse("timingKalman:delay=2,drop=0.1")). Without a name every
+hook is the identity.
+"""
+
+import numpy as np
+from collections import deque
+
+# name -> default parameters
+FAULTS = {
+	'byteSwap':        {'axes': (0, 1, 2), 'lsb': 2*24*9.81/65536}, # bmi088 24g range
+	'gyroAxesSwap':    {'axes': (0, 1)},
+	'motorRatioDef':   {'scale': 65536.0},
+	'slowTick':        {'rate': 800.0},
+	'timingKalman':    {'delay': 1, 'drop': 0.05},
+	'flowGyroData':    {'delay': 10},
+	'initalPos':       {'offset': (1.5, 0.0, 0.0)},
+	'voltageCompCast': {'voltage': 3.7},
+}
+
+def parse(spec):
+	# input : "name" or "name:param=value,param=value" (tuples as a;b;c)
+	# output: (name, dictionary of parameters)
+	name, _, rest = spec.partition(":")
+	params = dict()
+	for item in filter(None, rest.split(",")):
+		param, _, value = item.partition("=")
+		values = [float(v) if "." in v or "e" in v else int(v) for v in value.split(";")]
+		params[param.strip()] = tuple(values) if len(values) > 1 else values[0]
+	return name, params
+
+class cfFaults():
+	def __init__(self, name=None, seed=1, **params):
+		if name is not None and name not in FAULTS:
+			raise ValueError("unknown fault '" + str(name) + "', available: " + ", ".join(FAULTS))
+		unknown = set(params) - set(FAULTS.get(name, {}))
+		if unknown:
+			raise ValueError("unknown parameters of " + str(name) + ": " + ", ".join(sorted(unknown)))
+		self.name   = name
+		self.params = dict(FAULTS.get(name, {}), **params)
+		self.rng    = np.random.default_rng(seed)
+
+		# state
+		self.firmwareTicks = 0                 # ticks elapsed in the firmware (slowTick)
+		self.estimates = deque()               # estimates not yet used by the controller (timingKalman)
+		self.last      = None                  # last estimate, held when a run is missed (timingKalman)
+		self.gyros     = deque()               # past gyroscope samples (flowGyroData)
+
+	def snapshot(self):
+		# state of the fault (see Loop.py)
+		copy = lambda estimate: None if estimate is None else (estimate[0].copy(), np.array(estimate[1]))
+		return {'firmwareTicks': self.firmwareTicks, 'estimates': [copy(e) for e in self.estimates],
+		        'last': copy(self.last), 'gyros': [g.copy() for g in self.gyros],
+		        'random': self.rng.bit_generator.state}
+
+	def restore(self, state):
+		self.firmwareTicks = state['firmwareTicks']
+		self.estimates = deque(state['estimates'])
+		self.last  = state['last']
+		self.gyros = deque(state['gyros'])
+		self.rng.bit_generator.state = state['random']
+
+	def reseed(self, seed):
+		self.rng = np.random.default_rng(seed)
+
+	def describe(self):
+		# name and parameters, as accepted by parse
+		if self.name is None:
+			return None
+		text = lambda v: ";".join(str(x) for x in v) if isinstance(v, (tuple, list)) else str(v)
+		return self.name + ":" + ",".join(k + "=" + text(v) for k, v in sorted(self.params.items()))
+
+	def initialize(self, est):
+		# input : cfEKF before the first step
+		if self.name == 'initalPos':
+			est.x[0:3] = est.x[0:3] + np.asarray(self.params['offset'])
+
+	def firmwareTick(self, t):
+		# output: True if the firmware (controller and estimator) runs at time t
+		if self.name != 'slowTick':
+			return True
+		ticks = int(np.floor(t*self.params['rate'] + 1e-9))
+		if ticks > self.firmwareTicks:
+			self.firmwareTicks = ticks
+			return True
+		return False
+
+	def motors(self, u):
+		# input : PWM commands computed by the controller
+		# output: PWM commands applied to the motors
+		if self.name == 'voltageCompCast':
+			thrust = np.clip(u, 0, 65535)/65536.0*60
+			volts = -0.0006239*thrust*thrust + 0.088*thrust
+			percentage = np.minimum(volts/self.params['voltage'], 1.0)
+			return np.trunc(percentage)*65535 # (uint16_t) percentage * UINT16_MAX
+		return u
+
+	def ratios(self, u):
+		# input : PWM commands applied to the motors
+		# output: motor ratios as read back by the firmware (motorsGetRatio)
+		ratio = np.trunc(np.clip(u, 0, 65535)) # uint16_t motor_ratios
+		if self.name == 'motorRatioDef':
+			return np.trunc(ratio/self.params['scale'])
+		return ratio
+
+	def sensors(self, acc, gyro, pxCount, zrange):
+		# input : measurements of cfSim
+		# output: measurements as read by the firmware
+		if self.name == 'byteSwap':
+			lsb = self.params['lsb']
+			acc = np.array(acc, dtype=float)
+			axes = list(self.params['axes'])
+			counts = np.clip(np.rint(acc[axes]/lsb), -32768, 32767).astype(np.int16)
+			acc[axes] = counts.byteswap()*lsb
+		elif self.name == 'gyroAxesSwap':
+			a, b = self.params['axes']
+			gyro = np.array(gyro, dtype=float)
+			gyro[[a, b]] = gyro[[b, a]]
+		return acc, gyro, pxCount, zrange
+
+	def estimate(self, est, acc, gyro, pxCount, zrange):
+		# runs the estimator on the measurements of a step
+		# output: (estimated state used by the controller, innovation)
+		flowGyro = None
+		if self.name == 'flowGyroData':
+			self.gyros.append(np.array(gyro))
+			if len(self.gyros) > self.params['delay']+1:
+				self.gyros.popleft()
+			flowGyro = self.gyros[0]
+		if self.name != 'timingKalman':
+			return est.runEKF(acc, gyro, pxCount, zrange, flowGyro)
+		if self.last is None or self.rng.random() >= self.params['drop']:
+			state, err = est.runEKF(acc, gyro, pxCount, zrange)
+			self.last = (state.copy(), err)
+		self.estimates.append(self.last)
+		if len(self.estimates) > self.params['delay']:
+			return self.estimates.popleft()
+		return self.estimates[0]
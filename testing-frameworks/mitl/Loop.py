@@ -0,0 +1,175 @@
+"""
+closed loop of the MitL tests.
+Implements a class that holds everything a MitL test evolves (physics,
+controller, estimator, online monitor, injected fault and the traces stored
+so far) and advances it one step at a time. Its complete state can be saved
+in a snapshot at any step and restored later, also in another process, so a
+test can be forked from a checkpoint into many branches that only simulate
+the part after it (e.g. with a fault injected or a different noise seed).
+"""
+
+import numpy as np
+from mitl.Model import cfSim
+from mitl.Controller import cfCtrl
+from mitl.StateEstimator import cfEKF
+from mitl.Monitor import cfMonitor
+from mitl.Profiler import cfProfiler
+from mitl.Faults import cfFaults, parse
+
+# traces stored at every step
+TRACES = ['u_store', 'ratio', 'x_store', 'acc', 'gyro', 'pxCount', 'zrange', 'set_pt', 'err_fd', 'x_est']
+
+class cfLoop():
+	def __init__(self, reference="step", fault=None, seed=1, noise=0, useKalmanFilter=True,
+	             quantisation=False, useMonitor=True, t_final=10):
+		# input : see mitl_main.runTest
+		self.config = {'reference': reference, 'fault': fault, 'seed': seed, 'noise': noise,
+		               'useKalmanFilter': useKalmanFilter, 'quantisation': quantisation,
+		               'useMonitor': useMonitor, 't_final': t_final}
+		self.noise           = noise
+		self.useKalmanFilter = useKalmanFilter
+		self.quantisation    = quantisation
+		self.useMonitor      = useMonitor
+
+		# initialization of  objects
+		self.physics = cfSim(seed)
+		self.ctrl = cfCtrl(reference, self.physics.config, self.physics.b,\
+		                   self.physics.I, self.physics.m, self.physics.g,\
+		                   self.physics.k, self.physics.l)
+		self.est     = cfEKF(self.physics.g)
+		self.monitor = cfMonitor()
+		name, params = parse(fault) if fault else (None, {})
+		self.faults  = cfFaults(name, seed, **params)
+		self.faults.initialize(self.est)
+
+		# simulation parameters
+		t_init  = 0
+		t_resolution = 0.001
+		self.n_steps = int((t_final-t_init)/t_resolution)
+
+		# storage variables
+		n_steps = self.n_steps
+		self.t       = np.linspace(t_init,t_final,n_steps)
+		self.u_store = np.zeros((self.physics.n_inputs, n_steps))
+		self.ratio   = np.zeros((self.physics.n_inputs, n_steps)) # motor ratios read back by the firmware
+		self.x_store = np.zeros((self.physics.n_states, n_steps))
+		self.acc     = np.zeros((3,n_steps)) # inertial measurement
+		self.gyro    = np.zeros((3,n_steps)) # inertial measurement
+		self.pxCount = np.zeros((2,n_steps)) # pixel count measurement
+		self.zrange  = np.zeros((n_steps))   # z ranging measurement
+		self.set_pt  = np.zeros((3,n_steps)) # setpoint in cf
+		self.err_fd  = np.zeros((3,n_steps)) # kalman innovation from flow measurements
+		self.x_est   = np.zeros((9,n_steps)) # state estimated by EKF [pos, vel, eta]
+		self.prof    = cfProfiler(n_steps, ["physics", "sensors", "control", "estimation", "bookkeeping"])
+
+		# first iteration
+		self.i = 0 # counter
+		self.x_store[:,0] = self.physics.simulate(t_init, self.u_store[:,0]) # simulate physics
+		self.i = 1
+
+	def done(self):
+		# true if the test is over (completed or stopped by the monitor)
+		return self.i >= self.n_steps or self.monitor.reason is not None
+
+	def run(self, until=None):
+		# runs the main loop until the end of the test or, if given, until
+		# the first step after time until
+		# output: number of steps done
+		self.prof.start()
+		while not self.done() and (until is None or self.t[self.i-1] < until):
+			self.step()
+		return self.i
+
+	def step(self):
+		# one step of the main loop
+		i = self.i
+		physics, ctrl, faults, prof = self.physics, self.ctrl, self.faults, self.prof
+		x_store, x_est, gyro = self.x_store, self.x_est, self.gyro
+		t_curr = self.t[i]
+		if not i%500:
+			print("simulation at time " + str(t_curr))
+		prof.lap("bookkeeping", i) # includes storage and checks of the previous step
+		firmwareRuns = faults.firmwareTick(t_curr) # false only if the firmware misses this step
+		if firmwareRuns:
+			self.set_pt[:,i] = ctrl.referenceGen(t_curr)               # get reference
+			if self.useKalmanFilter :
+				u = ctrl.ctrlCompute(self.set_pt[:,i],\
+				                     x_est[0:3,i-1],\
+				                     x_est[3:6,i-1],\
+				                     x_est[6:9,i-1],\
+				                     gyro[:,i-1])
+			else:
+				u = ctrl.ctrlCompute(self.set_pt[:,i],\
+				                     x_store[0:3,i-1],\
+				                     x_store[3:6,i-1],\
+				                     physics.quaternionToEuler(x_store[6:10,i-1]),\
+				                     gyro[:,i-1])
+			self.u_store[:,i] = faults.motors(u)
+			self.ratio[:,i]   = faults.ratios(self.u_store[:,i])
+		else: # hold the outputs of the previous step
+			self.set_pt[:,i]  = self.set_pt[:,i-1]
+			self.u_store[:,i] = self.u_store[:,i-1]
+			self.ratio[:,i]   = self.ratio[:,i-1]
+		prof.lap("control", i)
+		x_store[:,i] = physics.simulate(t_curr, self.u_store[:,i]) # simulate physics
+		prof.lap("physics", i)
+
+		# store measurements (as read by the firmware)
+		noise = self.noise
+		self.acc[:,i], gyro[:,i], self.pxCount[:,i], self.zrange[i] = faults.sensors(physics.readAcc(noise),\
+		                                                                             physics.readGyro(noise),\
+		                                                                             physics.readPixelcount(noise, self.quantisation),\
+		                                                                             physics.readZRanging(noise))
+		prof.lap("sensors", i)
+		# close loop
+		if firmwareRuns:
+			x_est[:,i], self.err_fd[:,i]  = faults.estimate(self.est,self.acc[:,i],gyro[:,i],self.pxCount[:,i],self.zrange[i])
+		else:
+			x_est[:,i], self.err_fd[:,i]  = x_est[:,i-1], self.err_fd[:,i-1]
+		prof.lap("estimation", i)
+
+		self.i = i+1 # increase counter
+		if self.useMonitor:
+			self.monitor.check(t_curr, physics, x_est[0:3,i]) # stops the test if violated
+
+	####################
+	### CHECKPOINTS ###
+	####################
+
+	def snapshot(self):
+		# complete state of the closed loop after the last step (copies)
+		i = self.i
+		return {'config': dict(self.config), 'i': i,
+		        'traces': {name: getattr(self, name)[...,:i].copy() for name in TRACES},
+		        'profile': self.prof.samples[:,:i].copy(),
+		        'physics': self.physics.snapshot(), 'ctrl': self.ctrl.snapshot(), 'est': self.est.snapshot(),
+		        'monitor': self.monitor.snapshot(), 'faults': self.faults.snapshot()}
+
+	def restore(self, state):
+		# continues from a snapshot of a loop with the same time resolution
+		i = state['i']
+		if i > self.n_steps:
+			raise ValueError("the snapshot is after the end of the test")
+		for name in TRACES:
+			getattr(self, name)[...,:i] = state['traces'][name]
+		self.prof.samples[:,:i] = state['profile']
+		self.i = i
+		self.physics.restore(state['physics'])
+		self.ctrl.restore(state['ctrl'])
+		self.est.restore(state['est'])
+		self.monitor.restore(state['monitor'])
+		if self.config['fault'] == state['config']['fault']: # a new fault starts from scratch
+			self.faults.restore(state['faults'])
+
+	@classmethod
+	def fork(cls, state, **changes):
+		# new loop continuing from a snapshot, with the given changes of the
+		# configuration (e.g. fault, noise, reference); a different seed
+		# reseeds the noise and the fault after the checkpoint
+		config = dict(state['config'], **changes)
+		loop = cls(**config)
+		loop.restore(state)
+		if 'seed' in changes and changes['seed'] != state['config']['seed']:
+			loop.physics.reseed(config['seed'])
+			loop.faults.reseed(config['seed'])
+		return loop
@@ -5,12 +5,14 @@ allows to simulate its physic for an arbitrary dt
 """
 
 import numpy as np
-import math
 import scipy.integrate as intgr
 import sys
 
 import random as rnd
 
+from mitl import Rotation
+from mitl.Constants import cfConstants
+
 from numba import jit
 
 class cfSim():
@@ -47,7 +49,7 @@ class cfSim():
 		                     [0,0,1]]) # rotation matrix
 
 		# Measurement Noise Parameters
-		rnd.seed(seed)
+		self.rng = rnd.Random(seed) # own generator, so that its state can be saved
 		self.accNoiseVar  = np.array([0.5,0.5,1.0]) # accelerometer noise variance
 		self.gyroNoiseVar = np.array([0.1,0.1,0.1]) # gyro noise variance
 		self.flowNoiseVar = np.array([2, 2])        # flowdeck noise variance
@@ -56,45 +58,35 @@ class cfSim():
 		self.expStdA   = 0.0025
 		self.expCoeff  = 2.92135
 
+		# Derived constants (recomputed by modelConstants if a parameter changes)
+		self.constants = cfConstants(self)
+
 
 	##############################
 	### MATH UTILITY FUNCTIONS ###
 	##############################
 
+	# see Rotation.py, these also work on whole trajectories
+
 	def quatNormal(self, q):
 		# utilitiy function: normalize a quaternion
 		# input : quaternion -- np array 4x1
 		# output: quaternion -- np array 4x1
-		return q/np.sqrt(q[0]**2+q[1]**2+q[2]**2+q[3]**2)
+		return Rotation.quatNormal(q)
 
 	def skewSymmetricOp(self, x, y, z):
 		# utilitiy function: compute the skew symmetric matrix associate to a 3-dim vector
 		# input : three components of the vector (in order)
 		# output: three-by-three skew symmetric matrix
-		mcross = np.array([[ 0, -z,  y],\
-	                       [ z,  0, -x],\
-	                       [-y,  x,  0]])
-		return mcross
+		return Rotation.skew([x, y, z])
 
 	def quaternionToEuler(self, q):
 		#utility function to translate quaternion in Euler angles for plotting
-		phi   = math.atan2(2*(q[0]*q[1] + q[2]*q[3]), 1-2*(q[1]**2+q[2]**2))
-		theta = math.asin(2*(q[0]*q[2] - q[3]*q[1]))
-		psi   = math.atan2(2*(q[0]*q[3] + q[1]*q[2]), 1-2*(q[2]**2+q[3]**2))
-		eta = np.array([phi, theta, psi])
-		return eta
+		return Rotation.quaternionToEuler(q)
 
 	def computeR(self, q):
 		# computes rotation matrix from quaternion q
-		q = self.quatNormal(q)
-		qw = q[0]
-		qx = q[1]
-		qy = q[2]
-		qz = q[3]
-		R = np.array([[qw**2+qx**2-qy**2-qz**2,         2*(qx*qy-qw*qz),         2*(qx*qz+qw*qy)],\
-	                  [        2*(qx*qy+qw*qz), qw**2-qx**2+qy**2-qz**2,         2*(qy*qz-qw*qx)],\
-	                  [        2*(qx*qz-qw*qy),         2*(qy*qz+qw*qx), qw**2-qx**2-qy**2+qz**2]])
-		return R
+		return Rotation.rotationMatrix(q)
 
 	######################################
 	### MAPPING FUNCTIONS PWM<->THRUST ###
@@ -125,42 +117,34 @@ class cfSim():
 		return T 
 
 	def omegaToThrustPlusConfig(self, omega):
-		# input : rotors speeds -- np array 4x1
+		# input : rotors speeds -- np array 4x1 (or Nx4)
 		# output: T   : vertical thrust
 		#         tau : torques in body frame
-		self.Mw  = np.array([[        self.k,         self.k,        self.k,        self.k],  \
-							 [             0, -self.k*self.l,             0, self.k*self.l],  \
-							 [-self.k*self.l,              0, self.k*self.l,             0],  \
-							 [       -self.b,         self.b,       -self.b,        self.b]])
-
 		omega = np.clip(omega, self.omega_min_lim, self.omega_max_lim)
-		omegasq = np.power(omega,2)
-
-		Tbar = (self.Mw).dot(omegasq)
-		return Tbar
+		return self.modelConstants().omegaToForces(omega, "plus")
 
 	def omegaToThrustCrossConfig(self, omega):
-		# input : rotors speeds -- np array 4x1
+		# input : rotors speeds -- np array 4x1 (or Nx4)
 		# output: T   : vertical thrust
 		#         tau : torques in body frame	
 
 		# rotor speed saturation (not sure we want it....)
 		omega = np.clip(omega, self.omega_min_lim, self.omega_max_lim)
-		omegasq = np.power(omega,2)
-		T        = self.k * sum(omegasq)
-		tauPhi   = self.k*self.l/np.sqrt(2) * omegasq.dot([-1,-1, 1, 1])
-		tauTheta = self.k*self.l/np.sqrt(2) * omegasq.dot([-1, 1, 1,-1])
-		tauPsi   = self.b * omegasq.dot([-1, 1,-1, 1])
-		Tbar     = np.array([T, tauPhi, tauTheta, tauPsi]) 
-		return Tbar
+		return self.modelConstants().omegaToForces(omega, "cross")
 
 	def pwdToForcesMap(self, u):
 		# wrapper for mapping:
 		# pwd -> rotor thrust -> rotor speed -> body forces
-		if self.config=="plus" : # plus configuration
-			return self.omegaToThrustPlusConfig(self.thrustToOmega((self.pwmToThrust(u))))
-		else :                   # cross configuration
-			return self.omegaToThrustCrossConfig(self.thrustToOmega((self.pwmToThrust(u))))
+		# from the table of the constants, in the configuration self.config
+		# input : PWM signal to the 4 motors -- np array 4x1 (or Nx4)
+		return self.modelConstants().pwmToForces(u)
+
+	def modelConstants(self):
+		# constants derived from the parameters, recomputed only if a
+		# parameter was changed since the last call
+		if not self.constants.current(self):
+			self.constants = cfConstants(self)
+		return self.constants
 
 	############################
 	### SIMULATION FUNCTIONS ###
@@ -190,14 +174,14 @@ class cfSim():
 			self.x[2]=0.0
 		else:
 			Ga = np.array([0, 0, -self.g])
-		Aa   = -1/self.m * np.diag(self.A).dot(v)       # Drag
+		c = self.constants # up to date, see simulate
+		Aa   = c.drag.dot(v)                            # Drag
 		angM = np.array([2*(qx*qz + qw*qy), \
 			             2*(qy*qz - qw*qx), \
 			             qw**2 - qx**2 - qy**2 + qz**2])
 		Ta = (T/self.m) * angM                          # vertical thrust?
 		vdot = Ga + Ta + Aa
 		
-		J = np.diag(self.I);
 		qcross = self.skewSymmetricOp(qx, qy, qz)
 		tmp1 = np.array([[      0,      -qv[0],      -qv[1],      -qv[2]],\
 			             [  qv[0], qcross[0,0], qcross[0,1], qcross[0,2]],\
@@ -206,7 +190,7 @@ class cfSim():
 		tmp2 = np.array([0,w[0],w[1],w[2]])
 		qdot = 0.5*(np.identity(4)*qw  + tmp1).dot(tmp2) 
 		
-		wdot = np.linalg.inv(J).dot(tau - np.cross(w, J.dot(w)))
+		wdot = c.Jinv.dot(tau - np.cross(w, c.J.dot(w)))
 
 		return vdot, qdot, wdot
 
@@ -251,6 +235,26 @@ class cfSim():
 		self.acc  = xu[3:6] + self.R.dot(np.array([0, 0, self.g]))     # add gravity in body frame
 		return self.x 
 
+	###################
+	### CHECKPOINTS ###
+	###################
+
+	def snapshot(self):
+		# state of the simulation (see Loop.py)
+		return {'x': self.x.copy(), 'currentTime': self.currentTime, 'acc': np.array(self.acc),
+		        'R': np.array(self.R), 'random': self.rng.getstate()}
+
+	def restore(self, state):
+		self.x = state['x'].copy()
+		self.currentTime = state['currentTime']
+		self.acc = state['acc'].copy()
+		self.R   = state['R'].copy()
+		self.rng.setstate(state['random'])
+
+	def reseed(self, seed):
+		# new measurement noise from here on
+		self.rng.seed(seed)
+
 	#############################
 	### MEASUREMENT FUNCTIONS ###
 	#############################
@@ -258,18 +262,18 @@ class cfSim():
 	def readAcc(self, Noise=0):
 		# accelerometer reading in m/s^2
 		if Noise :
-			nx = Noise * rnd.normalvariate(0,self.accNoiseVar[0])
-			ny = Noise * rnd.normalvariate(0,self.accNoiseVar[1])
-			nz = Noise * rnd.normalvariate(0,self.accNoiseVar[2])
+			nx = Noise * self.rng.normalvariate(0,self.accNoiseVar[0])
+			ny = Noise * self.rng.normalvariate(0,self.accNoiseVar[1])
+			nz = Noise * self.rng.normalvariate(0,self.accNoiseVar[2])
 			return self.acc + np.array([nx,ny,nz])
 		return self.acc
 
 	def readGyro(self, Noise=0):
 		# gyro reading in rad/s
 		if Noise : 
-			nx = Noise * rnd.normalvariate(0,self.gyroNoiseVar[0])
-			ny = Noise * rnd.normalvariate(0,self.gyroNoiseVar[1])
-			nz = Noise * rnd.normalvariate(0,self.gyroNoiseVar[2])
+			nx = Noise * self.rng.normalvariate(0,self.gyroNoiseVar[0])
+			ny = Noise * self.rng.normalvariate(0,self.gyroNoiseVar[1])
+			nz = Noise * self.rng.normalvariate(0,self.gyroNoiseVar[2])
 			return self.x[10:13] + np.array([nx,ny,nz])
 		return self.x[10:13]
 
@@ -286,7 +290,7 @@ class cfSim():
 				angle = np.pi-0.001 # send out a very large reading (firmware has to handle it)
 			if Noise :
 				nz = self.expStdA * (1 + np.exp(self.expCoeff * (self.x[2] - self.expPointA)))
-				ret = self.x[2]/np.cos(angle) + Noise * rnd.normalvariate(0,nz)
+				ret = self.x[2]/np.cos(angle) + Noise * self.rng.normalvariate(0,nz)
 				if ret<0 :
 					return 0
 				else :
@@ -311,8 +315,8 @@ class cfSim():
 		# predictedNY 
 		dny = (dt * Npx / thetapx) * ((velBF[1]*R22 / h) + wFactor * self.x[10])
 		if Noise :
-			dnx = dnx + Noise * rnd.normalvariate(0,self.flowNoiseVar[0])
-			dny = dny + Noise * rnd.normalvariate(0,self.flowNoiseVar[1])
+			dnx = dnx + Noise * self.rng.normalvariate(0,self.flowNoiseVar[0])
+			dny = dny + Noise * self.rng.normalvariate(0,self.flowNoiseVar[1])
 		if Quantisation:
 			return np.array([int(np.rint(dnx)), int(np.rint(dny))])
 		else:
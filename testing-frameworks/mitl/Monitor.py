@@ -0,0 +1,62 @@
+"""
+online monitor of the closed loop.
+Implements a class that checks simple invariants of the flight at every
+step of the main loop (constant time per step), so that a test whose drone
+crashed or whose estimate diverged can be stopped early.
+"""
+
+import numpy as np
+
+class cfMonitor():
+	def __init__(self, t_warmup=0.5):
+		# invariants (None disables the check)
+		self.altitude   = (-0.1, 2.0)  # m, bounds of the true altitude
+		self.tilt       = np.pi/3      # rad, maximum angle between body and world z axis
+		self.divergence = 0.5          # m, maximum distance between estimated and true position
+		self.persistence = 0.2         # s, time the estimate can stay diverged
+		self.ranger_fov = (np.pi/180)*15 # rad, field of view of the z ranger (see cfSim.readZRanging)
+		self.t_warmup   = t_warmup     # s, checks start after this time
+
+		# state
+		self.diverged_since = None
+		self.reason = None             # reason of the abort, None while all invariants hold
+
+	def check(self, t, physics, est_pos=None):
+		# input : t: current time, physics: cfSim after the simulation step,
+		#         est_pos: position estimated by the firmware or cfEKF
+		# output: False if an invariant is violated (reason in self.reason)
+		if self.reason is not None:
+			return False
+		if t < self.t_warmup:
+			return True
+		z = physics.x[2]
+		if self.altitude is not None and not (self.altitude[0] <= z <= self.altitude[1]):
+			return self.abort(t, "altitude %.3f m out of bounds" % z)
+		# cos of the tilt is the last element of the rotation matrix
+		R22 = physics.R[2,2]
+		if R22 < np.cos(np.pi/2 + self.ranger_fov/2):
+			return self.abort(t, "drone too much tilted, zranging data corrupted")
+		if self.tilt is not None and R22 < np.cos(self.tilt):
+			return self.abort(t, "tilt %.1f deg over the limit" % np.degrees(np.arccos(np.clip(R22, -1, 1))))
+		if self.divergence is not None and est_pos is not None:
+			e = est_pos - physics.x[0:3]
+			if e[0]*e[0] + e[1]*e[1] + e[2]*e[2] > self.divergence**2:
+				if self.diverged_since is None:
+					self.diverged_since = t
+				elif t - self.diverged_since > self.persistence:
+					return self.abort(t, "estimate diverged by more than %.2f m since %.3f s" % (self.divergence, self.diverged_since))
+			else:
+				self.diverged_since = None
+		return True
+
+	def snapshot(self):
+		return {'diverged_since': self.diverged_since, 'reason': self.reason}
+
+	def restore(self, state):
+		self.diverged_since = state['diverged_since']
+		self.reason = state['reason']
+
+	def abort(self, t, reason):
+		self.reason = reason + " (at %.3f s)" % t
+		print("\033[91mABORT:\033[0m " + self.reason)
+		return False
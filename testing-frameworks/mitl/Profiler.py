@@ -0,0 +1,47 @@
+"""
+latency profiler of the main loop.
+Implements a class that measures, with time.perf_counter_ns, how long each
+phase of a step of the main loop takes (e.g. physics, sensors, communication
+with the firmware). Durations are accumulated in a preallocated array with
+one column per step, so profiling costs a couple of function calls per phase.
+"""
+
+import time
+import numpy as np
+
+class cfProfiler():
+	def __init__(self, n_steps, phases):
+		# input : n_steps: number of steps of the test
+		#         phases : names of the phases, in the order they are measured
+		self.phases  = list(phases)
+		self.index   = {name: i for i, name in enumerate(self.phases)}
+		self.samples = np.zeros((len(self.phases), n_steps), dtype=np.int64) # ns
+		self.last    = time.perf_counter_ns()
+
+	def start(self):
+		# marks the beginning of a step (time since the last lap is discarded)
+		self.last = time.perf_counter_ns()
+
+	def lap(self, phase, i):
+		# adds the time since the last lap to the given phase of step i
+		now = time.perf_counter_ns()
+		self.samples[self.index[phase], i] += now - self.last
+		self.last = now
+
+	def summary(self, n_done=None):
+		# percentiles of the duration of each phase over the steps
+		# output: dictionary phase -> dictionary statistic -> value in us
+		samples = self.samples[:, :n_done] / 1000.0
+		stats = dict()
+		for name, row in zip(self.phases, samples):
+			p50, p95, p99 = np.percentile(row, [50, 95, 99])
+			stats[name] = {'p50': p50, 'p95': p95, 'p99': p99, 'max': np.max(row), 'total': np.sum(row)}
+		return stats
+
+	def printSummary(self, n_done=None):
+		stats = self.summary(n_done)
+		total = sum(s['total'] for s in stats.values())
+		print("phase latency [us]      p50       p95       p99       max   share")
+		for name, s in stats.items():
+			print("  %-14s %9.1f %9.1f %9.1f %9.1f  %5.1f%%" %
+			      (name, s['p50'], s['p95'], s['p99'], s['max'], 100*s['total']/total if total else 0))
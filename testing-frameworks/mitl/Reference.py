@@ -0,0 +1,73 @@
+"""
+parameterized reference trajectories.
+Implements a class that generates the setpoint of cfCtrl from a vector of
+parameters, so that the space of trajectories can be searched (see
+analysis/Falsification.py). As for the hard-coded trajectories of
+cfCtrl.referenceGen, the drone first hovers at (0, 0, 0.5) for 2 s:
+  steps     piecewise constant setpoints: dwell time before each step [s]
+            and position after it [m]
+  sinus     sinusoids around the hover point: amplitude [m], frequency [Hz]
+            and phase [rad] on each axis
+  waypoints straight segments between waypoints: duration of each
+            segment [s] and waypoint [m]
+"""
+
+import numpy as np
+
+N_STEPS     = 3 # steps of the "steps" trajectory
+N_WAYPOINTS = 4 # waypoints of the "waypoints" trajectory
+HOVER       = np.array([0, 0, 0.5])
+T_HOVER     = 2 # s
+
+def _repeat(names, lows, highs, n):
+	# bounds of n copies of the same group of parameters
+	return ([name + str(k) for k in range(n) for name in names],
+	        np.tile(lows, n).astype(float), np.tile(highs, n).astype(float))
+
+# kind -> (names of the parameters, lower bounds, upper bounds)
+SPACES = {
+	'steps':     _repeat(['dwell', 'x', 'y', 'z'], [1.0, -0.5, -0.5, 0.2], [3.0, 0.5, 0.5, 0.9], N_STEPS),
+	'sinus':     (['ax', 'ay', 'az', 'fx', 'fy', 'fz', 'px', 'py', 'pz'],
+	              np.array([0, 0, 0, 0.05, 0.05, 0.05, 0, 0, 0]),
+	              np.array([0.5, 0.5, 0.3, 1.5, 1.5, 1.5, 2*np.pi, 2*np.pi, 2*np.pi])),
+	'waypoints': _repeat(['duration', 'x', 'y', 'z'], [0.5, -0.5, -0.5, 0.2], [3.0, 0.5, 0.5, 0.9], N_WAYPOINTS),
+}
+
+class cfReference():
+	def __init__(self, kind, params):
+		# input : kind  : name of the space of trajectories (see SPACES)
+		#         params: vector of parameters within the bounds of the space
+		if kind not in SPACES:
+			raise ValueError("unknown trajectory '" + str(kind) + "', available: " + ", ".join(SPACES))
+		names, low, high = SPACES[kind]
+		self.kind   = kind
+		if np.shape(params) != low.shape: # before clipping, which would broadcast
+			raise ValueError(kind + " trajectories have " + str(len(names)) + " parameters")
+		self.params = np.clip(np.asarray(params, dtype=float), low, high)
+		if kind == 'sinus':
+			self.amplitude, self.frequency, self.phase = self.params.reshape(3, 3)
+		else: # switching times and positions
+			groups = self.params.reshape(-1, 4)
+			self.times     = T_HOVER + np.cumsum(groups[:,0])
+			self.positions = groups[:,1:4]
+
+	def __call__(self, t):
+		# setpoint at time t
+		if t < T_HOVER:
+			return HOVER.copy()
+		if self.kind == 'sinus':
+			return HOVER + self.amplitude*np.sin(2*np.pi*self.frequency*(t-T_HOVER) + self.phase)
+		if self.kind == 'steps':
+			k = np.searchsorted(self.times, t, side='right') # steps done
+			return HOVER.copy() if k == 0 else self.positions[k-1].copy()
+		# waypoints: interpolate between the previous and the next waypoint
+		k = np.searchsorted(self.times, t, side='right')
+		if k >= len(self.times):
+			return self.positions[-1].copy()
+		start = HOVER if k == 0 else self.positions[k-1]
+		t0 = T_HOVER if k == 0 else self.times[k-1]
+		return start + (self.positions[k]-start)*(t-t0)/(self.times[k]-t0)
+
+	def describe(self):
+		names = SPACES[self.kind][0]
+		return self.kind + ":" + ",".join(name + "=%.4g" % value for name, value in zip(names, self.params))
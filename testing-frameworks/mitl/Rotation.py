@@ -0,0 +1,74 @@
+"""
+quaternion and rotation utilities shared by the models, the drivers and
+the analysis of the flights.
+Every function works on a single element or on a whole trajectory at once:
+quaternions are arrays of shape (..., 4) in the order w, x, y, z, vectors
+(..., 3) and matrices (..., 3, 3), e.g. quaternionToEuler(x_store[6:10,:].T)
+converts all the attitudes of a flight without a Python loop.
+"""
+
+import math
+import numpy as np
+
+# A single element is computed on python floats: the models call these
+# functions at every step, where numpy would spend more time creating
+# views and temporaries than computing.
+
+def _split(x):
+	# components along the last axis
+	x = np.asarray(x, dtype=float)
+	return x.tolist() if x.ndim == 1 else tuple(np.moveaxis(x, -1, 0))
+
+def _join(parts):
+	# inverse of _split
+	return np.array(parts) if isinstance(parts[0], float) else np.stack(parts, axis=-1)
+
+def _matrix(rows):
+	# 3x3 matrix (or matrices) from its rows of components
+	M = np.array(rows)
+	return M if M.ndim == 2 else np.moveaxis(M, (0, 1), (-2, -1))
+
+def quatNormal(q):
+	# normalize quaternions
+	q = np.asarray(q, dtype=float)
+	if q.ndim == 1:
+		qw, qx, qy, qz = q.tolist()
+		return q/math.sqrt(qw**2+qx**2+qy**2+qz**2)
+	return q/np.sqrt(np.sum(q*q, axis=-1, keepdims=True))
+
+def quatMult(dq, q):
+	# product of quaternions dq*q
+	w0, x0, y0, z0 = _split(dq)
+	w1, x1, y1, z1 = _split(q)
+	return _join([w0*w1 - x0*x1 - y0*y1 - z0*z1,
+	              x0*w1 + w0*x1 + z0*y1 - y0*z1,
+	              y0*w1 - z0*x1 + w0*y1 + x0*z1,
+	              z0*w1 + y0*x1 - x0*y1 + w0*z1])
+
+def quaternionToEuler(q):
+	# euler angles (roll, pitch, yaw) of quaternions
+	qw, qx, qy, qz = _split(q)
+	if isinstance(qw, float):
+		atan2, asin = math.atan2, lambda s: math.asin(min(max(s, -1.0), 1.0))
+	else:
+		atan2, asin = np.arctan2, lambda s: np.arcsin(np.clip(s, -1, 1))
+	return _join([atan2(2*(qw*qx + qy*qz), 1-2*(qx**2+qy**2)),
+	              asin(2*(qw*qy - qz*qx)),
+	              atan2(2*(qw*qz + qx*qy), 1-2*(qy**2+qz**2))])
+
+def rotationMatrix(q, normalize=True):
+	# rotation matrices (body to world frame) of quaternions
+	if normalize:
+		q = quatNormal(q)
+	qw, qx, qy, qz = _split(q)
+	return _matrix([[qw**2+qx**2-qy**2-qz**2,         2*(qx*qy-qw*qz),         2*(qx*qz+qw*qy)],
+	                [        2*(qx*qy+qw*qz), qw**2-qx**2+qy**2-qz**2,         2*(qy*qz-qw*qx)],
+	                [        2*(qx*qz-qw*qy),         2*(qy*qz+qw*qx), qw**2-qx**2-qy**2+qz**2]])
+
+def skew(v):
+	# skew symmetric matrices of vectors, skew(v).dot(u) = cross(v, u)
+	x, y, z = _split(v)
+	zero = 0.0 if isinstance(x, float) else np.zeros_like(x)
+	return _matrix([[zero,   -z,    y],
+	                [   z, zero,   -x],
+	                [  -y,    x, zero]])
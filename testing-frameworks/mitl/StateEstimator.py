@@ -1,9 +1,10 @@
 # class implementing the extended Kalman filter that is run on the Crazyflie
 
 import numpy as np
-import math
 import scipy.linalg as spl
 
+from mitl import Rotation
+
 # synchronization macros
 mainRate        = 1000 #[Hz]
 predictionRate  = 100  #[Hz]
@@ -52,6 +53,21 @@ class cfEKF():
 
         self.tick = 0 # counter 
 
+    def snapshot(self):
+        # state of the filter (see Loop.py)
+        return {'x': self.x.copy(), 'q': np.array(self.q), 'R': self.R.copy(), 'P': self.P.copy(), 'tick': self.tick,
+                'stateExternal': self.stateExternal.copy(), 'flowerror': np.array(self.flowerror), 'zerror': self.zerror}
+
+    def restore(self, state):
+        self.x = state['x'].copy()
+        self.q = state['q'].copy()
+        self.R = state['R'].copy()
+        self.P = state['P'].copy()
+        self.tick = state['tick']
+        self.stateExternal = state['stateExternal'].copy()
+        self.flowerror = state['flowerror'].copy()
+        self.zerror = state['zerror']
+
     #########################
     ### UTILITY FUNCTIONS ###
     #########################
@@ -59,20 +75,11 @@ class cfEKF():
         # utility function: compute skew symmetric matrix from 3-dim vector
         # input : three dimensional vector
         # output: three-by-three skew symmetric matrix
-        mcross = np.array([[ 0,   -x[2],  x[1]],\
-                           [ x[2],    0, -x[0]],\
-                           [-x[1], x[0],    0]])
-        return mcross
+        return Rotation.skew(x)
 
     def updateR(self):
-        # computes rotation matrix from quaternion q
-        qw = self.q[0]
-        qx = self.q[1]
-        qy = self.q[2]
-        qz = self.q[3]
-        self.R = np.array([[qw**2+qx**2-qy**2-qz**2,        2*(qx*qy-qw*qz),         2*(qx*qz+qw*qy)],\
-                          [         2*(qx*qy+qw*qz),qw**2-qx**2+qy**2-qz**2,         2*(qy*qz-qw*qx)],\
-                          [         2*(qx*qz-qw*qy),        2*(qy*qz+qw*qx),qw**2-qx**2-qy**2+qz**2]])
+        # computes rotation matrix from quaternion q (already normalized)
+        self.R = Rotation.rotationMatrix(self.q, normalize=False)
 
     def sanityCheckP(self):
         # saturate
@@ -82,20 +89,11 @@ class cfEKF():
         self.P = (self.P+self.P.transpose())/2
 
     def quatMult(self, dq, q):
-        out = np.zeros(4)
-        out[0] = dq[0]*q[0]-dq[1]*q[1]-dq[2]*q[2]-dq[3]*q[3]
-        out[1] = dq[1]*q[0]+dq[0]*q[1]+dq[3]*q[2]-dq[2]*q[3]
-        out[2] = dq[2]*q[0]-dq[3]*q[1]+dq[0]*q[2]+dq[1]*q[3]
-        out[3] = dq[3]*q[0]+dq[2]*q[1]-dq[1]*q[2]+dq[0]*q[3]
-        return out
+        return Rotation.quatMult(dq, q)
 
     def quaternionToEuler(self, q):
         #utility function to translate quaternion in Euler angles for plotting
-        phi   = math.atan2(2*(q[0]*q[1] + q[2]*q[3]), 1-2*(q[1]**2+q[2]**2))
-        theta = math.asin(2*(q[0]*q[2] - q[3]*q[1]))
-        psi   = math.atan2(2*(q[0]*q[3] + q[1]*q[2]), 1-2*(q[2]**2+q[3]**2))
-        eta = np.array([phi, theta, psi])
-        return eta
+        return Rotation.quaternionToEuler(q)
 
     ###########################
     ### ALGORITHM FUNCTIONS ###
@@ -222,9 +220,10 @@ class cfEKF():
         self.stateExternal[3:6] = self.R.dot(self.x[3:6]) # speed in world frame
         self.stateExternal[6:9] = self.quaternionToEuler(self.q)
 
-    def runEKF(self, acc, gyro, pxCount, zrange):
+    def runEKF(self, acc, gyro, pxCount, zrange, flowGyro=None):
         # main function called by main loop that takes care 
         # of all the timings of the kalman filter steps
+        # flowGyro: gyro used to compensate the flow (default: gyro)
         update = False
 
         if rateDo(predictionRate, self.tick):
@@ -236,7 +235,7 @@ class cfEKF():
             update = True
 
         if rateDo(flowRate, self.tick):
-            self.correctionFlow(pxCount,gyro,flowDT)
+            self.correctionFlow(pxCount,gyro if flowGyro is None else flowGyro,flowDT)
             update = True
 
         # call finalize state is update has been made
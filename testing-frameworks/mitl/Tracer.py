@@ -0,0 +1,77 @@
+"""
+event tracer of the tests.
+Implements a class that records the beginning and the end of function calls
+(e.g. every command sent to the firmware, every breakpoint wait, every
+physics step) in a bounded in-memory ring buffer, and writes them at the end
+of the test in the Chrome trace format, which can be opened with
+chrome://tracing or https://ui.perfetto.dev.
+Each call is recorded as a single complete event (begin time and duration),
+so that begin and end of a call can never be separated when old events are
+overwritten.
+"""
+
+import os
+import json
+import time
+import threading
+import functools
+
+class cfTracer():
+	def __init__(self, capacity=1000000):
+		# input : capacity: maximum number of events kept (the oldest are dropped)
+		self.capacity = capacity
+		self.buffer   = [None]*capacity
+		self.count    = 0
+		self.origin   = time.perf_counter_ns()
+
+	def record(self, name, category, start, end):
+		# stores an event, start and end are perf_counter_ns values
+		self.buffer[self.count % self.capacity] = (name, category, start, end, threading.get_ident())
+		self.count += 1
+
+	def wrap(self, function, name, category):
+		# returns function recording an event at every call
+		clock  = time.perf_counter_ns
+		record = self.record
+		@functools.wraps(function)
+		def traced(*args, **kwargs):
+			start = clock()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				record(name, category, start, clock())
+		return traced
+
+	def instrument(self, obj, category, methods=None, exclude=()):
+		# traces calls to methods of obj (default: all the public methods
+		# defined by its class); already traced methods are skipped
+		if methods is None:
+			methods = [name for name, value in vars(type(obj)).items()
+			           if callable(value) and not name.startswith('_')]
+		for name in methods:
+			if name in exclude or name in vars(obj):
+				continue
+			setattr(obj, name, self.wrap(getattr(obj, name), type(obj).__name__ + "." + name, category))
+
+	def events(self):
+		# recorded events, oldest first
+		if self.count <= self.capacity:
+			return self.buffer[:self.count]
+		start = self.count % self.capacity
+		return self.buffer[start:] + self.buffer[:start]
+
+	def save(self, location):
+		# writes the events in Chrome trace format (times in us)
+		threads = dict()
+		trace = []
+		for name, category, start, end, thread in self.events():
+			trace.append({'name': name, 'cat': category, 'ph': 'X', 'pid': os.getpid(),
+			              'tid': threads.setdefault(thread, len(threads)),
+			              'ts': (start - self.origin)/1000, 'dur': (end - start)/1000})
+		directory = os.path.dirname(location)
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+		with open(location, 'w') as f:
+			json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms',
+			           'otherData': {'recorded': self.count, 'dropped': max(self.count - self.capacity, 0)}}, f)
+		print("Trace of " + str(len(trace)) + " events saved to: \033[4m" + location + "\033[0m")
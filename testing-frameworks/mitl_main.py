@@ -1,95 +1,96 @@
-import numpy as np
-from mitl.Model import cfSim
-from mitl.Controller import cfCtrl
-from mitl.StateEstimator import cfEKF
+import io
+import sys
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from mitl.Loop import cfLoop
+from mitl import Rotation
+from mitl.Tracer import cfTracer
+from mitl.Faults import parse
 import time
 
 # import class for storing
 from plot.Plot import Storage 
 
-if __name__ == "__main__":
+def runTest(reference="step", fault=None, seed=1, noise=0, useKalmanFilter=True,
+            quantisation=False, useMonitor=True, useTracer=False, t_final=10):
+	# runs a MitL test
+	# input : reference: trajectory type of cfCtrl.referenceGen or cfReference
+	#         fault    : fault to inject (see mitl/Faults.py), e.g. "slowTick" or
+	#                    "timingKalman:delay=2,drop=0.1", None for a nominal test
+	#         seed     : seed of the measurement noise and of the fault
+	#         noise    : if non-zero includes measurement noise with given gain
+	#         useKalmanFilter: if true the KF is used for feedback
+	#         quantisation   : if false removes quantisation from flow data
+	#         useMonitor     : if true the test is stopped when an invariant is violated
+	#         useTracer      : if true a trace of the calls is saved in mitl/traces
+	# output: storage object of the flight
+	loop = cfLoop(reference, fault, seed, noise, useKalmanFilter, quantisation, useMonitor, t_final)
+	return runLoop(loop, useTracer)
+
+def runLoop(loop, useTracer=False):
+	# runs a loop (see mitl/Loop.py) until the end of the test
+	# output: storage object of the flight
 	start_test = time.perf_counter()
+	if useTracer:
+		tracer = cfTracer()
+		tracer.instrument(loop.physics, "physics", ["simulate"])
+		tracer.instrument(loop.ctrl, "control", ["referenceGen", "ctrlCompute"])
+		tracer.instrument(loop.est, "estimation", ["runEKF"])
 
-	# initialization of  objects
-	physics = cfSim()
-	reference = "step"
-	ctrl = cfCtrl(reference, physics.config, physics.b,\
-	              physics.I, physics.m, physics.g,\
-	              physics.k, physics.l)
-	est  = cfEKF(physics.g)
-
-	# simulation parameters
-	t_init  = 0
-	t_final = 10
-	t_resolution = 0.001
-	noise  = 0 # if non-zero includes measurement noise with given gain
-	useKalmanFilter = True  # if true the KF is used for feedback
-	quantisation    = False # if false removes quantisation from flow data
-	t_curr = t_init
-	n_steps = int((t_final-t_init)/t_resolution)
-
-	# storage variables
-	t       = np.linspace(t_init,t_final,n_steps)
-	u_store = np.zeros((physics.n_inputs, n_steps))
-	x_store = np.zeros((physics.n_states, n_steps))
-	acc     = np.zeros((3,n_steps)) # inertial measurement
-	gyro    = np.zeros((3,n_steps)) # inertial measurement
-	pxCount = np.zeros((2,n_steps)) # pixel count measurement
-	zrange  = np.zeros((n_steps))   # z ranging measurement
-	set_pt  = np.zeros((3,n_steps)) # setpoint in cf
-	err_fd  = np.zeros((3,n_steps)) # kalman innovation from flow measurements
-	x_est   = np.zeros((9,n_steps)) # state estimated by EKF [pos, vel, eta]
-
-	i = 0 # counter
-
-	# first iteration
-	x_store[:,i] = physics.simulate(t_curr, u_store[:,i]) # simulate physics
-	i = i+1
-
-	# main loop
-	while i<n_steps: 
-		t_curr = t[i]
-		if not i%500:
-			print("simulation at time " + str(t_curr))
-		set_pt[:,i] = ctrl.referenceGen(t_curr)               # get reference
-		if useKalmanFilter :
-			u_store[:,i] = ctrl.ctrlCompute(set_pt[:,i],\
-			                                x_est[0:3,i-1],\
-			                                x_est[3:6,i-1],\
-			                                x_est[6:9,i-1],\
-			                                gyro[:,i-1])
-		else:
-			u_store[:,i] = ctrl.ctrlCompute(set_pt[:,i],\
-			                                x_store[0:3,i-1],\
-			                                x_store[3:6,i-1],\
-			                                physics.quaternionToEuler(x_store[6:10,i-1]),\
-			                                gyro[:,i-1])
-		x_store[:,i] = physics.simulate(t_curr, u_store[:,i]) # simulate physics
-		eta = physics.quaternionToEuler(x_store[6:10,i])
-
-		# store measurements
-		acc[:,i]  = physics.readAcc(noise)
-		gyro[:,i] = physics.readGyro(noise)
-		pxCount[:,i] = physics.readPixelcount(noise, quantisation)
-		zrange[i] = physics.readZRanging(noise)
-		# close loop 
-		x_est[:,i], err_fd[:,i]  = est.runEKF(acc[:,i],gyro[:,i],pxCount[:,i],zrange[i])
-
-		i=i+1 # increase counter
+	loop.run() # main loop
+	n_done = loop.i
 
 	end_test = time.perf_counter()
 	print("This test took " + str(end_test-start_test) + " seconds")
-
+	loop.prof.printSummary(n_done)
+	if useTracer:
+		tracer.save("mitl/traces/" + time.strftime('%d%b%Y_%H%M%S', time.localtime()) + ".json")
+	return toStorage(loop)
+
+def checkpoint(until, **config):
+	# runs a test (configured as for runTest) until time until
+	# output: snapshot of the closed loop, to fork branches from
+	loop = cfLoop(**config)
+	loop.run(until)
+	return loop.snapshot()
+
+def branch(state, changes):
+	# worker: runs a branch forked from a snapshot until the end of the test
+	with contextlib.redirect_stdout(io.StringIO()):
+		return runLoop(cfLoop.fork(state, **changes))
+
+def fork(state, branches, jobs=1):
+	# runs branches from the same snapshot, each a dictionary of changes of
+	# the configuration (e.g. {'fault': "slowTick"}, {'seed': 2, 'noise': 0.05})
+	# input : jobs: number of processes, 1 runs the branches in this process
+	# output: list of storage objects of the branches
+	if jobs == 1:
+		return [branch(state, changes) for changes in branches]
+	with ProcessPoolExecutor(max_workers=jobs) as pool:
+		return list(pool.map(branch, [state]*len(branches), branches))
+
+def toStorage(loop):
+	# stores the traces of a loop up to its last step
 
 	##############################################
 	# store data as object attributes of storage #
 	##############################################
 
+	n_done  = loop.i
 	storeObj = Storage()
 	storeObj.type    = "mitl"
+	storeObj.abort   = loop.monitor.reason # None if the test was completed
+	storeObj.fault   = loop.faults.describe() # None for a nominal test
+	reference = loop.config['reference']
+	storeObj.reference = reference if isinstance(reference, str) else reference.describe()
+	# truncate the traces if the test was aborted
+	t       = loop.t[:n_done]
+	x_store = loop.x_store[:,:n_done]
+	u_store = loop.u_store[:,:n_done]
 	storeObj.t       = t
 	storeObj.x       = x_store
 	storeObj.u       = u_store
+	storeObj.motor_ratio = loop.ratio[:,:n_done] # as read back by the firmware
 
 	# extract states
 	storeObj.pos     = x_store[0:3,:]
@@ -97,20 +98,40 @@ if __name__ == "__main__":
 	storeObj.gyro    = x_store[10:13,:]
 
 	# extract euler angles
-	eta = np.zeros((3, n_steps))
-	for j in range(0,n_steps):
-		eta[:,j] = physics.quaternionToEuler(x_store[6:10,j])
-	storeObj.eta     = eta
+	storeObj.eta     = Rotation.quaternionToEuler(x_store[6:10,:].T).T
 
 	# measurements and other cf data
-	storeObj.acc     = acc
-	storeObj.pxCount = pxCount
-	storeObj.set_pt  = set_pt
-	storeObj.zrange  = zrange
-	storeObj.err_fd  = err_fd
-	storeObj.est_pos = x_est[0:3,:]
-	storeObj.est_vel = x_est[3:6,:]
-	storeObj.est_eta = x_est[6:9,:]
-
-	# save file
-	storeObj.save("mitl/flightdata")
+	storeObj.acc     = loop.acc[:,:n_done]
+	storeObj.pxCount = loop.pxCount[:,:n_done]
+	storeObj.set_pt  = loop.set_pt[:,:n_done]
+	storeObj.zrange  = loop.zrange[:n_done]
+	storeObj.err_fd  = loop.err_fd[:,:n_done]
+	storeObj.est_pos = loop.x_est[0:3,:n_done]
+	storeObj.est_vel = loop.x_est[3:6,:n_done]
+	storeObj.est_eta = loop.x_est[6:9,:n_done]
+
+	# duration of the phases of each step [ns]
+	storeObj.profile = loop.prof.samples[:,:n_done]
+	storeObj.profile_phases = ",".join(loop.prof.phases)
+	return storeObj
+
+if __name__ == "__main__":
+	# fault to inject (see mitl/Faults.py), e.g. "slowTick" or "timingKalman:delay=2,drop=0.1"
+	fault = None
+	if len(sys.argv) > 1 :
+		fault = sys.argv[1]
+
+	# test parameters
+	reference = "step"
+	noise  = 0 # if non-zero includes measurement noise with given gain
+	useKalmanFilter = True  # if true the KF is used for feedback
+	quantisation    = False # if false removes quantisation from flow data
+	useMonitor      = True  # if true the test is stopped when an invariant is violated
+	useTracer       = False # if true a trace of the calls is saved in mitl/traces
+
+	storeObj = runTest(reference, fault, noise=noise, useKalmanFilter=useKalmanFilter,
+	                   quantisation=quantisation, useMonitor=useMonitor, useTracer=useTracer)
+
+	# save file (faulty tests in the directory of the fault, as for the other setups)
+	name = parse(fault)[0] if fault else None
+	storeObj.save("mitl/flightdata" + ("/" + name if name else ""))
@@ -0,0 +1,61 @@
+"""
+Offline monitoring of requirements on many flights (see analysis/STL.py).
+The robustness of each requirement (positive if satisfied) and the earliest
+time at which it is violated are printed for each flight; flights are
+processed in parallel. The exit code is 1 if any requirement is violated.
+  python monitor.py hitl/flightdata sitl/flightdata -r settling altitude
+"""
+import os
+import csv
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from plot import Columnar
+from analysis import STL
+
+def check(flight, names):
+    # worker: evaluates the named requirements on a single flight
+    return STL.monitor(flight, {name: STL.REQUIREMENTS[name]() for name in names})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="check requirements on flights")
+    parser.add_argument("sources", nargs='+', help="flight data or directories containing flight data")
+    parser.add_argument("-r", "--requirements", nargs='+', choices=sorted(STL.REQUIREMENTS),
+                        default=sorted(STL.REQUIREMENTS), help="requirements to check (default: all)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: number of cpus)")
+    parser.add_argument("-o", "--output", help="csv file of the results")
+    args = parser.parse_args()
+
+    flights = []
+    for source in args.sources:
+        flights.extend(Columnar.flights(source) if os.path.isdir(source) and not Columnar.isColumnar(source) else [source])
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        results = list(pool.map(check, flights, [args.requirements]*len(flights)))
+
+    width = max([len(f) for f in flights] + [6])
+    print('flight'.ljust(width) + ''.join(' ' + name.rjust(24) for name in args.requirements))
+    violations = 0
+    for flight, result in zip(flights, results):
+        cells = []
+        for name in args.requirements:
+            value, first = result[name]
+            if value < 0:
+                violations = violations + 1
+                cells.append(' \033[91m' + ('%.4g at %.3f s' % (value, first)).rjust(24) + '\033[0m')
+            else:
+                cells.append(' ' + ('%.4g' % value).rjust(24))
+        print(flight.ljust(width) + ''.join(cells))
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['flight', 'requirement', 'robustness', 'violated_at'])
+            for flight, result in zip(flights, results):
+                for name in args.requirements:
+                    writer.writerow([flight, name] + list(result[name]))
+
+    if violations:
+        print('\033[91m' + str(violations) + ' violations\033[0m')
+        exit(1)
@@ -0,0 +1,106 @@
+"""
+Performance baselines (see benchmarks/Baseline.py).
+  python perf.py run [benchmarks] [-r N]   runs the benchmarks and records them
+  python perf.py record results.json       records the results of benchmark.py
+  python perf.py ingest [flight data]      records the simulation speed of flights
+  python perf.py list                      lists the baselines
+  python perf.py compare BASE [NEW]        compares two baselines (commit prefixes
+                                           or files, NEW defaults to the current
+                                           commit on this machine), exit code 1
+                                           if something got slower
+"""
+import io
+import os
+import sys
+import argparse
+import contextlib
+
+from plot import Columnar
+from benchmarks import Suite
+from benchmarks import Baseline
+
+def select(reference, directory, parser):
+    found = Baseline.find(reference, directory)
+    if len(found) == 1:
+        return found[0]
+    # several matches: prefer the one measured on this machine
+    host = Baseline.hostFingerprint(Suite.environment())
+    local = [f for f in found if Baseline.load(f)['host'] == host]
+    if len(local) == 1:
+        return local[0]
+    parser.error("baseline '" + reference + "' " + ("not found" if not found else
+                 "is ambiguous: " + ", ".join(os.path.basename(f) for f in found)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="performance baselines")
+    parser.add_argument("-d", "--directory", default=Baseline.DIRECTORY, help="directory of the baselines")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="run the benchmarks and record them")
+    run.add_argument("names", nargs='*', default=[n for n in Suite.BENCHMARKS if n != 'mitl'],
+                     help="benchmarks (default: all but the MitL flight)")
+    run.add_argument("-r", "--repeat", type=int, default=None, help="repetitions of each benchmark")
+    record = commands.add_parser("record", help="record the results of benchmark.py")
+    record.add_argument("results")
+    ingest = commands.add_parser("ingest", help="record the simulation speed of flights")
+    ingest.add_argument("sources", nargs='+', help="flight data or directories containing flight data")
+    commands.add_parser("list", help="list the baselines")
+    compare = commands.add_parser("compare", help="compare two baselines")
+    compare.add_argument("base")
+    compare.add_argument("new", nargs='?', default=None)
+    compare.add_argument("-t", "--tolerance", type=float, default=0.05, help="relative change ignored (default: 0.05)")
+    compare.add_argument("-a", "--alpha", type=float, default=0.05, help="significance level (default: 0.05)")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        environment = Suite.environment()
+        samples = dict()
+        for name in args.names:
+            result = Suite.measure(name, args.repeat, memory=False)
+            samples[name] = Baseline.fromResults({'benchmarks': {name: result}})[name]
+            print("* " + name + ": median \033[33m%.4f s\033[0m" % result['median'])
+        print("Recorded in: " + Baseline.record(environment, samples, args.directory))
+
+    elif args.command == "record":
+        results = Baseline.load(args.results)
+        print("Recorded in: " + Baseline.record(results['environment'], Baseline.fromResults(results), args.directory))
+
+    elif args.command == "ingest":
+        from plot.Plot import Storage
+        samples = dict()
+        for source in args.sources:
+            for flight in (Columnar.flights(source) if os.path.isdir(source) and not Columnar.isColumnar(source) else [source]):
+                storage = Storage()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    storage.open(flight, flight)
+                speed = Baseline.fromFlight(storage.data)
+                if speed is None:
+                    continue # flight without profile
+                name, values = speed
+                samples.setdefault(name, {'simulated_per_wall': []})['simulated_per_wall'].extend(values['simulated_per_wall'])
+        if not samples:
+            print("No flights with a profile found")
+            sys.exit(1)
+        for name, metrics in samples.items():
+            print("* " + name + ": " + str(len(metrics['simulated_per_wall'])) + " flights")
+        print("Recorded in: " + Baseline.record(Suite.environment(), samples, args.directory))
+
+    elif args.command == "list":
+        for location in Baseline.find("", args.directory):
+            baseline = Baseline.load(location)
+            environment = baseline['environment']
+            print(os.path.basename(location)[:-len(".json")] + "  " + str(environment.get('host')) + "  " +
+                  str(environment.get('time')) + "  " + ", ".join(sorted(baseline['benchmarks'])))
+
+    else:
+        base = select(args.base, args.directory, parser)
+        new = select(args.new if args.new is not None else Baseline.key(Suite.environment()), args.directory, parser)
+        print("base: " + os.path.basename(base) + "\nnew : " + os.path.basename(new))
+        rows = Baseline.compare(Baseline.load(base), Baseline.load(new), args.tolerance, args.alpha)
+        print("benchmark    metric                  base         new   ratio  95% interval    p-value  samples")
+        colors = {'slower': '\033[91m', 'faster': '\033[92m', 'same': '', 'insufficient': '\033[33m'}
+        for row in rows:
+            print("  %-10s %-18s %11.4g %11.4g  %6.3f  [%.3f, %.3f]  %7.4f  %3d/%-3d %s%s\033[0m" %
+                  (row['benchmark'], row['metric'], row['base'], row['new'], row['ratio'], row['low'], row['high'],
+                   row['pvalue'], row['samples'][0], row['samples'][1], colors[row['verdict']], row['verdict']))
+        if any(row['verdict'] == 'slower' for row in rows):
+            sys.exit(1)
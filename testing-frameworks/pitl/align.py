@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Alignment of the event streams decoded from the uSD-card logs.
+The firmware logs the variables of interest in several events (see config.txt)
+and each event carries its own timestamps. The functions in this file resample
+any number of event streams on a common time base, so that the streams can be
+merged in a single trace even when their lengths differ or they drift apart.
+"""
+import numpy as np
+
+# supported resampling methods
+METHODS = ("nearest", "previous", "linear")
+
+def _sorted(timestamps):
+    # returns the permutation that sorts the timestamps (None if already sorted)
+    if len(timestamps) < 2 or np.all(np.diff(timestamps) >= 0):
+        return None
+    return np.argsort(timestamps, kind="stable")
+
+def _indices(ts, t, method):
+    # input : ts: (sorted) timestamps of the event stream
+    #         t : common time base
+    # output: index of the sample of the stream used for each time in t
+    #         (for linear interpolation, the left sample of the bracket)
+    right = np.searchsorted(ts, t, side="right")
+    prev  = np.clip(right-1, 0, len(ts)-1)
+    if method != "nearest":
+        return prev
+    nxt = np.clip(right, 0, len(ts)-1)
+    return np.where(np.abs(ts[nxt]-t) < np.abs(t-ts[prev]), nxt, prev)
+
+def timeBase(logData, events, reference=None, dt=None):
+    # computes the common time base of the given events. The time base covers
+    # only the interval in which all the streams have data and is either
+    # - the timestamps of the reference event (first event if not given), or
+    # - a uniform grid with step dt (same unit as the timestamps, ms)
+    start = max(logData[e]['timestamp'].min() for e in events)
+    stop  = min(logData[e]['timestamp'].max() for e in events)
+    if dt is not None:
+        return start + dt*np.arange(int(np.floor((stop-start)/dt))+1)
+    if reference is None:
+        reference = events[0]
+    t = np.sort(logData[reference]['timestamp'])
+    return t[(t>=start) & (t<=stop)]
+
+def align(logData, events=None, reference=None, dt=None, method="nearest"):
+    # input : logData  : dictionary returned by cfusdlog.decode
+    #         events   : names of the events to merge (all if not given)
+    #         reference: event whose timestamps are used as time base
+    #         dt       : if given, uniform time base with this step instead
+    #         method   : "nearest", "previous" (zero-order hold) or "linear"
+    # output: t     : common time base
+    #         data  : dictionary with the same structure of logData, where all
+    #                 the variables of the events are sampled at t
+    #         report: dictionary with the statistics of the alignment per event
+    if method not in METHODS:
+        raise ValueError("unknown alignment method: " + str(method))
+    if events is None:
+        events = list(logData.keys())
+    t = timeBase(logData, events, reference, dt)
+
+    data   = dict()
+    report = dict()
+    for event in events:
+        ts    = np.asarray(logData[event]['timestamp'], dtype=float)
+        order = _sorted(ts)
+        if order is not None:
+            ts = ts[order]
+        idx = _indices(ts, t, method)
+
+        data[event] = dict()
+        data[event]['timestamp'] = t
+        for var_name, values in logData[event].items():
+            if var_name == 'timestamp':
+                continue
+            values = values if order is None else values[order]
+            if method == "linear":
+                data[event][var_name] = np.interp(t, ts, values)
+            else:
+                data[event][var_name] = values[idx]
+
+        # samples of the stream that are never used (also the ones outside
+        # the common time window), and times that reuse the previous sample
+        in_window = np.count_nonzero((ts>=t[0]) & (ts<=t[-1])) if len(t) else 0
+        used      = len(np.unique(idx)) if len(t) else 0
+        report[event] = {
+            'samples'   : len(ts),
+            'aligned'   : len(t),
+            'dropped'   : len(ts)-used,
+            'outside'   : len(ts)-in_window,
+            'duplicated': len(idx)-used,
+            'max_offset': float(np.max(np.abs(ts[idx]-t))) if len(t) else 0.0,
+            'reordered' : order is not None,
+            }
+    return t, data, report
+
+def printReport(report):
+    # prints the alignment statistics returned by align
+    for event, r in report.items():
+        line = '* ' + event + ': ' + str(r['samples']) + ' samples -> ' + str(r['aligned']) + \
+               ', dropped \033[33m' + str(r['dropped']) + '\033[0m' + \
+               ' (' + str(r['outside']) + ' outside the common window)' + \
+               ', duplicated \033[33m' + str(r['duplicated']) + '\033[0m' + \
+               ', max offset ' + '{:.3f}'.format(r['max_offset']) + ' ms'
+        if r['reordered']:
+            line = line + ' (timestamps reordered)'
+        print(line)
@@ -7,6 +7,10 @@ from zlib import crc32
 import struct
 import numpy as np
 
+# version of the decoded output: increase it whenever decode() changes
+# the content of the returned dictionary (invalidates pitl/logcache.py)
+DECODER_VERSION = 1
+
 # extract null-terminated string
 def _get_name(data, idx):
     endIdx = idx
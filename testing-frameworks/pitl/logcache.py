@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of the decoded uSD-card logs.
+Decoding a raw log with cfusdlog.decode parses the whole binary every time.
+The decoded arrays are stored once in pitl/cache as .npy files, keyed by the
+CRC of the raw file and by the decoder version, and are memory-mapped when the
+same recording is decoded again.
+"""
+import os
+import json
+import shutil
+import tempfile
+from zlib import crc32
+import numpy as np
+
+from pitl import cfusdlog
+
+# default location of the cache: next to pitl/recordings
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+INDEX_FILE = "index.json"
+
+def cacheKey(filename):
+    # key of a raw log: CRC of the content (computed as in cfusdlog.decode)
+    # and version of the decoder that produced the cached arrays
+    with open(filename, 'rb') as f:
+        data = f.read()
+    return "{:08x}-v{}".format(crc32(data[0:-4]), cfusdlog.DECODER_VERSION)
+
+def load(entry):
+    # reads a cache entry, arrays are memory-mapped (read only)
+    with open(os.path.join(entry, INDEX_FILE)) as f:
+        index = json.load(f)
+    result = dict()
+    for event_name, variables in index['events'].items():
+        result[event_name] = dict()
+        for var_name, array_file in variables.items():
+            result[event_name][var_name] = np.load(os.path.join(entry, array_file), mmap_mode='r')
+    return result
+
+def store(entry, result, source):
+    # writes the decoded log to a cache entry. The entry is first written to a
+    # temporary directory and then renamed, so concurrent decoders never see
+    # a partially written entry
+    parent = os.path.dirname(entry)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent)
+    index = {'source': os.path.basename(source), 'events': dict()}
+    counter = 0
+    for event_name, variables in result.items():
+        index['events'][event_name] = dict()
+        for var_name, values in variables.items():
+            array_file = "{}.npy".format(counter)
+            np.save(os.path.join(tmp, array_file), values)
+            index['events'][event_name][var_name] = array_file
+            counter = counter + 1
+    with open(os.path.join(tmp, INDEX_FILE), 'w') as f:
+        json.dump(index, f)
+    try:
+        os.rename(tmp, entry)
+    except OSError: # somebody else stored the same entry in the meantime
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def decode(filename, cache_dir=CACHE_DIR):
+    # drop-in replacement of cfusdlog.decode that uses the cache
+    entry = os.path.join(cache_dir, cacheKey(filename))
+    if os.path.isfile(os.path.join(entry, INDEX_FILE)):
+        return load(entry)
+    result = cfusdlog.decode(filename)
+    if result is None: # unsupported log, nothing to cache
+        return result
+    store(entry, result, filename)
+    return load(entry)
+
+def clear(cache_dir=CACHE_DIR):
+    # removes all the cached logs
+    shutil.rmtree(cache_dir, ignore_errors=True)
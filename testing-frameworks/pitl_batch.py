@@ -0,0 +1,98 @@
+"""
+Batch conversion of the raw uSD-card logs into flight data.
+Every log found in the given directory (recursively) or matching the given
+glob pattern is decoded, aligned and saved with pitl_main.toStorage, across
+a pool of processes. The output has the same relative path of the raw log
+(pitl/recordings/nominal is converted into pitl/flightdata/nominal), unless
+the names.json file of the searched directory maps the log to another name
+(e.g. nominal-repeated/pitl05 -> nominal-repeated/05, the names of the
+existing flights). Each output stores the key of the content of its raw log
+(see pitl/logcache.py) and is skipped if the key still matches.
+"""
+import os
+import json
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import pitl_main
+import pitl.logcache
+from plot import Columnar
+
+NAMES_FILE = "names.json" # relative path of a raw log -> relative output name
+
+def findLogs(source):
+    # input : directory or glob pattern
+    # output: list of (raw log, relative output name) pairs
+    if os.path.isdir(source):
+        names = dict()
+        if os.path.isfile(os.path.join(source, NAMES_FILE)):
+            with open(os.path.join(source, NAMES_FILE)) as f:
+                names = json.load(f)
+        logs = []
+        for root, dirs, files in os.walk(source):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, source)
+                if not name.startswith('.') and relative != NAMES_FILE:
+                    logs.append((path, names.get(relative, relative)))
+        return logs
+    return [(path, os.path.basename(path)) for path in sorted(glob.glob(source)) if os.path.isfile(path)]
+
+def upToDate(key, output):
+    # output is up to date if it was converted from a raw log with the given
+    # content key (pickled flights do not store it: never up to date)
+    if not Columnar.isColumnar(output):
+        return False
+    return getattr(Columnar.read(output), 'source_key', None) == key
+
+def convert(log, output, key):
+    # worker: converts a single raw log, returns the alignment report
+    storeObj, report = pitl_main.toStorage(log)
+    storeObj.source_key = key
+    directory, filename = os.path.split(output)
+    os.makedirs(directory, exist_ok=True)
+    storeObj.save(directory, filename)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="convert raw PITL logs into flight data")
+    parser.add_argument("source", nargs='?', default="pitl/recordings",
+                        help="directory (searched recursively) or glob pattern of the raw logs")
+    parser.add_argument("-o", "--output", default="pitl/flightdata",
+                        help="output directory (default: pitl/flightdata)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: number of cpus)")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="convert also logs whose output is up to date")
+    args = parser.parse_args()
+
+    jobs = []
+    for log, name in findLogs(args.source):
+        output = os.path.join(args.output, name)
+        if os.path.getsize(log) == 0: # aborted recording
+            print('* empty log, skipped: \033[33m' + log + '\033[0m')
+            continue
+        key = pitl.logcache.cacheKey(log)
+        if not args.force and upToDate(key, output):
+            print('* up to date: \033[33m' + output + '\033[0m')
+        else:
+            jobs.append((log, output, key))
+    print('* converting \033[33m' + str(len(jobs)) + '\033[0m logs')
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [(log, output, pool.submit(convert, log, output, key)) for log, output, key in jobs]
+        for log, output, future in futures:
+            try:
+                report = future.result()
+                dropped = sum(r['dropped'] for r in report.values())
+                duplicated = sum(r['duplicated'] for r in report.values())
+                print('* ' + log + ' -> \033[33m' + output + '\033[0m' +
+                      ' (dropped ' + str(dropped) + ', duplicated ' + str(duplicated) + ')')
+            except Exception as e:
+                failed = failed + 1
+                print('\033[91mError:\033[0m ' + log + ': ' + str(e))
+    if failed:
+        exit(1)
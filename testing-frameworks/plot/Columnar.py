@@ -0,0 +1,114 @@
+"""
+Columnar on-disk format of the flight data.
+A flight is stored as a directory with a small JSON header (header.json)
+and one raw binary file per array field. The header contains the non-array
+attributes of the flight (e.g. the type of test) and dtype and shape of each
+field. Fields are memory-mapped when opened, so reading a single channel
+does not require loading the whole flight.
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+
+FORMAT_NAME    = "cps-flightdata"
+FORMAT_VERSION = 1
+HEADER_FILE    = "header.json"
+
+
+def isColumnar(location):
+  # true if location is a flight stored in columnar format
+  return os.path.isfile(os.path.join(location, HEADER_FILE))
+
+
+def write(location, obj):
+  # input : location: directory that will contain the flight
+  #         obj     : object whose attributes are stored (array attributes
+  #                   become fields, the others are stored in the header)
+  # the flight is written in a temporary directory that replaces location
+  # only once complete
+  location = os.path.normpath(location)
+  parent = os.path.dirname(location) or "."
+  os.makedirs(parent, exist_ok=True)
+  tmp = tempfile.mkdtemp(dir=parent, prefix="." + os.path.basename(location) + ".")
+  try:
+    os.chmod(tmp, 0o755) # mkdtemp creates private directories
+    header = {'format': FORMAT_NAME, 'version': FORMAT_VERSION, 'attributes': dict(), 'fields': dict()}
+    for name, value in vars(obj).items():
+      if name.startswith('_'):
+        continue
+      if isinstance(value, np.ndarray) or isinstance(value, list):
+        array = np.ascontiguousarray(value)
+        array = array.astype(array.dtype.newbyteorder('<'), copy=False)
+        array.tofile(os.path.join(tmp, name + ".bin"))
+        header['fields'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'file': name + ".bin"}
+      elif isinstance(value, (str, int, float, bool)) or value is None:
+        header['attributes'][name] = value
+    with open(os.path.join(tmp, HEADER_FILE), 'w') as f:
+      json.dump(header, f, indent=1)
+    # the previous flight may be a directory or a file (pickle format)
+    if os.path.isdir(location) and not os.path.islink(location):
+      shutil.rmtree(location)
+    elif os.path.lexists(location):
+      os.remove(location)
+    os.rename(tmp, location)
+  except BaseException:
+    shutil.rmtree(tmp, ignore_errors=True)
+    raise
+
+
+class ColumnarData:
+  # read-only view of a flight stored in columnar format: attributes from
+  # the header are available immediately, fields are memory-mapped on first
+  # access
+
+  def __init__(self, location):
+    self._location = location
+    with open(os.path.join(location, HEADER_FILE)) as f:
+      header = json.load(f)
+    if header.get('format') != FORMAT_NAME or header.get('version', 0) > FORMAT_VERSION:
+      raise ValueError('unsupported flight data format in ' + location)
+    self._fields = header['fields']
+    for name, value in header['attributes'].items():
+      setattr(self, name, value)
+
+  def __getattr__(self, name):
+    # only called for attributes not set yet: map the field
+    fields = self.__dict__.get('_fields', dict())
+    if name not in fields:
+      raise AttributeError(name)
+    field = fields[name]
+    shape = tuple(field['shape'])
+    if np.prod(shape) == 0: # empty files cannot be memory-mapped
+      array = np.zeros(shape, dtype=field['dtype'])
+    else:
+      array = np.memmap(os.path.join(self._location, field['file']), dtype=field['dtype'], mode='r', shape=shape)
+    setattr(self, name, array)
+    return array
+
+  def fields(self):
+    # names of the array fields of the flight
+    return list(self._fields.keys())
+
+
+def read(location):
+  # opens a flight stored in columnar format
+  return ColumnarData(location)
+
+
+def flights(directory):
+  # lists (recursively, sorted) the flights in a directory: columnar flight
+  # directories and files (pickled flights), hidden entries are skipped
+  found = []
+  for root, dirs, files in os.walk(directory):
+    dirs.sort()
+    for d in list(dirs):
+      if d.startswith('.'):
+        dirs.remove(d)
+      elif isColumnar(os.path.join(root, d)):
+        found.append(os.path.join(root, d))
+        dirs.remove(d)
+    found.extend(os.path.join(root, f) for f in sorted(files) if not f.startswith('.'))
+  return sorted(found)
@@ -0,0 +1,88 @@
+"""
+Shape-preserving decimation of the traces for plotting.
+Two methods are available, both returning the indices of the kept samples
+(first and last sample are always kept):
+* lttb  : largest-triangle-three-buckets, keeps one sample per bucket, the one
+          forming the largest triangle with the previously kept sample and the
+          average of the next bucket (good for smooth signals, keeps spikes)
+* minmax: keeps minimum and maximum of each bucket (the envelope of noisy
+          signals and every spike are preserved exactly)
+"""
+
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+
+
+def _buckets(start, stop, n_buckets):
+  # splits the samples [start, stop) in n_buckets contiguous buckets
+  # output: matrix of sample indices, one row per bucket, rows shorter than
+  #         the longest one are padded repeating their last index
+  edges = np.linspace(start, stop, n_buckets+1).astype(int)
+  size  = max(int(np.max(np.diff(edges))), 1)
+  idx   = edges[:-1, None] + np.arange(size)[None, :]
+  return np.minimum(idx, np.maximum(edges[1:, None]-1, edges[:-1, None])), edges
+
+
+def lttb(x, y, n):
+  # input : x, y: trace (x increasing), n: number of samples to keep
+  # output: indices of the kept samples
+  x = np.asarray(x, dtype=float)
+  y = np.asarray(y, dtype=float)
+  length = len(y)
+  if n >= length or n < 3:
+    return np.arange(length) if n >= length else np.array([0, length-1])[:max(n, 0)]
+
+  # all the samples but the first and the last are split in n-2 buckets
+  idx, edges = _buckets(1, length-1, n-2)
+  bx = x[idx]
+  by = y[idx]
+  # average of each bucket, the last sample plays the role of the bucket
+  # that follows the last one
+  counts = np.diff(edges).astype(float)
+  avg_x  = np.append(np.add.reduceat(x[1:length-1], edges[:-1]-1)/counts, x[-1])
+  avg_y  = np.append(np.add.reduceat(y[1:length-1], edges[:-1]-1)/counts, y[-1])
+
+  kept = np.empty(n, dtype=int)
+  kept[0]  = 0
+  kept[-1] = length-1
+  ax = x[0]
+  ay = y[0]
+  for b in range(n-2):
+    # (doubled) area of the triangles: previous kept sample, candidate,
+    # average of the next bucket
+    area = np.abs((ax-avg_x[b+1])*(by[b]-ay) - (ax-bx[b])*(avg_y[b+1]-ay))
+    best = int(np.argmax(area))
+    kept[b+1] = idx[b, best]
+    ax = bx[b, best]
+    ay = by[b, best]
+  return kept
+
+
+def minmax(x, y, n):
+  # input : x, y: trace (x increasing), n: number of samples to keep
+  # output: indices of the kept samples
+  y = np.asarray(y, dtype=float)
+  length = len(y)
+  if n >= length or n < 4:
+    return np.arange(length) if n >= length else np.array([0, length-1])[:max(n, 0)]
+
+  # each bucket contributes with two samples
+  idx, _ = _buckets(1, length-1, (n-2)//2)
+  by   = y[idx]
+  rows = np.arange(idx.shape[0])
+  low  = idx[rows, np.argmin(by, axis=1)]
+  high = idx[rows, np.argmax(by, axis=1)]
+  kept = np.concatenate(([0], np.minimum(low, high), np.maximum(low, high), [length-1]))
+  return np.unique(kept)
+
+
+def decimate(x, y, n, method="lttb"):
+  # decimates the trace (x, y) to (about) n samples with the given method
+  # output: decimated x and y
+  if method not in METHODS:
+    raise ValueError("unknown decimation method: " + str(method))
+  if n is None or len(y) <= n:
+    return x, y
+  kept = lttb(x, y, n) if method == "lttb" else minmax(x, y, n)
+  return np.asarray(x)[kept], np.asarray(y)[kept]
@@ -0,0 +1,69 @@
+"""
+Export of the flight data to csv files.
+All the values of a table are formatted with a single string formatting
+operation, instead of converting and concatenating them one by one.
+Columns are given as a list of (name, array) pairs, all with the same length.
+"""
+
+import numpy as np
+
+
+def _valueFormat(precision):
+  # format of a single value: shortest representation (like str) if the
+  # precision is not given, otherwise number of significant digits
+  if precision is None:
+    return '%r'
+  return '%.' + str(int(precision)) + 'g'
+
+
+def _block(columns, precision, index, prefix=''):
+  # formats a table (without header) in a single string
+  # input : columns  : list of (name, array) pairs
+  #         precision: significant digits (None for full precision)
+  #         index    : if true the first column is the row index
+  #         prefix   : text at the beginning of each row
+  length = len(columns[0][1]) if columns else 0
+  if length == 0:
+    return ''
+  values = [np.asarray(values, dtype=float).reshape(length) for _, values in columns]
+  rowFormat = [_valueFormat(precision)]*len(values)
+  if index:
+    values.insert(0, np.arange(length, dtype=float))
+    rowFormat.insert(0, '%d')
+  rowFormat = prefix.replace('%', '%%') + ', '.join(rowFormat) + '\n'
+  table = np.column_stack(values)
+  return (rowFormat*length) % tuple(table.ravel().tolist())
+
+
+def _header(columns, index, prefix=''):
+  names = [name for name, _ in columns]
+  if index:
+    names.insert(0, 'i')
+  return prefix + ', '.join(names) + ' \n'
+
+
+def writeCSV(location, columns, precision=None, index=True):
+  # writes a table to a csv file
+  # input : location : path of the csv file
+  #         columns  : list of (name, array) pairs
+  #         precision: significant digits (None for full precision)
+  #         index    : if true the first column is the row index 'i'
+  with open(location, 'w') as f:
+    f.write(_header(columns, index))
+    f.write(_block(columns, precision, index))
+
+
+def writeLongCSV(location, flights, precision=None, index=True):
+  # writes many flights in a single csv file (long format): the rows of all
+  # the flights are stacked and the first column contains the flight name
+  # input : flights: list of (flight name, columns) pairs, all the flights
+  #                  must have the same column names (lengths can differ)
+  if not flights:
+    raise ValueError('no flights to export')
+  names = [name for name, _ in flights[0][1]]
+  with open(location, 'w') as f:
+    f.write(_header(flights[0][1], index, prefix='flight, '))
+    for flight, columns in flights:
+      if [name for name, _ in columns] != names:
+        raise ValueError('flight ' + str(flight) + ' has different columns')
+      f.write(_block(columns, precision, index, prefix=str(flight) + ', '))
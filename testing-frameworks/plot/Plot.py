@@ -1,35 +1,102 @@
 import os
 import time
 import pickle as pk
+import matplotlib
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_pdf import PdfPages
 import numpy as np
+from plot import Columnar
+from plot import Export
+from plot import Decimate
 
 # global variable: configuration
 # should I remove intermediate files or not
 # set to False to generate paper figures
 remove_intermediate = True
 
+# decimation of the plotted traces: number of points per trace (None to
+# plot all the samples) and method per column (see Decimate.py), columns
+# with spikes or noise use minmax so that no extreme value is lost
+pdf_points  = 1000
+show_points = None
+# path simplification of render_pdf (in pixels): line segments closer than
+# this to a straight line are merged
+render_simplify_threshold = 0.5
+decimation_method = {'acceleration_x' : 'minmax', 'acceleration_y' : 'minmax', 'acceleration_z' : 'minmax',
+                     'gyro_x'         : 'minmax', 'gyro_y'         : 'minmax', 'gyro_z'         : 'minmax',
+                     'pixel_count_x'  : 'minmax', 'pixel_count_y'  : 'minmax', 'range_z'        : 'minmax',
+                     'kalman_error_x' : 'minmax', 'kalman_error_y' : 'minmax', 'kalman_error_z' : 'minmax',
+                     'control_motor_1': 'minmax', 'control_motor_2': 'minmax',
+                     'control_motor_3': 'minmax', 'control_motor_4': 'minmax'}
+
+# columns of the csv file used for the pdf plots, in order
+# (save_latex refers to them by index, 'i' being column 0)
+csv_columns = ['time',
+               'position_x', 'position_y', 'position_z',
+               'estimated_position_x', 'estimated_position_y', 'estimated_position_z',
+               'setpoint_position_x', 'setpoint_position_y', 'setpoint_position_z',
+               'velocity_x', 'velocity_y', 'velocity_z',
+               'estimated_velocity_x', 'estimated_velocity_y', 'estimated_velocity_z',
+               'acceleration_x', 'acceleration_y', 'acceleration_z',
+               'attitude_x', 'attitude_y', 'attitude_z',
+               'gyro_x', 'gyro_y', 'gyro_z',
+               'pixel_count_x', 'kalman_error_x',
+               'pixel_count_y', 'kalman_error_y',
+               'range_z', 'kalman_error_z',
+               'control_motor_1', 'control_motor_2', 'control_motor_3', 'control_motor_4']
+
+
+class StorageUnpickler(pk.Unpickler):
+  # pickled flights contain the class path of Storage, which changed
+  # over time (plot.plot, plot, plot.Plot): map all of them to Storage
+  def find_class(self, module, name):
+    if name == 'Storage':
+      return Storage
+    return super().find_class(module, name)
+
+
+def loadPickle(data_location):
+  # reads a flight saved as a pickled Storage object
+  with open(data_location, 'rb') as f:
+    return StorageUnpickler(f).load()
+
+
+def save_long_csv(csv_location, storages, columns=None, precision=None):
+  # saves many opened flights in a single csv file (long format): the first
+  # column contains the experiment name of each flight
+  if columns is None:
+    columns = csv_columns
+  Export.writeLongCSV(csv_location, [(s.experiment_name, [(c, getattr(s, c)) for c in columns]) for s in storages], precision=precision)
+
 
 class Storage:
 
   def __init__(self):
     pass
 
-  def save(self, directory):
-    # saves itself to file named as current date and time
-    filename = time.strftime('%d%b%Y_%H%M%S', time.localtime())
-    with open(directory+"/"+filename, "wb") as f:
-      pk.dump(self, f, protocol=pk.HIGHEST_PROTOCOL)
+  def save(self, directory, filename=None):
+    # saves itself in columnar format (see Columnar.py) to a flight
+    # named as current date and time (unless given)
+    if filename is None:
+      filename = time.strftime('%d%b%Y_%H%M%S', time.localtime())
+    Columnar.write(directory+"/"+filename, self)
 
   def open(self, data_location, experiment_name):
     self.data_location = data_location
     self.experiment_name = str(experiment_name)
 
-    with open(self.data_location, 'rb') as f:
-      self.data = pk.load(f)
+    if Columnar.isColumnar(self.data_location):
+      self.data = Columnar.read(self.data_location)
+    else: # pickled flight (old format)
+      self.data = loadPickle(self.data_location)
     print('Reading data from file: \033[4m' + self.data_location + '\033[0m')
+    if not hasattr(self.data, 'type'): # some old flights miss it: use the setup directory
+      self.data.type = os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(self.data_location))))
     self.type = self.data.type
     print('Type of test is: ' + self.type)
+    if getattr(self.data, 'abort', None) is not None:
+      print('Test stopped early: \033[91m' + self.data.abort + '\033[0m')
     self.unwrap()
 
   def unwrap(self):
@@ -97,65 +164,44 @@ class Storage:
     self.control_motor_3 = self.data.u[2, :]
     self.control_motor_4 = self.data.u[3, :]
 
-  def save_csv(self, csv_location):
-
-    with open(csv_location, 'w') as f:
-
-      # header for file
-      f.write('i, time, ' +
-              'position_x, position_y, position_z, ' +
-              'estimated_position_x, estimated_position_y, estimated_position_z, ' +
-              'setpoint_position_x, setpoint_position_y, setpoint_position_z, ' +
-              'velocity_x, velocity_y, velocity_z, ' +
-              'estimated_velocity_x, estimated_velocity_y, estimated_velocity_z, ' +
-              'acceleration_x, acceleration_y, acceleration_z, ' +
-              'attitude_x, attitude_y, attitude_z, ' +
-              'gyro_x, gyro_y, gyro_z, ' +
-              'pixel_count_x, kalman_error_x, ' +
-              'pixel_count_y, kalman_error_y, ' +
-              'range_z, kalman_error_z, ' +
-              'control_motor_1, control_motor_2, control_motor_3, control_motor_4 \n')
-
-      for i in range(self.trace_length):
-        ith_string = str(i) + ", " + \
-                     str(self.time[i]) + ", " + \
-                     str(self.position_x[i]) + ", " + \
-                     str(self.position_y[i]) + ", " + \
-                     str(self.position_z[i]) + ", " + \
-                     str(self.estimated_position_x[i]) + ", " + \
-                     str(self.estimated_position_y[i]) + ", " + \
-                     str(self.estimated_position_z[i]) + ", " + \
-                     str(self.setpoint_position_x[i]) + ", " + \
-                     str(self.setpoint_position_y[i]) + ", " + \
-                     str(self.setpoint_position_z[i]) + ", " + \
-                     str(self.velocity_x[i]) + ", " + \
-                     str(self.velocity_y[i]) + ", " + \
-                     str(self.velocity_z[i]) + ", " + \
-                     str(self.estimated_velocity_x[i]) + ", " + \
-                     str(self.estimated_velocity_y[i]) + ", " + \
-                     str(self.estimated_velocity_z[i]) + ", " + \
-                     str(self.acceleration_x[i]) + ", " + \
-                     str(self.acceleration_y[i]) + ", " + \
-                     str(self.acceleration_z[i]) + ", " + \
-                     str(self.attitude_x[i]) + ", " + \
-                     str(self.attitude_y[i]) + ", " + \
-                     str(self.attitude_z[i]) + ", " + \
-                     str(self.gyro_x[i]) + ", " + \
-                     str(self.gyro_y[i]) + ", " + \
-                     str(self.gyro_z[i]) + ", " + \
-                     str(self.pixel_count_x[i]) + ", " + \
-                     str(self.kalman_error_x[i]) + ", " + \
-                     str(self.pixel_count_y[i]) + ", " + \
-                     str(self.kalman_error_y[i]) + ", " + \
-                     str(self.range_z[i]) + ", " + \
-                     str(self.kalman_error_z[i]) + ", " + \
-                     str(self.control_motor_1[i]) + ", " + \
-                     str(self.control_motor_2[i]) + ", " + \
-                     str(self.control_motor_3[i]) + ", " + \
-                     str(self.control_motor_4[i]) + "\n"
-        f.write(ith_string)
-
-  def save_latex(self, latex_location, csv_location):
+  def save_csv(self, csv_location, columns=None, precision=None):
+    # columns: subset of csv_columns to export (all if not given)
+    # precision: significant digits of the values (full precision if not given)
+    if columns is None:
+      columns = csv_columns
+    Export.writeCSV(csv_location, [(c, getattr(self, c)) for c in columns], precision=precision)
+
+  def trace(self, name, points=None):
+    # time and values of a column, decimated to (about) the given number
+    # of points with the method chosen for the column in decimation_method
+    values = getattr(self, name)
+    if points is None:
+      return self.time, values
+    return Decimate.decimate(self.time, values, points, decimation_method.get(name, 'lttb'))
+
+  def save_decimated_csv(self, csv_location, points, precision=None):
+    # saves the columns of save_csv, each one decimated independently and
+    # preceded by its own time column (shorter columns are padded with nan)
+    traces  = [self.trace(c, points) for c in csv_columns[1:]]
+    length  = max(len(t) for t, _ in traces)
+    padding = lambda v: np.concatenate((v, np.full(length-len(v), np.nan)))
+    columns = []
+    for c, (t, v) in zip(csv_columns[1:], traces):
+      columns.append(('time_' + c, padding(t)))
+      columns.append((c, padding(v)))
+    Export.writeCSV(csv_location, columns, precision=precision)
+
+  def save_latex(self, latex_location, csv_location, paired=False):
+    # paired: csv file written by save_decimated_csv instead of save_csv
+
+    def table(index):
+      # pgfplots table of the given column (index in the csv of save_csv)
+      if paired: # each column has its own time column before it
+        x, y = 2*index-3, 2*index-2
+      else:
+        x, y = 1, index
+      return 'table[col sep=comma, x index=' + str(x) + ', y index=' + str(y) + '] {' + csv_location + '}'
+
     with open(latex_location, 'w') as f:
       f.write(r'\documentclass{article}' + '\n')
       f.write(r'\usepackage[margin=2cm]{geometry}' + '\n')
@@ -177,105 +223,109 @@ class Storage:
       f.write(r'grid style={densely dotted, black!50},' + '\n')
       f.write(r'grid = major]' + '\n')
       f.write(r'\nextgroupplot[title = {Position $x$}, legend pos = north east]' + '\n')
-      f.write(r'\addplot[ultra thick, black] table[col sep=comma, x index=1, y index=8] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra thick, black] ' + table(8) + r';' + '\n')
       f.write(r'\addlegendentry{Setpoint $x$}' + '\n')
       if not(self.type=='pitl'):
-        f.write(r'\addplot[ultra  thick, blue] table[col sep=comma, x index=1, y index=2] {' + csv_location + r'};' + '\n')
+        f.write(r'\addplot[ultra  thick, blue] ' + table(2) + r';' + '\n')
         f.write(r'\addlegendentry{Position $x$}' + '\n')
-      f.write(r'\addplot[ultra  thick, blue, densely dotted] table[col sep=comma, x index=1, y index=5] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, blue, densely dotted] ' + table(5) + r';' + '\n')
       f.write(r'\addlegendentry{Estimated $x$}' + '\n')
       f.write(r'\nextgroupplot[title = {Velocity $x$}]' + '\n')
       if not(self.type=='pitl'):
-        f.write(r'\addplot[ultra  thick, blue] table[col sep=comma, x index=1, y index=11] {' + csv_location + r'};' + '\n')
+        f.write(r'\addplot[ultra  thick, blue] ' + table(11) + r';' + '\n')
         f.write(r'\addlegendentry{Velocity $x$}' + '\n')
-      f.write(r'\addplot[ultra  thick, blue, densely dotted] table[col sep=comma, x index=1, y index=14] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, blue, densely dotted] ' + table(14) + r';' + '\n')
       f.write(r'\addlegendentry{Estimated velocity $x$}' + '\n')
       f.write(r'\nextgroupplot[title = {Position $y$}]' + '\n')
-      f.write(r'\addplot[ultra thick, black] table[col sep=comma, x index=1, y index=9] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra thick, black] ' + table(9) + r';' + '\n')
       f.write(r'\addlegendentry{Setpoint $y$}' + '\n')
       if not(self.type=='pitl'):
-        f.write(r'\addplot[ultra  thick, green!60!black] table[col sep=comma, x index=1, y index=3] {' + csv_location + r'};' + '\n')
+        f.write(r'\addplot[ultra  thick, green!60!black] ' + table(3) + r';' + '\n')
         f.write(r'\addlegendentry{Position $y$}' + '\n')
-      f.write(r'\addplot[ultra  thick, green!60!black, densely dotted] table[col sep=comma, x index=1, y index=6] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, green!60!black, densely dotted] ' + table(6) + r';' + '\n')
       f.write(r'\addlegendentry{Estimated $y$}' + '\n')
       f.write(r'\nextgroupplot[title = {Velocity $y$}, legend pos = north east]' + '\n')
       if not(self.type=='pitl'):
-        f.write(r'\addplot[ultra  thick, green!60!black] table[col sep=comma, x index=1, y index=12] {' + csv_location + r'};' + '\n')
+        f.write(r'\addplot[ultra  thick, green!60!black] ' + table(12) + r';' + '\n')
         f.write(r'\addlegendentry{Velocity $y$}' + '\n')
-      f.write(r'\addplot[ultra  thick, green!60!black, densely dotted] table[col sep=comma, x index=1, y index=15] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, green!60!black, densely dotted] ' + table(15) + r';' + '\n')
       f.write(r'\addlegendentry{Estimated velocity $y$}' + '\n')
       f.write(r'\nextgroupplot[title = {Position $z$}]' + '\n')
-      f.write(r'\addplot[ultra thick, black] table[col sep=comma, x index=1, y index=10] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra thick, black] ' + table(10) + r';' + '\n')
       f.write(r'\addlegendentry{Setpoint $z$}' + '\n')
       if not(self.type=='pitl'):
-        f.write(r'\addplot[ultra  thick, red!80!black] table[col sep=comma, x index=1, y index=4] {' + csv_location + r'};' + '\n')
+        f.write(r'\addplot[ultra  thick, red!80!black] ' + table(4) + r';' + '\n')
         f.write(r'\addlegendentry{Position $z$}' + '\n')
-      f.write(r'\addplot[ultra  thick, red!80!black, densely dotted] table[col sep=comma, x index=1, y index=7] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, red!80!black, densely dotted] ' + table(7) + r';' + '\n')
       f.write(r'\addlegendentry{Estimated $z$}' + '\n')
       f.write(r'\nextgroupplot[title = {Velocity $z$}, legend pos = north east]' + '\n')
-      f.write(r'\addplot[ultra  thick, red!80!black] table[col sep=comma, x index=1, y index=13] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, red!80!black] ' + table(13) + r';' + '\n')
       f.write(r'\addlegendentry{Velocity $z$}' + '\n')
-      f.write(r'\addplot[ultra  thick, red!80!black, densely dotted] table[col sep=comma, x index=1, y index=16] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, red!80!black, densely dotted] ' + table(16) + r';' + '\n')
       f.write(r'\addlegendentry{Estimated velocity $z$}' + '\n')
       f.write(r'\nextgroupplot[title = {Acceleration $x, y, z$}, legend columns = 3, legend pos = north east]' + '\n')
-      f.write(r'\addplot[ultra  thick, blue] table[col sep=comma, x index=1, y index=17] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, blue] ' + table(17) + r';' + '\n')
       f.write(r'\addlegendentry{$x$}' + '\n')
-      f.write(r'\addplot[ultra  thick, green!60!black] table[col sep=comma, x index=1, y index=18] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, green!60!black] ' + table(18) + r';' + '\n')
       f.write(r'\addlegendentry{$y$}' + '\n')
-      f.write(r'\addplot[ultra  thick, red!80!black] table[col sep=comma, x index=1, y index=19] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, red!80!black] ' + table(19) + r';' + '\n')
       f.write(r'\addlegendentry{$z$}' + '\n')
       f.write(r'\nextgroupplot[title = {Attitude $x, y, z$}, legend columns = 3, legend pos = north east]' + '\n')
       if not(self.type=='pitl'):
-        f.write(r'\addplot[ultra  thick, blue] table[col sep=comma, x index=1, y index=20] {' + csv_location + r'};' + '\n')
+        f.write(r'\addplot[ultra  thick, blue] ' + table(20) + r';' + '\n')
         f.write(r'\addlegendentry{$x$}' + '\n')
-        f.write(r'\addplot[ultra  thick, green!60!black] table[col sep=comma, x index=1, y index=21] {' + csv_location + r'};' + '\n')
+        f.write(r'\addplot[ultra  thick, green!60!black] ' + table(21) + r';' + '\n')
         f.write(r'\addlegendentry{$y$}' + '\n')
-        f.write(r'\addplot[ultra  thick, red!80!black] table[col sep=comma, x index=1, y index=22] {' + csv_location + r'};' + '\n')
+        f.write(r'\addplot[ultra  thick, red!80!black] ' + table(22) + r';' + '\n')
         f.write(r'\addlegendentry{$z$}' + '\n')
       f.write(r'\nextgroupplot[title = {Gyro $x, y, z$}, legend columns = 3, legend pos = north east]' + '\n')
-      f.write(r'\addplot[ultra  thick, blue] table[col sep=comma, x index=1, y index=23] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, blue] ' + table(23) + r';' + '\n')
       f.write(r'\addlegendentry{$x$}' + '\n')
-      f.write(r'\addplot[ultra  thick, green!60!black] table[col sep=comma, x index=1, y index=24] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, green!60!black] ' + table(24) + r';' + '\n')
       f.write(r'\addlegendentry{$y$}' + '\n')
-      f.write(r'\addplot[ultra  thick, red!80!black] table[col sep=comma, x index=1, y index=25] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, red!80!black] ' + table(25) + r';' + '\n')
       f.write(r'\addlegendentry{$z$}' + '\n')
       f.write(r'\nextgroupplot[title = {$z$-range}]' + '\n')
-      f.write(r'\addplot[ultra  thick, red!80!black] table[col sep=comma, x index=1, y index=30] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, red!80!black] ' + table(30) + r';' + '\n')
       f.write(r'\addlegendentry{$z$-range}' + '\n')
       f.write(r'\nextgroupplot[title = {Pixel count $x,y$}, legend pos = north east, legend columns = 2]' + '\n')
-      f.write(r'\addplot[ultra  thick, blue] table[col sep=comma, x index=1, y index=26] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, blue] ' + table(26) + r';' + '\n')
       f.write(r'\addlegendentry{$x$}' + '\n')
-      f.write(r'\addplot[ultra  thick, green!60!black] table[col sep=comma, x index=1, y index=28] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, green!60!black] ' + table(28) + r';' + '\n')
       f.write(r'\addlegendentry{$y$}' + '\n')
       f.write(r'\nextgroupplot[title = {Kalman errors $x,y,z$}, legend columns = 3, legend pos = north east]' + '\n')
       if not(self.type=='pitl'):
-        f.write(r'\addplot[ultra  thick, blue, densely dotted] table[col sep=comma, x index=1, y index=27] {' + csv_location + r'};' + '\n')
+        f.write(r'\addplot[ultra  thick, blue, densely dotted] ' + table(27) + r';' + '\n')
         f.write(r'\addlegendentry{$x$}' + '\n')
-        f.write(r'\addplot[ultra  thick, green!60!black, densely dotted] table[col sep=comma, x index=1, y index=29] {' + csv_location + r'};' + '\n')
+        f.write(r'\addplot[ultra  thick, green!60!black, densely dotted] ' + table(29) + r';' + '\n')
         f.write(r'\addlegendentry{$y$}' + '\n')
-        f.write(r'\addplot[ultra  thick, red!80!black] table[col sep=comma, x index=1, y index=31] {' + csv_location + r'};' + '\n')
+        f.write(r'\addplot[ultra  thick, red!80!black] ' + table(31) + r';' + '\n')
         f.write(r'\addlegendentry{$z$}' + '\n')
       f.write(r'\nextgroupplot[title = {Motors control signals $u_1$}]' + '\n')
-      f.write(r'\addplot[ultra  thick, black] table[col sep=comma, x index=1, y index=32] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, black] ' + table(32) + r';' + '\n')
       f.write(r'\addlegendentry{$u_1$}' + '\n')
       f.write(r'\nextgroupplot[title = {Motors control signals $u_2$}]' + '\n')
-      f.write(r'\addplot[ultra  thick, black!80] table[col sep=comma, x index=1, y index=33] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, black!80] ' + table(33) + r';' + '\n')
       f.write(r'\addlegendentry{$u_2$}' + '\n')
       f.write(r'\nextgroupplot[title = {Motors control signals $u_3$}]' + '\n')
-      f.write(r'\addplot[ultra  thick, black!60] table[col sep=comma, x index=1, y index=34] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, black!60] ' + table(34) + r';' + '\n')
       f.write(r'\addlegendentry{$u_3$}' + '\n')
       f.write(r'\nextgroupplot[title = {Motors control signals $u_4$}]' + '\n')
-      f.write(r'\addplot[ultra  thick, black!40] table[col sep=comma, x index=1, y index=35] {' + csv_location + r'};' + '\n')
+      f.write(r'\addplot[ultra  thick, black!40] ' + table(35) + r';' + '\n')
       f.write(r'\addlegendentry{$u_4$}' + '\n')
       f.write(r'\end{groupplot}' + '\n')
       f.write(r'\end{tikzpicture}' + '\n')
       f.write(r'}' + '\n')
       f.write(r'\end{document}' + '\n')
 
-  def trajectoryPlot(self):
+  # each plotting function draws on the given figure, or on a new pyplot
+  # figure if not given, and returns the figure
+
+  def trajectoryPlot(self, fig=None):
     if not(self.type=='pitl'):# plot trajectory in space
-      plt.figure('3D trajectory')
-      ax = plt.axes(projection="3d", label="uniquelabel")
+      if fig is None:
+        fig = plt.figure('3D trajectory')
+      ax = fig.add_subplot(projection="3d", label="uniquelabel")
       ax.plot(self.position_x, self.position_y, self.position_z, 'r', label="position")
       ax.set_xlabel('x')
       ax.set_ylabel('y')
@@ -283,166 +333,198 @@ class Storage:
       print('* figure 1:\033[33m 3d position\033[0m')
     else :
       # plot trajectory in space
-      plt.figure('estimated 3D trajectory')
-      ax = plt.axes(projection="3d", label="uniquelabel")
+      if fig is None:
+        fig = plt.figure('estimated 3D trajectory')
+      ax = fig.add_subplot(projection="3d", label="uniquelabel")
       ax.plot(self.estimated_position_x, self.estimated_position_y, self.estimated_position_z, 'r', label="position")
       ax.set_xlabel('x')
       ax.set_ylabel('y')
       ax.set_zlabel('z')
       print('* figure 1:\033[33m 3d position\033[0m')
+    return fig
 
-  def positionSpeedPlot(self):
+  def positionSpeedPlot(self, points=None, fig=None):
     # now plot all the others
     chosen_size = (20, 7)
     chosen_grid_linewidth = 0.3
     chosen_grid_linestyle = '--'
     chosen_grid_color = 'gray'
 
-    fig, axs = plt.subplots(3, 2, figsize=chosen_size)
-    plt.subplots_adjust(wspace=0.2, hspace=1)
+    if fig is None:
+      fig = plt.figure(figsize=chosen_size)
+    axs = fig.subplots(3, 2)
+    fig.subplots_adjust(wspace=0.2, hspace=1)
 
     axs[0, 0].title.set_text('Position (x)')
-    axs[0, 0].plot(self.time, self.setpoint_position_x, 'k')
+    axs[0, 0].plot(*self.trace('setpoint_position_x', points), 'k')
     if not(self.type=='pitl'):
-      axs[0, 0].plot(self.time, self.position_x, 'b')
-    axs[0, 0].plot(self.time, self.estimated_position_x, 'b:')
+      axs[0, 0].plot(*self.trace('position_x', points), 'b')
+    axs[0, 0].plot(*self.trace('estimated_position_x', points), 'b:')
     axs[0, 0].legend(['setpoint', 'position', 'estimated position'])
     axs[0, 0].grid(color=chosen_grid_color, linestyle=chosen_grid_linestyle, linewidth=chosen_grid_linewidth)
 
     axs[1, 0].title.set_text('Position (y)')
-    axs[1, 0].plot(self.time, self.setpoint_position_y, 'k')
+    axs[1, 0].plot(*self.trace('setpoint_position_y', points), 'k')
     if not(self.type=='pitl'):
-      axs[1, 0].plot(self.time, self.position_y, 'g')
-    axs[1, 0].plot(self.time, self.estimated_position_y, 'g:')
+      axs[1, 0].plot(*self.trace('position_y', points), 'g')
+    axs[1, 0].plot(*self.trace('estimated_position_y', points), 'g:')
     axs[1, 0].legend(['setpoint', 'position', 'estimated position'])
     axs[1, 0].grid(color=chosen_grid_color, linestyle=chosen_grid_linestyle, linewidth=chosen_grid_linewidth)
 
     axs[2, 0].title.set_text('Position (z)')
-    axs[2, 0].plot(self.time, self.setpoint_position_z, 'k')
+    axs[2, 0].plot(*self.trace('setpoint_position_z', points), 'k')
     if not(self.type=='pitl'):
-      axs[2, 0].plot(self.time, self.position_z, 'r')
-    axs[2, 0].plot(self.time, self.estimated_position_z, 'r:')
+      axs[2, 0].plot(*self.trace('position_z', points), 'r')
+    axs[2, 0].plot(*self.trace('estimated_position_z', points), 'r:')
     axs[2, 0].legend(['setpoint', 'position', 'estimated position'])
     axs[2, 0].grid(color=chosen_grid_color, linestyle=chosen_grid_linestyle, linewidth=chosen_grid_linewidth)
 
     axs[0, 1].title.set_text('Velocity (x)')
     if not(self.type=='pitl'):
-      axs[0, 1].plot(self.time, self.velocity_x, 'b')
-    axs[0, 1].plot(self.time, self.estimated_velocity_x, 'b:')
+      axs[0, 1].plot(*self.trace('velocity_x', points), 'b')
+    axs[0, 1].plot(*self.trace('estimated_velocity_x', points), 'b:')
     axs[0, 1].legend(['velocity', 'estimated velocity'])
     axs[0, 1].grid(color=chosen_grid_color, linestyle=chosen_grid_linestyle, linewidth=chosen_grid_linewidth)
 
     axs[1, 1].title.set_text('Velocity (y)')
     if not(self.type=='pitl'):
-      axs[1, 1].plot(self.time, self.velocity_y, 'g')
-    axs[1, 1].plot(self.time, self.estimated_velocity_y, 'g:')
+      axs[1, 1].plot(*self.trace('velocity_y', points), 'g')
+    axs[1, 1].plot(*self.trace('estimated_velocity_y', points), 'g:')
     axs[1, 1].legend(['velocity', 'estimated velocity'])
     axs[1, 1].grid(color=chosen_grid_color, linestyle=chosen_grid_linestyle, linewidth=chosen_grid_linewidth)
 
     axs[2, 1].title.set_text('Velocity (z)')
     if not(self.type=='pitl'):
-      axs[2, 1].plot(self.time, self.velocity_z, 'r')
-    axs[2, 1].plot(self.time, self.estimated_velocity_z, 'r:')
+      axs[2, 1].plot(*self.trace('velocity_z', points), 'r')
+    axs[2, 1].plot(*self.trace('estimated_velocity_z', points), 'r:')
     axs[2, 1].legend(['velocity', 'estimated velocity'])
     axs[2, 1].grid(color=chosen_grid_color, linestyle=chosen_grid_linestyle, linewidth=chosen_grid_linewidth)
     print('* figure 2:\033[33m position and velocity (x,y,z)\033[0m')
+    return fig
 
-  def sensorReadingsPlot(self):
+  def sensorReadingsPlot(self, points=None, fig=None):
     # now plot all the others
     chosen_size = (20, 7)
     chosen_grid_linewidth = 0.3
     chosen_grid_linestyle = '--'
     chosen_grid_color = 'gray'
 
-    fig, axs = plt.subplots(3, 2, figsize=chosen_size)
-    plt.subplots_adjust(wspace=0.2, hspace=1)
+    if fig is None:
+      fig = plt.figure(figsize=chosen_size)
+    axs = fig.subplots(3, 2)
+    fig.subplots_adjust(wspace=0.2, hspace=1)
 
     axs[0, 0].title.set_text('Acceleration (x,y,z)')
-    axs[0, 0].plot(self.time, self.acceleration_x, 'b')
-    axs[0, 0].plot(self.time, self.acceleration_y, 'g')
-    axs[0, 0].plot(self.time, self.acceleration_z, 'r')
+    axs[0, 0].plot(*self.trace('acceleration_x', points), 'b')
+    axs[0, 0].plot(*self.trace('acceleration_y', points), 'g')
+    axs[0, 0].plot(*self.trace('acceleration_z', points), 'r')
     axs[0, 0].legend(['x', 'y', 'z'])
     axs[0, 0].grid(color=chosen_grid_color, linestyle=chosen_grid_linestyle, linewidth=chosen_grid_linewidth)
 
     if not(self.type=='pitl'):
       axs[0, 1].title.set_text('Attitude (x,y,z)')
-      axs[0, 1].plot(self.time, self.attitude_x, 'b')
-      axs[0, 1].plot(self.time, self.attitude_y, 'g')
-      axs[0, 1].plot(self.time, self.attitude_z, 'r')
+      axs[0, 1].plot(*self.trace('attitude_x', points), 'b')
+      axs[0, 1].plot(*self.trace('attitude_y', points), 'g')
+      axs[0, 1].plot(*self.trace('attitude_z', points), 'r')
       axs[0, 1].legend(['x', 'y', 'z'])
       axs[0, 1].grid(color=chosen_grid_color, linestyle=chosen_grid_linestyle, linewidth=chosen_grid_linewidth)
 
     axs[1, 0].title.set_text('Gyro (x,y,z)')
-    axs[1, 0].plot(self.time, self.gyro_x, 'b')
-    axs[1, 0].plot(self.time, self.gyro_y, 'g')
-    axs[1, 0].plot(self.time, self.gyro_z, 'r')
+    axs[1, 0].plot(*self.trace('gyro_x', points), 'b')
+    axs[1, 0].plot(*self.trace('gyro_y', points), 'g')
+    axs[1, 0].plot(*self.trace('gyro_z', points), 'r')
     axs[1, 0].legend(['x', 'y', 'z'])
     axs[1, 0].grid(color=chosen_grid_color, linestyle=chosen_grid_linestyle, linewidth=chosen_grid_linewidth)
 
     axs[1, 1].title.set_text('z-range')
-    axs[1, 1].plot(self.time, self.range_z, 'r')
+    axs[1, 1].plot(*self.trace('range_z', points), 'r')
     axs[1, 1].legend(['z'])
     axs[1, 1].grid(color=chosen_grid_color, linestyle=chosen_grid_linestyle, linewidth=chosen_grid_linewidth)
 
     axs[2, 0].title.set_text('Pixel count (x,y)')
-    axs[2, 0].plot(self.time, self.pixel_count_x, 'b')
-    axs[2, 0].plot(self.time, self.pixel_count_y, 'g')
+    axs[2, 0].plot(*self.trace('pixel_count_x', points), 'b')
+    axs[2, 0].plot(*self.trace('pixel_count_y', points), 'g')
     axs[2, 0].legend(['x', 'y'])
     axs[2, 0].grid(color=chosen_grid_color, linestyle=chosen_grid_linestyle, linewidth=chosen_grid_linewidth)
 
     if not(self.type=='pitl'):
       axs[2, 1].title.set_text('Kalman errors (x,y,z)')
-      axs[2, 1].plot(self.time, self.kalman_error_x, 'b')
-      axs[2, 1].plot(self.time, self.kalman_error_y, 'g')
-      axs[2, 1].plot(self.time, self.kalman_error_z, 'r')
+      axs[2, 1].plot(*self.trace('kalman_error_x', points), 'b')
+      axs[2, 1].plot(*self.trace('kalman_error_y', points), 'g')
+      axs[2, 1].plot(*self.trace('kalman_error_z', points), 'r')
       axs[2, 1].legend(['x', 'y', 'z'])
       axs[2, 1].grid(color=chosen_grid_color, linestyle=chosen_grid_linestyle, linewidth=chosen_grid_linewidth)
     print('* figure 3:\033[33m sensor data and Kalman errors\033[0m')
+    return fig
 
 
-  def controlActionPlot(self):
+  def controlActionPlot(self, points=None, fig=None):
     # now plot all the others
     chosen_size = (20, 7)
     chosen_grid_linewidth = 0.3
     chosen_grid_linestyle = '--'
     chosen_grid_color = 'gray'
 
-    fig, axs = plt.subplots(2, 2, figsize=chosen_size)
-    plt.subplots_adjust(wspace=0.2, hspace=1)
+    if fig is None:
+      fig = plt.figure(figsize=chosen_size)
+    axs = fig.subplots(2, 2)
+    fig.subplots_adjust(wspace=0.2, hspace=1)
 
     axs[0, 0].title.set_text('Motor control signals (u1)')
-    axs[0, 0].plot(self.time, self.control_motor_1, 'k')
+    axs[0, 0].plot(*self.trace('control_motor_1', points), 'k')
     axs[0, 0].grid(color=chosen_grid_color, linestyle=chosen_grid_linestyle, linewidth=chosen_grid_linewidth)
 
     axs[0, 1].title.set_text('Motor control signals (u2)')
-    axs[0, 1].plot(self.time, self.control_motor_2, 'dimgray')
+    axs[0, 1].plot(*self.trace('control_motor_2', points), 'dimgray')
     axs[0, 1].grid(color=chosen_grid_color, linestyle=chosen_grid_linestyle, linewidth=chosen_grid_linewidth)
 
     axs[1, 0].title.set_text('Motor control signals (u3)')
-    axs[1, 0].plot(self.time, self.control_motor_3, 'darkgray')
+    axs[1, 0].plot(*self.trace('control_motor_3', points), 'darkgray')
     axs[1, 0].grid(color=chosen_grid_color, linestyle=chosen_grid_linestyle, linewidth=chosen_grid_linewidth)
 
     axs[1, 1].title.set_text('Motor control signals (u4)')
-    axs[1, 1].plot(self.time, self.control_motor_4, 'lightgray')
+    axs[1, 1].plot(*self.trace('control_motor_4', points), 'lightgray')
     axs[1, 1].grid(color=chosen_grid_color, linestyle=chosen_grid_linestyle, linewidth=chosen_grid_linewidth)
     print('* figure 4:\033[33m motor control signals (u1,u2,u3,u4)\033[0m')
+    return fig
 
-  def show(self):
+  def show(self, points=show_points):
     self.trajectoryPlot()
-    self.positionSpeedPlot()
-    self.sensorReadingsPlot()
-    self.controlActionPlot()
+    self.positionSpeedPlot(points)
+    self.sensorReadingsPlot(points)
+    self.controlActionPlot(points)
     plt.show()
 
-  def pdf(self, experiment_name):
+  def render_pdf(self, pdf_location, points=pdf_points):
+    # renders the four groups of plots straight to a multi-page pdf file
+    # with matplotlib, without intermediate files nor pyplot global state,
+    # so that many flights can be rendered at the same time
+    plots = [self.trajectoryPlot,
+             lambda fig: self.positionSpeedPlot(points, fig),
+             lambda fig: self.sensorReadingsPlot(points, fig),
+             lambda fig: self.controlActionPlot(points, fig)]
+    with matplotlib.rc_context({'path.simplify': True, 'path.simplify_threshold': render_simplify_threshold}):
+      with PdfPages(pdf_location) as pdf:
+        for plot in plots:
+          fig = Figure(figsize=(20, 7))
+          plot(fig)
+          fig.suptitle(self.experiment_name)
+          pdf.savefig(fig)
+    print('* rendered plots: \033[33m' + str(pdf_location) + '\033[0m')
+
+  def pdf(self, experiment_name, points=pdf_points):
     # first save the data to an intermediate csv file
+    # (each column decimated to the given number of points, if not None)
     intermediate_data_file = "data.csv"
     intermediate_latex_file = experiment_name + ".tex"
-    self.save_csv(intermediate_data_file)
+    if points is None:
+      self.save_csv(intermediate_data_file)
+    else:
+      self.save_decimated_csv(intermediate_data_file, points)
     print('* saved data to intermediate file: \033[33m' + str(intermediate_data_file) + '\033[0m')
 
     # now do the plotting
-    self.save_latex(intermediate_latex_file, intermediate_data_file)
+    self.save_latex(intermediate_latex_file, intermediate_data_file, paired=points is not None)
     print('* saved tex to intermediate file: \033[33m' + str(intermediate_latex_file) + '\033[0m')
 
     # you want to use lualatex because there could be a lot of data
@@ -1,24 +1,33 @@
+import os
 import sys
+from plot import Plot
 from plot.Plot import Storage
 
 if __name__ == "__main__":
 
   # parsing command line parameters
-  if len(sys.argv) != 3 or sys.argv[1] not in ("pdf", "show"):
-    print('\033[91mError:\033[0m ' + 'python plot.py <1> <2>')
-    print('  <1>: either "pdf" or "show"')
+  if len(sys.argv) not in (3, 4) or sys.argv[1] not in ("pdf", "render", "show"):
+    print('\033[91mError:\033[0m ' + 'python plot.py <1> <2> [<3>]')
+    print('  <1>: either "pdf" (latex), "render" (pdf with matplotlib) or "show"')
     print('  <2>: absolute or relative path of the experiment file')
+    print('  <3>: optional, points per plotted trace ("all" to disable decimation)')
     exit()
 
   command = sys.argv[1]
+  points = Plot.show_points if command == "show" else Plot.pdf_points
+  if len(sys.argv) == 4:
+    points = None if sys.argv[3] == "all" else int(sys.argv[3])
   file_location = sys.argv[2]
-  experiment_name = file_location.split('/')[-1]
+  experiment_name = os.path.basename(os.path.normpath(file_location))
   data_storage = Storage()
   data_storage.open(file_location, experiment_name)
   print('* read data with total length: \033[33m' + str(data_storage.trace_length) + '\033[0m')
 
   if command == "pdf":
-    data_storage.pdf(experiment_name)
+    data_storage.pdf(experiment_name, points)
+
+  if command == "render":
+    data_storage.render_pdf(experiment_name + ".pdf", points)
 
   if command == "show":
-    data_storage.show()
\ No newline at end of file
+    data_storage.show(points)
\ No newline at end of file
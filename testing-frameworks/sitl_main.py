@@ -3,6 +3,10 @@ import sys
 # for testing
 import numpy as np
 from mitl.Model  import cfSim
+from mitl import Rotation
+from mitl.Monitor import cfMonitor
+from mitl.Profiler import cfProfiler
+from mitl.Tracer import cfTracer
 from sitl.cfSitl import cfSITL
 from getaddresses.Addresses import cfAddresses
 
@@ -23,11 +27,18 @@ if __name__ == "__main__":
     t_final = 10
     t_resolution = 0.001
     noise  = 0 # if non-zero includes measurement noise with given gains
+    useMonitor = True # if true the test is stopped when an invariant is violated
+    useTracer  = False # if true a trace of the calls is saved in sitl/traces
     t_curr = t_init
     n_steps = int((t_final-t_init)/t_resolution)
 
     physics = cfSim()      # initialize physics simulator
     cyber   = cfSITL(addresses.get(), port) # connect to hardware
+    monitor = cfMonitor()  # online checks of the flight
+    if useTracer: # every protocol command and physics step
+        tracer = cfTracer()
+        tracer.instrument(physics, "physics", ["simulate"])
+        tracer.instrument(cyber, "protocol", exclude=["accelTomg", "gyroToDeg", "c2ToInt16", "int16ToC2"])
 
     # storage variables
     t       = np.zeros((n_steps))
@@ -42,6 +53,7 @@ if __name__ == "__main__":
     est_vel = np.zeros((3,n_steps)) # speed estimated by cf
     set_pt  = np.zeros((3,n_steps)) # setpoint in cf
     err_fd  = np.zeros((3,n_steps)) # kalman innovation from flow measurements
+    prof    = cfProfiler(n_steps, ["physics", "sensors", "communication", "bookkeeping"])
 
     cyber.initialize_emulation()
     cyber.pass_startup()
@@ -56,10 +68,12 @@ if __name__ == "__main__":
     i = i+1
 
     # main loop
+    prof.start()
     while i<n_steps: 
         # compute time progress from ticks
         tick_curr = cyber.tickCount()
         dt        = (tick_curr-tick[i-1])/1000 
+        prof.lap("communication", i)
 
         if dt > 0: #time has progressed in the firmware: sim physics
             if not i%100:                     # progress printout
@@ -67,25 +81,38 @@ if __name__ == "__main__":
             t_curr  = t_curr+dt        # make time move forward
             tick[i] = tick_curr        # store only ticks at which time progresses
             t[i]    = t_curr           # used for plotting 
+            prof.lap("bookkeeping", i)
 
             u_store[:,i] = cyber.motors()     # read motor values and store control action
+            prof.lap("communication", i)
             x_store[:,i] = physics.simulate(t_curr, u_store[:,i]) # simulate physics
+            prof.lap("physics", i)
 
             # store measurements
             acc[:,i]     = physics.readAcc(Noise=noise)
             gyro[:,i]    = physics.readGyro(Noise=noise)
             pxCount[:,i] = physics.readPixelcount(Noise=noise)
             zrange[i]    = physics.readZRanging(Noise=noise)
+            prof.lap("sensors", i)
 
             (est_pos[:,i], est_vel[:,i], set_pt[:,i], err_fd[:,i]) = cyber.write_read(acc[:,i], gyro[:,i], pxCount[:,i], zrange[i], "0.001")
+            prof.lap("communication", i)
             i=i+1             # increase counter
+            if useMonitor and not monitor.check(t_curr, physics, est_pos[:,i-1]):
+                break # stop early, the trace is saved up to here
+            prof.lap("bookkeeping", i-1)
         else: # One tick has not passed internally
             cyber.runTick("0.001") # Run one tick
+            prof.lap("communication", i)
 
     cyber.close()
+    n_done = i
 
     end_test = time.perf_counter()
     print("This test took " + str(end_test-start_test) + " seconds")
+    prof.printSummary(n_done)
+    if useTracer:
+        tracer.save("sitl/traces/" + time.strftime('%d%b%Y_%H%M%S', time.localtime()) + ".json")
 
     ##############################################
     # store data as object attributes of storage #
@@ -93,6 +120,11 @@ if __name__ == "__main__":
 
     storeObj = Storage()
     storeObj.type    = "sitl"
+    storeObj.abort   = monitor.reason # None if the test was completed
+    # truncate the traces if the test was aborted
+    t       = t[:n_done]
+    x_store = x_store[:,:n_done]
+    u_store = u_store[:,:n_done]
     storeObj.t       = t
     storeObj.x       = x_store
     storeObj.u       = u_store
@@ -103,20 +135,21 @@ if __name__ == "__main__":
     storeObj.gyro    = x_store[10:13,:]
 
     # extract euler angles
-    eta = np.zeros((3, n_steps))
-    for j in range(0,n_steps):
-        eta[:,j] = physics.quaternionToEuler(x_store[6:10,j])
-    storeObj.eta     = eta
+    storeObj.eta     = Rotation.quaternionToEuler(x_store[6:10,:].T).T
 
     # measurements and other cf data
-    storeObj.acc     = acc
-    storeObj.pxCount = pxCount
-    storeObj.est_pos = est_pos
-    storeObj.set_pt  = set_pt
-    storeObj.zrange  = zrange
-    storeObj.err_fd  = err_fd
-    storeObj.tick    = tick 
-    storeObj.est_vel = est_vel
+    storeObj.acc     = acc[:,:n_done]
+    storeObj.pxCount = pxCount[:,:n_done]
+    storeObj.est_pos = est_pos[:,:n_done]
+    storeObj.set_pt  = set_pt[:,:n_done]
+    storeObj.zrange  = zrange[:n_done]
+    storeObj.err_fd  = err_fd[:,:n_done]
+    storeObj.tick    = tick[:n_done]
+    storeObj.est_vel = est_vel[:,:n_done]
+
+    # duration of the phases of each step [ns]
+    storeObj.profile = prof.samples[:,:n_done]
+    storeObj.profile_phases = ",".join(prof.phases)
 
     # define filename as day and time and save
     storeObj.save("sitl/flightdata")